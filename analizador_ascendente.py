@@ -10,7 +10,7 @@ Descripción:
     y evalúa expresiones con asignaciones de variables.
     
 Características:
-    - Análisis ascendente simulado con traza Shift-Reduce
+    - Análisis ascendente LALR(1) guiado por tablas, con traza Shift-Reduce
     - Soporte para asignaciones: var = expresión
     - Operadores: +, -, *, /, paréntesis
     - Interfaz gráfica con visualización completa
@@ -24,9 +24,189 @@ Ejemplo:
 
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
+import os
 import re
+import threading
+import time
+from array import array
+from collections.abc import Sequence
 from datetime import datetime
 
+from metricas import AGREGADOR, MetricasAnalisis
+from tablas_lr import FIN, cargar_tablas
+from tareas import PanelProgreso, TareaSegundoPlano, verificar_cancelacion
+
+
+# Gramática del analizador; la producción 0 es la aumentada S' → S
+PRODUCCIONES = (
+    ("S'", ('S',)),
+    ('S', ('VAR', 'IGUAL', 'E')),
+    ('S', ('E',)),
+    ('E', ('E', 'SUMA', 'T')),
+    ('E', ('E', 'RESTA', 'T')),
+    ('E', ('T',)),
+    ('T', ('T', 'MULT', 'F')),
+    ('T', ('T', 'DIV', 'F')),
+    ('T', ('F',)),
+    ('F', ('PAREN_IZQ', 'E', 'PAREN_DER')),
+    ('F', ('NUMERO',)),
+    ('F', ('VAR',)),
+)
+
+# Terminales de la gramática y cómo se muestran en las producciones y en los errores
+TERMINALES = ('NUMERO', 'VAR', 'IGUAL', 'SUMA', 'RESTA', 'MULT', 'DIV', 'PAREN_IZQ', 'PAREN_DER', FIN)
+SIMBOLOS_TERMINALES = {
+    'IGUAL': '=', 'SUMA': '+', 'RESTA': '-', 'MULT': '*', 'DIV': '/',
+    'PAREN_IZQ': '(', 'PAREN_DER': ')',
+}
+
+# Tablas LALR(1): ACCION[estado][terminal] e IR_A[estado][no terminal]. Se
+# generan la primera vez y se guardan precompiladas junto a este módulo; si
+# la gramática cambia, la huella no coincide y se vuelven a generar.
+ARCHIVO_TABLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablas_ascendente.bin')
+ACCION, IR_A = cargar_tablas(PRODUCCIONES, ARCHIVO_TABLAS)
+
+# Reescrituras que insertan la multiplicación implícita antes de tokenizar
+_MULTIPLICACION_IMPLICITA = tuple((re.compile(patron), reemplazo) for patron, reemplazo in (
+    (r'(\d)\s*\(', r'\1*('),
+    (r'\)\s*(\d)', r')*\1'),
+    (r'\)\s*\(', r')*('),
+    (r'(\d)\s*([a-zA-Z_])', r'\1*\2'),
+    (r'([a-zA-Z_0-9])\s*\(', r'\1*('),
+))
+
+# Patrones de los tokens en orden de prioridad, unidos en una sola expresión
+# regular: el grupo que coincide (lastgroup) es el tipo del token
+PATRONES_TOKENS = (
+    ('NUMERO', r'\d+(?:\.\d+)?'),
+    ('VAR', r'[a-zA-Z_][a-zA-Z0-9_]*'),
+    ('IGUAL', r'='),
+    ('SUMA', r'\+'),
+    ('RESTA', r'\-'),
+    ('MULT', r'\*'),
+    ('DIV', r'\/'),
+    ('PAREN_IZQ', r'\('),
+    ('PAREN_DER', r'\)'),
+    ('ESPACIO', r'\s+'),
+)
+_REGEX_TOKENS = re.compile('|'.join(f'(?P<{tipo}>{patron})' for tipo, patron in PATRONES_TOKENS))
+
+# Texto de la acción SHIFT de cada terminal (compartido por todos los pasos)
+_ACCIONES_SHIFT = {terminal: f'SHIFT {terminal}' for terminal in TERMINALES}
+
+
+class TrazaShiftReduce(Sequence):
+    """
+    Traza del análisis Shift-Reduce guardada en memoria lineal.
+    
+    La pila es persistente: cada nodo es una tupla (símbolo, nodo anterior) y
+    los pasos consecutivos comparten todos los nodos menos el último. Por
+    paso solo se guarda el nodo del tope, la posición del siguiente token en
+    la entrada y el texto de la acción. Las filas {'paso', 'pila', 'entrada',
+    'accion'} se arman al consultarlas (al mostrar la traza, por ejemplo);
+    list(traza) las arma todas.
+    
+    La entrada restante de cada fila es un corte del texto de todos los
+    tokens, que se une una sola vez junto con la posición de cada token.
+    """
+    
+    __slots__ = ('tokens', 'pilas', 'cursores', 'acciones', '_entrada', '_inicios')
+    
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pilas = []
+        self.cursores = array('I')
+        self.acciones = []
+        self._entrada = None
+        self._inicios = None
+    
+    def agregar(self, pila, cursor, accion):
+        self.pilas.append(pila)
+        self.cursores.append(cursor)
+        self.acciones.append(accion)
+    
+    def __len__(self):
+        return len(self.acciones)
+    
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self._fila(i) for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError('índice de la traza fuera de rango')
+        return self._fila(indice)
+    
+    def __repr__(self):
+        return f'TrazaShiftReduce({len(self)} pasos)'
+    
+    def _fila(self, paso):
+        pila = []
+        nodo = self.pilas[paso]
+        while nodo is not None:
+            simbolo, nodo = nodo
+            pila.append(simbolo)
+        pila.reverse()
+        if self._entrada is None:
+            self._indexar_entrada()
+        entrada = self._entrada[self._inicios[self.cursores[paso]]:] or '$'
+        return {'paso': paso, 'pila': pila, 'entrada': entrada, 'accion': self.acciones[paso]}
+    
+    def _indexar_entrada(self):
+        """Une el texto de los tokens y guarda dónde empieza cada uno (y el final)"""
+        inicios = array('I')
+        posicion = 0
+        for _, texto in self.tokens:
+            inicios.append(posicion)
+            posicion += len(texto) + 1
+        inicios.append(posicion)
+        self._inicios = inicios
+        self._entrada = ' '.join([t[1] for t in self.tokens])
+
+
+def _etiqueta_reduccion(produccion):
+    """Texto de la acción REDUCE de una producción en la traza"""
+    cabeza, cuerpo = PRODUCCIONES[produccion]
+    etiqueta = f"REDUCE {cabeza} → {' '.join(SIMBOLOS_TERMINALES.get(s, s) for s in cuerpo)}"
+    if cabeza == 'S':
+        etiqueta += ' (Asignación)' if len(cuerpo) > 1 else ' (Expresión)'
+    return etiqueta
+
+
+# Para cada producción: (cabeza, longitud del cuerpo, etiqueta en la traza)
+_REDUCCIONES = tuple((cabeza, len(cuerpo), _etiqueta_reduccion(indice))
+                     for indice, (cabeza, cuerpo) in enumerate(PRODUCCIONES))
+
+
+def _numero(texto):
+    """Valor de un literal: int si no tiene punto decimal (como lo leía eval)"""
+    return float(texto) if '.' in texto else int(texto)
+
+
+def _variable(variables, nombre):
+    if nombre not in variables:
+        raise Exception(f"Variable no definida: '{nombre}'")
+    return variables[nombre]
+
+
+# Acción semántica de cada producción (mismo orden que PRODUCCIONES). Recibe
+# los valores del cuerpo y las variables y retorna el valor de la cabeza;
+# None indica que la cabeza conserva el valor de su único símbolo.
+_ACCIONES_SEMANTICAS = (
+    None,                                               # S' → S
+    lambda v, variables: (v[0], v[2]),                  # S → VAR = E
+    lambda v, variables: (None, v[0]),                  # S → E
+    lambda v, variables: v[0] + v[2],                   # E → E + T
+    lambda v, variables: v[0] - v[2],                   # E → E - T
+    None,                                               # E → T
+    lambda v, variables: v[0] * v[2],                   # T → T * F
+    lambda v, variables: v[0] / v[2],                   # T → T / F
+    None,                                               # T → F
+    lambda v, variables: v[1],                          # F → ( E )
+    lambda v, variables: _numero(v[0]),                 # F → NUMERO
+    lambda v, variables: _variable(variables, v[0]),    # F → VAR
+)
+
 
 class AnalizadorAscendente:
     """Analizador sintáctico ascendente funcional"""
@@ -35,333 +215,212 @@ class AnalizadorAscendente:
         self.tokens = []
         self.variables = {}
         self.errores = []
+        # Resultado del último análisis, calculado en las reducciones:
+        # (variable asignada o None, valor), o la excepción de la evaluación
+        self.valor_semantico = None
+        self.error_evaluacion = None
+        # threading.Event opcional: al activarlo, el análisis se detiene con
+        # TareaCancelada en el siguiente token
+        self.cancelacion = None
     
     def tokenizar(self, expresion):
         """Convierte la expresión en tokens con multiplicación implícita"""
         # Insertar * implícito
-        expresion = re.sub(r'(\d)\s*\(', r'\1*(', expresion)
-        expresion = re.sub(r'\)\s*(\d)', r')*\1', expresion)
-        expresion = re.sub(r'\)\s*\(', r')*(', expresion)
-        expresion = re.sub(r'(\d)\s*([a-zA-Z_])', r'\1*\2', expresion)
-        expresion = re.sub(r'([a-zA-Z_0-9])\s*\(', r'\1*(', expresion)
-        
-        patrones = [
-            ('NUMERO', r'\d+(\.\d+)?'),
-            ('VAR', r'[a-zA-Z_][a-zA-Z0-9_]*'),
-            ('IGUAL', r'='),
-            ('SUMA', r'\+'),
-            ('RESTA', r'\-'),
-            ('MULT', r'\*'),
-            ('DIV', r'\/'),
-            ('PAREN_IZQ', r'\('),
-            ('PAREN_DER', r'\)'),
-            ('ESPACIO', r'\s+'),
-        ]
+        for regex, reemplazo in _MULTIPLICACION_IMPLICITA:
+            expresion = regex.sub(reemplazo, expresion)
         
         tokens = []
         pos = 0
         self.errores = []
+        coincidir = _REGEX_TOKENS.match
         
         while pos < len(expresion):
-            coincide = False
-            for tipo, patron in patrones:
-                regex = re.compile(patron)
-                match = regex.match(expresion, pos)
-                if match:
-                    valor = match.group()
-                    if tipo != 'ESPACIO':
-                        tokens.append((tipo, valor))
-                    pos = match.end()
-                    coincide = True
-                    break
-            
-            if not coincide:
+            verificar_cancelacion(self.cancelacion)
+            match = coincidir(expresion, pos)
+            if match is None:
                 self.errores.append(f"Error léxico: Carácter no válido '{expresion[pos]}' en posición {pos}")
                 return []
+            tipo = match.lastgroup
+            if tipo != 'ESPACIO':
+                tokens.append((tipo, match.group()))
+            pos = match.end()
         
         return tokens
     
     def analizar_sintaxis(self, expresion):
-        """Realiza análisis sintáctico y genera traza Shift-Reduce"""
+        """
+        Realiza análisis sintáctico y genera traza Shift-Reduce. La traza se
+        retorna como lista de filas ya armadas; evaluar_expresion() retorna
+        en cambio la TrazaShiftReduce, que arma cada fila al consultarla.
+        """
         self.tokens = self.tokenizar(expresion)
         
         if not self.tokens or self.errores:
             return False, self.errores
-        
-        # Generar traza de análisis Shift-Reduce simulada
-        traza = self.generar_traza_shift_reduce()
-        
-        return True, traza
+        exito, datos = self._analizar_tokens()
+        return exito, list(datos) if exito else datos
     
-    def generar_traza_shift_reduce(self):
-        """Genera la traza del análisis Shift-Reduce"""
-        traza = []
-        pila = ['$']
-        paso = 0
-        
-        traza.append({
-            'paso': paso,
-            'pila': pila.copy(),
-            'entrada': ' '.join([t[1] for t in self.tokens]),
-            'accion': 'Estado inicial'
-        })
-        paso += 1
+    def _analizar_tokens(self, traza=True):
+        """Análisis LALR(1) de self.tokens ya tokenizados: (True, traza) o (False, errores)"""
+        resultado = self.generar_traza_shift_reduce(traza)
+        if self.errores:
+            return False, self.errores
+        return True, resultado
+    
+    def generar_traza_shift_reduce(self, traza=True):
+        """
+        Analiza self.tokens con las tablas LALR(1) y genera la traza del
+        análisis Shift-Reduce. Cada paso es una consulta a ACCION (y a IR_A
+        tras reducir). Un error de sintaxis se agrega a self.errores y la
+        traza queda hasta el último paso válido. Con traza=False no se
+        guardan los pasos y se retorna None.
+        
+        La traza es una TrazaShiftReduce: la pila de símbolos es persistente y
+        cada paso se registra en O(1), sin copiar la pila ni la entrada.
+        
+        Cuenta los pasos en self.pasos_analisis y la mayor altura de la pila
+        en self.profundidad_maxima (para las métricas, haya o no traza).
+        
+        La expresión se evalúa en las reducciones con una pila de valores
+        paralela a la de estados: al aceptar, self.valor_semantico queda con
+        (variable, valor). El primer error de evaluación se guarda en
+        self.error_evaluacion y el análisis sigue, porque un error de
+        sintaxis posterior tiene prioridad.
+        """
+        tokens = self.tokens
+        traza = TrazaShiftReduce(tokens) if traza else None
+        estados = [0]
+        pila = ('$', None)  # Nodo del tope: (símbolo, nodo anterior)
+        altura = profundidad = 1
+        valores = [None]
+        variables = self.variables
+        error = None
+        self.valor_semantico = self.error_evaluacion = None
+        self.pasos_analisis = self.profundidad_maxima = 0
+        
+        if traza is not None:
+            traza.agregar(pila, 0, 'Estado inicial')
+        paso = 1
         
-        # Procesar tokens
         i = 0
-        while i < len(self.tokens):
-            token_tipo, token_val = self.tokens[i]
+        while True:
+            verificar_cancelacion(self.cancelacion)
+            terminal = tokens[i][0] if i < len(tokens) else FIN
+            codigo = ACCION[estados[-1]].get(terminal)
             
-            # SHIFT
-            pila.append(token_tipo)
-            entrada_restante = ' '.join([t[1] for t in self.tokens[i+1:]])
-            if not entrada_restante:
-                entrada_restante = '$'
+            if codigo is None:
+                self.errores.append(self._error_sintaxis(estados[-1], i))
+                self.pasos_analisis, self.profundidad_maxima = paso, profundidad
+                return traza
             
-            traza.append({
-                'paso': paso,
-                'pila': pila.copy(),
-                'entrada': entrada_restante,
-                'accion': f'SHIFT {token_tipo}'
-            })
-            paso += 1
-            
-            # REDUCE según el tipo
-            while True:
-                reducido = False
-                
-                # F → NUMERO
-                if len(pila) >= 2 and pila[-1] == 'NUMERO':
-                    pila.pop()
-                    pila.append('F')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE F → NUMERO'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                # F → VAR (solo si no es parte de asignación)
-                if len(pila) >= 2 and pila[-1] == 'VAR':
-                    # Verificar si el siguiente token es '='
-                    if i + 1 < len(self.tokens) and self.tokens[i + 1][0] == 'IGUAL':
-                        break  # No reducir, es parte de asignación
-                    pila.pop()
-                    pila.append('F')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE F → VAR'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                # F → ( E )
-                if len(pila) >= 4 and pila[-3:] == ['PAREN_IZQ', 'E', 'PAREN_DER']:
-                    pila.pop()
-                    pila.pop()
-                    pila.pop()
-                    pila.append('F')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE F → ( E )'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                # T → F
-                if len(pila) >= 2 and pila[-1] == 'F':
-                    # Solo reducir si no viene * o /
-                    if i + 1 < len(self.tokens) and self.tokens[i + 1][0] in ['MULT', 'DIV']:
-                        break
-                    pila.pop()
-                    pila.append('T')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE T → F'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                # T → T * F
-                if len(pila) >= 4 and pila[-3:] == ['T', 'MULT', 'F']:
-                    pila.pop()
-                    pila.pop()
-                    pila.pop()
-                    pila.append('T')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE T → T * F'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                # T → T / F
-                if len(pila) >= 4 and pila[-3:] == ['T', 'DIV', 'F']:
-                    pila.pop()
-                    pila.pop()
-                    pila.pop()
-                    pila.append('T')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE T → T / F'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                # E → T
-                if len(pila) >= 2 and pila[-1] == 'T':
-                    # Solo reducir si no viene + o -
-                    if i + 1 < len(self.tokens) and self.tokens[i + 1][0] in ['SUMA', 'RESTA']:
-                        break
-                    # O si es el final o viene )
-                    if i + 1 >= len(self.tokens) or self.tokens[i + 1][0] in ['PAREN_DER', 'IGUAL']:
-                        pila.pop()
-                        pila.append('E')
-                        traza.append({
-                            'paso': paso,
-                            'pila': pila.copy(),
-                            'entrada': entrada_restante,
-                            'accion': 'REDUCE E → T'
-                        })
-                        paso += 1
-                        reducido = True
-                        continue
-                    break
-                
-                # E → E + T
-                if len(pila) >= 4 and pila[-3:] == ['E', 'SUMA', 'T']:
-                    pila.pop()
-                    pila.pop()
-                    pila.pop()
-                    pila.append('E')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE E → E + T'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                # E → E - T
-                if len(pila) >= 4 and pila[-3:] == ['E', 'RESTA', 'T']:
-                    pila.pop()
-                    pila.pop()
-                    pila.pop()
-                    pila.append('E')
-                    traza.append({
-                        'paso': paso,
-                        'pila': pila.copy(),
-                        'entrada': entrada_restante,
-                        'accion': 'REDUCE E → E - T'
-                    })
-                    paso += 1
-                    reducido = True
-                    continue
-                
-                if not reducido:
-                    break
+            if codigo >= 0:
+                # SHIFT: el valor de un terminal es su texto
+                estados.append(codigo)
+                pila = (terminal, pila)
+                valores.append(tokens[i][1])
+                i += 1
+                altura += 1
+                if altura > profundidad:
+                    profundidad = altura
+                accion = _ACCIONES_SHIFT[terminal]
+            else:
+                produccion = ~codigo
+                if produccion == 0:
+                    self.valor_semantico = valores[-1]
+                    self.error_evaluacion = error
+                    self.pasos_analisis, self.profundidad_maxima = paso + 1, profundidad
+                    if traza is not None:
+                        traza.agregar(pila, i, '✓ ACEPTAR')
+                    return traza
+                # REDUCE: se quitan los símbolos del cuerpo y se sigue IR_A
+                cabeza, longitud, accion = _REDUCCIONES[produccion]
+                semantica = _ACCIONES_SEMANTICAS[produccion]
+                if semantica is not None:
+                    valor = None
+                    if error is None:
+                        try:
+                            valor = semantica(valores[-longitud:], variables)
+                        except Exception as e:
+                            error = e
+                    del valores[-longitud:]
+                    valores.append(valor)
+                del estados[-longitud:]
+                for _ in range(longitud):
+                    pila = pila[1]
+                estados.append(IR_A[estados[-1]][cabeza])
+                pila = (cabeza, pila)
+                altura -= longitud - 1
             
-            i += 1
-        
-        # Reducción final S → VAR = E
-        if len(pila) >= 4 and pila[-3:] == ['VAR', 'IGUAL', 'E']:
-            pila.pop()
-            pila.pop()
-            pila.pop()
-            pila.append('S')
-            traza.append({
-                'paso': paso,
-                'pila': pila.copy(),
-                'entrada': '$',
-                'accion': 'REDUCE S → VAR = E (Asignación)'
-            })
+            if traza is not None:
+                traza.agregar(pila, i, accion)
             paso += 1
-        elif len(pila) >= 2 and pila[-1] == 'E':
-            # Solo expresión sin asignación
-            pila.pop()
-            pila.append('S')
-            traza.append({
-                'paso': paso,
-                'pila': pila.copy(),
-                'entrada': '$',
-                'accion': 'REDUCE S → E (Expresión)'
-            })
-            paso += 1
-        
-        # ACEPTAR
-        traza.append({
-            'paso': paso,
-            'pila': pila.copy(),
-            'entrada': '$',
-            'accion': '✓ ACEPTAR'
-        })
-        
-        return traza
     
-    def evaluar_expresion(self, expresion):
-        """Evalúa la expresión y retorna el resultado"""
-        tokens = self.tokenizar(expresion)
+    def _error_sintaxis(self, estado, i):
+        """Mensaje para un token que no tiene acción en el estado actual"""
+        esperados = ', '.join(f"'{SIMBOLOS_TERMINALES[t]}'" if t in SIMBOLOS_TERMINALES
+                              else 'fin de la expresión' if t == FIN else t
+                              for t in TERMINALES if t in ACCION[estado])
+        if i >= len(self.tokens):
+            return f"Error de sintaxis: La expresión terminó inesperadamente. Se esperaba: {esperados}"
+        return (f"Error de sintaxis: Token inesperado '{self.tokens[i][1]}' (token {i + 1}). "
+                f"Se esperaba: {esperados}")
+    
+    def evaluar_expresion(self, expresion, metricas=False, traza=True):
+        """
+        Evalúa la expresión y retorna (variable, valor, traza o errores). Con
+        metricas=True agrega un cuarto elemento, MetricasAnalisis, y lo
+        registra en metricas.AGREGADOR. La traza es una TrazaShiftReduce; con
+        traza=False no se guardan los pasos del análisis y el tercer elemento
+        es None si no hay errores.
+        
+        La expresión se tokeniza una vez (los tokens quedan en self.tokens)
+        y se analiza una vez, evaluando en las reducciones.
+        """
+        if not metricas:
+            return self._evaluar_expresion(expresion, traza=traza)
+        
+        tiempos = [time.perf_counter()]
+        resultado = self._evaluar_expresion(expresion, tiempos, traza)
+        tiempos.append(time.perf_counter())
+        # Marcas: inicio, fin léxico y fin. La evaluación ocurre en las
+        # reducciones, así que no es una fase aparte (tiempo_evaluacion=None)
+        # La profundidad y los pasos son los alcanzados, aunque el análisis falle
+        metricas = MetricasAnalisis(tiempos[1] - tiempos[0], tiempos[2] - tiempos[1],
+                                    None, len(self.tokens), self.profundidad_maxima,
+                                    self.pasos_analisis)
+        AGREGADOR.registrar('ascendente', metricas)
+        return resultado + (metricas,)
+    
+    def _evaluar_expresion(self, expresion, tiempos=None, traza=True):
+        """
+        Análisis léxico, sintáctico y evaluación de evaluar_expresion(). Si se
+        pasa la lista `tiempos`, se le agrega una marca al final del análisis
+        léxico.
+        """
+        tokens = self.tokens = self.tokenizar(expresion)
+        if tiempos is not None:
+            tiempos.append(time.perf_counter())
         
         if not tokens or self.errores:
+            self.pasos_analisis = self.profundidad_maxima = 0
             return None, None, self.errores
         
-        # Generar traza
-        resultado_sintaxis, traza = self.analizar_sintaxis(expresion)
+        # Análisis sintáctico (y evaluación) sobre los mismos tokens
+        resultado_sintaxis, traza = self._analizar_tokens(traza)
         
         if not resultado_sintaxis:
             return None, None, traza
         
-        # Evaluar semánticamente
-        try:
-            # Verificar si hay asignación
-            if len(tokens) >= 3 and tokens[0][0] == 'VAR' and tokens[1][0] == 'IGUAL':
-                var_nombre = tokens[0][1]
-                # Reconstruir expresión (sin la variable y el =)
-                expr_tokens = tokens[2:]
-                expresion_eval = ''.join([t[1] for t in expr_tokens])
-                
-                # Reemplazar variables conocidas
-                for var, val in self.variables.items():
-                    expresion_eval = expresion_eval.replace(var, str(val))
-                
-                # Evaluar
-                valor = eval(expresion_eval)
-                self.variables[var_nombre] = valor
-                
-                return var_nombre, valor, traza
-            else:
-                # Solo expresión
-                expresion_eval = ''.join([t[1] for t in tokens])
-                
-                # Reemplazar variables conocidas
-                for var, val in self.variables.items():
-                    expresion_eval = expresion_eval.replace(var, str(val))
-                
-                valor = eval(expresion_eval)
-                return None, valor, traza
-                
-        except Exception as e:
-            return None, None, [f"Error de evaluación: {str(e)}"]
+        # Última oportunidad de cancelar: la asignación modifica las variables
+        verificar_cancelacion(self.cancelacion)
+        
+        # El valor ya se calculó en las reducciones del análisis
+        if self.error_evaluacion is not None:
+            return None, None, [f"Error de evaluación: {str(self.error_evaluacion)}"]
+        var_nombre, valor = self.valor_semantico
+        if var_nombre is not None:
+            self.variables[var_nombre] = valor
+        return var_nombre, valor, traza
 
 
 class InterfazAscendente:
@@ -375,6 +434,10 @@ class InterfazAscendente:
         
         self.analizador = AnalizadorAscendente()
         self.historial = []
+        self.tarea = None  # Análisis en segundo plano en curso
+        # Un análisis cancelado puede seguir hasta su próximo token: el
+        # candado evita que dos hilos usen el analizador a la vez
+        self._candado_analizador = threading.Lock()
         
         self.crear_interfaz()
     
@@ -425,6 +488,10 @@ class InterfazAscendente:
         ttk.Button(botones_frame, text="📊 Variables", 
                   command=self.mostrar_variables, width=15).grid(row=0, column=3, padx=5)
         
+        # Progreso del análisis en segundo plano
+        self.progreso = PanelProgreso(botones_frame, self.cancelar_analisis)
+        self.progreso.frame.grid(row=1, column=0, columnspan=4, pady=(8, 0))
+        
         # Notebook
         self.notebook = ttk.Notebook(main_frame)
         self.notebook.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
@@ -495,7 +562,7 @@ Precedencia de Operadores:
 Tipo de Análisis:
 ─────────────────
 • Análisis Sintáctico Ascendente (Bottom-Up)
-• Algoritmo: Shift-Reduce
+• Algoritmo: Shift-Reduce LALR(1) guiado por tablas ACCION / IR_A
 • Construcción del árbol desde las hojas hacia la raíz
 
 Operaciones Shift-Reduce:
@@ -522,16 +589,47 @@ Características:
             messagebox.showwarning("Advertencia", "Por favor ingrese una expresión")
             return
         
+        self.cancelar_analisis()
         self.limpiar_resultados()
         
-        # Tokenizar y mostrar
-        tokens = self.analizador.tokenizar(expresion)
+        # El análisis corre en un hilo de trabajo; los resultados se muestran
+        # en el hilo de tkinter al terminar
+        def analizar(cancelacion):
+            with self._candado_analizador:
+                self.analizador.cancelacion = cancelacion
+                try:
+                    resultado = self.analizador.evaluar_expresion(expresion)
+                    return (self.analizador.tokens,) + resultado
+                finally:
+                    self.analizador.cancelacion = None
+        
+        self.progreso.iniciar("Analizando expresión...")
+        self.tarea = TareaSegundoPlano(self.root, analizar,
+                                       lambda datos: self.mostrar_analisis(expresion, *datos),
+                                       self.mostrar_error_inesperado).iniciar()
+    
+    def cancelar_analisis(self):
+        """Detiene el análisis en segundo plano en curso (si lo hay)"""
+        if self.tarea is not None:
+            if self.tarea.activa:
+                self.progreso.detener("Análisis cancelado")
+            self.tarea.cancelar()
+            self.tarea = None
+    
+    def mostrar_error_inesperado(self, excepcion):
+        self.tarea = None
+        self.progreso.detener()
+        self.resultado_texto.insert(tk.END, f"❌ Error inesperado: {str(excepcion)}")
+    
+    def mostrar_analisis(self, expresion, tokens, var_nombre, valor, datos):
+        """Muestra en las pestañas el resultado del análisis en segundo plano"""
+        self.tarea = None
+        self.progreso.detener()
+        
+        # Mostrar tokens
         if tokens:
             self.mostrar_tokens(tokens)
         
-        # Analizar y evaluar
-        var_nombre, valor, datos = self.analizador.evaluar_expresion(expresion)
-        
         if isinstance(datos, list) and len(datos) > 0 and isinstance(datos[0], str):
             # Errores
             self.mostrar_errores(datos)
@@ -643,6 +741,7 @@ Características:
                   command=var_window.destroy).pack(pady=10)
     
     def limpiar(self):
+        self.cancelar_analisis()
         self.entrada_expresion.delete(0, tk.END)
         self.limpiar_resultados()
     
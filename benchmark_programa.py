@@ -0,0 +1,386 @@
+"""
+Benchmarks del Analizador Sintáctico Descendente
+
+Autores:
+    - Juan Esteban Cardozo Rivera
+    - Juan Sebastián Gómez Usuga
+
+Descripción:
+    Mediciones de rendimiento de CalculadoraDescendente sin interfaz gráfica.
+    Cada benchmark imprime una tabla con los resultados.
+
+Uso:
+    python benchmark_programa.py            # Ejecuta todos los benchmarks
+    python benchmark_programa.py lexico     # Solo el benchmark indicado
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from programa import (CalculadoraDescendente, InterfazCalculadora, MODOS_NUMERICOS, NIVELES_TRAZA,
+                      ArchivoMapeado, _leer_lineas, evaluar_archivos_mapeados, evaluar_flujo)
+
+
+def _tokenizar_original(expresion):
+    """Tokenizador original (un re.compile por patrón y posición), como referencia"""
+    patrones = [
+        ('NUMERO', r'\d+(\.\d+)?'),
+        ('POT', r'\*\*|\^'),
+        ('MOD', r'%'),
+        ('SUMA', r'\+'),
+        ('RESTA', r'\-'),
+        ('MULT', r'\*'),
+        ('DIV', r'\/'),
+        ('PAREN_IZQ', r'\('),
+        ('PAREN_DER', r'\)'),
+        ('ESPACIO', r'\s+'),
+    ]
+    tokens = []
+    pos = 0
+    while pos < len(expresion):
+        for tipo, patron in patrones:
+            match = re.compile(patron).match(expresion, pos)
+            if match:
+                if tipo != 'ESPACIO':
+                    tokens.append((tipo, match.group()))
+                pos = match.end()
+                break
+        else:
+            return []
+    return tokens
+
+
+def generar_expresion(longitud):
+    """Genera una expresión válida de aproximadamente `longitud` caracteres"""
+    bloque = "(12.5 + 3) * 4 ** 2 - 7 % 3 / 2 + "
+    repeticiones = longitud // len(bloque) + 1
+    return (bloque * repeticiones)[:max(longitud - 1, 0)].rstrip(" +-*/%^(") + "1"
+
+
+def medir(funcion, *args, minimo=0.2):
+    """Ejecuta la función repetidamente durante `minimo` segundos y retorna el tiempo por llamada"""
+    repeticiones = 0
+    inicio = time.perf_counter()
+    while True:
+        funcion(*args)
+        repeticiones += 1
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido >= minimo:
+            return transcurrido / repeticiones
+
+
+def benchmark_lexico():
+    """Throughput del análisis léxico (tokens/segundo) para entradas de 10 a 10^6 caracteres"""
+    calc = CalculadoraDescendente()
+
+    print("BENCHMARK: ANÁLISIS LÉXICO (tokenizar)")
+    print("=" * 78)
+    print(f"{'CARACTERES':>12} {'TOKENS':>10} {'ACTUAL (tok/s)':>18} {'ORIGINAL (tok/s)':>18} {'MEJORA':>10}")
+    print("-" * 78)
+
+    for exponente in range(1, 7):
+        expresion = generar_expresion(10 ** exponente)
+        num_tokens = len(calc.tokenizar(expresion))
+
+        tiempo_actual = medir(calc.tokenizar, expresion)
+        # El tokenizador original es muy lento en entradas grandes: una sola pasada basta
+        tiempo_original = medir(_tokenizar_original, expresion, minimo=0.2 if exponente < 6 else 0)
+
+        print(f"{len(expresion):>12} {num_tokens:>10} {num_tokens / tiempo_actual:>18,.0f} "
+              f"{num_tokens / tiempo_original:>18,.0f} {tiempo_original / tiempo_actual:>9.1f}x")
+
+    print()
+
+
+def memoria_pico(funcion, *args):
+    """Retorna el pico de memoria (bytes) asignada durante una llamada"""
+    tracemalloc.start()
+    try:
+        funcion(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_traza():
+    """Tiempo y memoria por expresión según el nivel de traza de derivación"""
+    print("BENCHMARK: NIVEL DE TRAZA DE DERIVACIÓN (analizar)")
+    print("=" * 78)
+    print(f"{'CARACTERES':>12} {'NIVEL':>12} {'µs/EXPR':>12} {'MEMORIA PICO':>14} {'ACELERACIÓN':>12}")
+    print("-" * 78)
+
+    for longitud in (20, 200, 2000):
+        expresion = generar_expresion(longitud)
+        base_tiempo = None
+        for nivel in reversed(NIVELES_TRAZA):
+            calc = CalculadoraDescendente(nivel_traza=nivel)
+            tiempo = medir(calc.analizar, expresion)
+            memoria = memoria_pico(calc.analizar, expresion)
+            if base_tiempo is None:
+                base_tiempo = tiempo
+            print(f"{len(expresion):>12} {nivel:>12} {tiempo * 1e6:>12.1f} "
+                  f"{memoria / 1024:>11.1f} KB {base_tiempo / tiempo:>11.2f}x")
+        print()
+
+
+def benchmark_motor():
+    """Escalado del motor iterativo hasta 10^6 tokens, comparado con el recursivo"""
+    iterativo = CalculadoraDescendente(nivel_traza='desactivada', motor='iterativo')
+    recursivo = CalculadoraDescendente(nivel_traza='desactivada', motor='recursivo')
+
+    print("BENCHMARK: MOTOR ITERATIVO vs RECURSIVO (analizar, sin traza)")
+    print("=" * 78)
+    print(f"{'TOKENS':>10} {'ITERATIVO (ms)':>16} {'ns/TOKEN':>10} {'MEMORIA PICO':>14} {'RECURSIVO (ms)':>16}")
+    print("-" * 78)
+
+    for exponente in range(2, 7):
+        terminos = 10 ** exponente // 4
+        expresion = " + ".join(["(3 * 2)"] * terminos)
+        num_tokens = len(iterativo.tokenizar(expresion))
+
+        tiempo = medir(iterativo.analizar, expresion, minimo=0.2 if exponente < 6 else 0)
+        memoria = memoria_pico(iterativo.analizar, expresion)
+        resultado, errores = recursivo.analizar(expresion)
+        if errores:
+            columna_recursivo = "límite recursión"
+        else:
+            columna_recursivo = f"{medir(recursivo.analizar, expresion) * 1e3:.2f}"
+
+        print(f"{num_tokens:>10} {tiempo * 1e3:>16.2f} {tiempo / num_tokens * 1e9:>10.0f} "
+              f"{memoria / 1024 / 1024:>11.1f} MB {columna_recursivo:>16}")
+
+    print()
+
+
+def benchmark_codigo():
+    """Evaluaciones por segundo de una fórmula compilada: clausuras vs código generado"""
+    calc = CalculadoraDescendente(nivel_traza='desactivada')
+    formulas = [
+        "2 + 3 * 4",
+        "(12.5 + 3) * 4 ** 2 - 7 % 3 / 2",
+        generar_expresion(200),
+        generar_expresion(2000),
+    ]
+
+    print("BENCHMARK: BACKEND DE CÓDIGO vs CLAUSURAS (evaluar una fórmula compilada)")
+    print("=" * 78)
+    print(f"{'CARACTERES':>12} {'ANALIZAR (µs)':>14} {'CLAUSURAS (µs)':>15} {'CÓDIGO (µs)':>12} {'MEJORA':>8} {'BACKEND':>10}")
+    print("-" * 78)
+
+    for formula in formulas:
+        tiempo_analizar = medir(calc.analizar, formula)
+        clausuras, _ = calc.compilar(formula)
+        codigo, _ = calc.compilar(formula, backend='codigo')
+        tiempo_clausuras = medir(clausuras)
+        tiempo_codigo = medir(codigo)
+        print(f"{len(formula):>12} {tiempo_analizar * 1e6:>14.2f} {tiempo_clausuras * 1e6:>15.2f} "
+              f"{tiempo_codigo * 1e6:>12.2f} {tiempo_clausuras / tiempo_codigo:>7.1f}x {codigo.backend:>10}")
+
+    print()
+
+
+def benchmark_vectorizado():
+    """Filas por segundo: una evaluación vectorizada con NumPy frente a una llamada por fila"""
+    try:
+        import numpy
+    except ImportError:
+        print("BENCHMARK: EVALUACIÓN VECTORIZADA - omitido (NumPy no está instalado)\n")
+        return
+    calc = CalculadoraDescendente(nivel_traza='desactivada')
+    formula = "(precio * cantidad - descuento) * (1 + tasa / 100) ** 2 % 1000"
+    compilada, _ = calc.compilar(formula, optimizar=True, backend='codigo')
+    generador = numpy.random.default_rng(1234)
+
+    print("BENCHMARK: EVALUACIÓN VECTORIZADA vs FILA POR FILA")
+    print("=" * 78)
+    print(f"{'FILAS':>10} {'VECTORIZADO (filas/s)':>22} {'POR FILA (filas/s)':>20} {'MEJORA':>10}")
+    print("-" * 78)
+
+    for exponente in range(3, 7):
+        filas = 10 ** exponente
+        columnas = {
+            'precio': generador.uniform(1, 100, filas),
+            'cantidad': generador.integers(1, 50, filas).astype(float),
+            'descuento': generador.uniform(0, 10, filas),
+            'tasa': generador.uniform(0, 20, filas),
+        }
+        tiempo_vectorizado = medir(compilada.evaluar_vectorizado, columnas)
+        registros = [dict(zip(columnas, valores)) for valores in
+                     zip(*(columna.tolist() for columna in columnas.values()))]
+
+        def por_fila():
+            for registro in registros:
+                compilada(registro)
+
+        tiempo_por_fila = medir(por_fila, minimo=0.2 if exponente < 6 else 0)
+        print(f"{filas:>10} {filas / tiempo_vectorizado:>22,.0f} {filas / tiempo_por_fila:>20,.0f} "
+              f"{tiempo_por_fila / tiempo_vectorizado:>9.1f}x")
+
+    print()
+
+
+def benchmark_tokens():
+    """Memoria y tiempo de la lista de tuplas frente a FlujoTokens en entradas grandes"""
+    listas = CalculadoraDescendente(nivel_traza='desactivada', motor='iterativo')
+    compactos = CalculadoraDescendente(nivel_traza='desactivada', motor='iterativo', tokens_compactos=True)
+
+    print("BENCHMARK: LISTA DE TUPLAS vs FLUJO DE TOKENS COMPACTO (analizar, motor iterativo)")
+    print("=" * 78)
+    print(f"{'CARACTERES':>12} {'TOKENS':>10} {'PICO LISTA':>14} {'PICO FLUJO':>14} {'LISTA (ms)':>11} {'FLUJO (ms)':>11}")
+    print("-" * 78)
+
+    for exponente in range(4, 8):
+        expresion = generar_expresion(10 ** exponente)
+        num_tokens = len(compactos.tokenizar_flujo(expresion))
+        minimo = 0.2 if exponente < 6 else 0
+        memoria_lista = memoria_pico(listas.analizar, expresion)
+        memoria_flujo = memoria_pico(compactos.analizar, expresion)
+        tiempo_lista = medir(listas.analizar, expresion, minimo=minimo)
+        tiempo_flujo = medir(compactos.analizar, expresion, minimo=minimo)
+        print(f"{len(expresion):>12} {num_tokens:>10} {memoria_lista / 1024 / 1024:>11.1f} MB "
+              f"{memoria_flujo / 1024 / 1024:>11.1f} MB {tiempo_lista * 1e3:>11.1f} {tiempo_flujo * 1e3:>11.1f}")
+
+    print()
+
+
+def benchmark_mmap():
+    """Lectura por líneas frente a lectura con mmap en archivos de expresiones grandes"""
+    calc = CalculadoraDescendente(nivel_traza='desactivada', motor='iterativo')
+
+    print("BENCHMARK: LECTURA POR LÍNEAS vs MMAP (modo línea de comandos, salida descartada)")
+    print("=" * 78)
+    print(f"{'LÍNEAS':>10} {'MB':>8} {'ÍNDICE (ms)':>12} {'LÍNEAS (l/s)':>14} {'MMAP (l/s)':>14} {'MMAP x2 (l/s)':>14}")
+    print("-" * 78)
+
+    with tempfile.TemporaryDirectory() as directorio, open(os.devnull, 'w') as nulo:
+        ruta = os.path.join(directorio, 'expresiones.txt')
+        for exponente in range(3, 7):
+            lineas = 10 ** exponente
+            with open(ruta, 'w') as archivo:
+                for i in range(lineas):
+                    archivo.write(f"({i} + 3) * 4 ** 2 - {i} % 7 / 2\n")
+
+            inicio = time.perf_counter()
+            with ArchivoMapeado(ruta) as archivo:
+                len(archivo)
+            tiempo_indice = time.perf_counter() - inicio
+            tiempo_lineas = medir(lambda: evaluar_flujo(_leer_lineas([ruta]), nulo, 'csv', calc), minimo=0)
+            tiempo_mmap = medir(lambda: evaluar_archivos_mapeados([ruta], nulo, 'csv', calc), minimo=0)
+            tiempo_procesos = medir(lambda: evaluar_archivos_mapeados([ruta], nulo, 'csv', calc, procesos=2),
+                                    minimo=0)
+            print(f"{lineas:>10} {os.path.getsize(ruta) / 1024 / 1024:>8.1f} {tiempo_indice * 1e3:>12.2f} "
+                  f"{lineas / tiempo_lineas:>14,.0f} {lineas / tiempo_mmap:>14,.0f} {lineas / tiempo_procesos:>14,.0f}")
+
+    print()
+
+
+def benchmark_modos():
+    """Costo de cada modo numérico al evaluar y al llamar una expresión compilada"""
+    enteros = " + ".join(f"({i} * 37 - {i} % 5) ** 2" for i in range(1, 21))
+    divisiones = " + ".join(f"{i} / 7 * 3.5 - {i}" for i in range(1, 21))
+
+    print("BENCHMARK: MODOS NUMÉRICOS (evaluar con motor iterativo y expresión compilada)")
+    print("=" * 78)
+    print(f"{'MODO':>10} {'ENTEROS (µs)':>14} {'CON / (µs)':>12} {'COMPILADA (µs)':>16} {'TIPO RESULTADO':>20}")
+    print("-" * 78)
+
+    for modo in MODOS_NUMERICOS:
+        calc = CalculadoraDescendente(nivel_traza='desactivada', motor='iterativo', modo_numerico=modo)
+        compilada, _ = calc.compilar(enteros, backend='codigo')
+        tiempo_enteros = medir(calc.evaluar, enteros)
+        tiempo_divisiones = medir(calc.evaluar, divisiones)
+        tiempo_compilada = medir(compilada)
+        tipo = type(calc.evaluar(enteros).valor).__name__
+        print(f"{modo:>10} {tiempo_enteros * 1e6:>14.1f} {tiempo_divisiones * 1e6:>12.1f} "
+              f"{tiempo_compilada * 1e6:>16.2f} {tipo:>20}")
+
+    print()
+
+
+def _mostrar_tokens_original(texto, tokens):
+    """mostrar_tokens() original: un insert (una llamada a Tcl) por línea de la tabla"""
+    texto.insert('end', "ANÁLISIS LÉXICO - TOKENS IDENTIFICADOS\n")
+    texto.insert('end', "=" * 60 + "\n\n")
+    texto.insert('end', f"{'#':<4} {'TIPO':<15} {'VALOR':<15} {'CATEGORÍA':<20}\n")
+    texto.insert('end', "-" * 60 + "\n")
+    for i, (tipo, valor) in enumerate(tokens, 1):
+        texto.insert('end', f"{i:<4} {tipo:<15} {valor:<15} {'Operando':<20}\n")
+    texto.insert('end', f"\n✓ Total de tokens: {len(tokens)}\n")
+
+
+def _mostrar_traza_original(texto, traza):
+    """mostrar_arbol_derivacion() original: un insert por paso de la traza"""
+    texto.insert('end', "TRAZA DEL ANÁLISIS SINTÁCTICO DESCENDENTE\n")
+    for paso in traza:
+        texto.insert('end', f"{paso}\n")
+
+
+def benchmark_render():
+    """Tiempo de dibujo de las pestañas de tokens y traza según la cantidad de tokens"""
+    try:
+        import tkinter
+        raiz = tkinter.Tk()
+    except Exception:
+        print("BENCHMARK: DIBUJO DE RESULTADOS - omitido (tkinter sin pantalla disponible)\n")
+        return
+    raiz.withdraw()
+    interfaz = InterfazCalculadora(raiz)
+    calc = CalculadoraDescendente(nivel_traza='desactivada')
+
+    def dibujar(funcion, texto, datos):
+        texto.delete('1.0', 'end')
+        funcion(texto, datos)
+        raiz.update_idletasks()
+
+    print("BENCHMARK: DIBUJO DE RESULTADOS (insert por línea vs una sola llamada)")
+    print("=" * 78)
+    print(f"{'TOKENS':>8} {'TOKENS ORIG (ms)':>17} {'TOKENS (ms)':>12} {'TRAZA ORIG (ms)':>16} {'TRAZA (ms)':>11} {'MEJORA':>8}")
+    print("-" * 78)
+
+    for cantidad in (1000, 5000, 20000, 50000):
+        tokens = calc.tokenizar(" + ".join(["12.5"] * (cantidad // 2 + 1)))[:cantidad]
+        traza = [f"        F → {valor} (número)" for _, valor in tokens]
+        minimo = 0.2 if cantidad <= 5000 else 0
+        tokens_original = medir(dibujar, _mostrar_tokens_original, interfaz.tokens_texto, tokens, minimo=minimo)
+        tokens_actual = medir(dibujar, lambda texto, datos: interfaz.mostrar_tokens(datos),
+                              interfaz.tokens_texto, tokens, minimo=minimo)
+        traza_original = medir(dibujar, _mostrar_traza_original, interfaz.arbol_texto, traza, minimo=minimo)
+        traza_actual = medir(dibujar, lambda texto, datos: interfaz.mostrar_arbol_derivacion(datos),
+                             interfaz.arbol_texto, traza, minimo=minimo)
+        print(f"{len(tokens):>8} {tokens_original * 1e3:>17.1f} {tokens_actual * 1e3:>12.1f} "
+              f"{traza_original * 1e3:>16.1f} {traza_actual * 1e3:>11.1f} "
+              f"{(tokens_original + traza_original) / (tokens_actual + traza_actual):>7.1f}x")
+
+    raiz.destroy()
+    print()
+
+
+BENCHMARKS = {
+    'lexico': benchmark_lexico,
+    'traza': benchmark_traza,
+    'motor': benchmark_motor,
+    'codigo': benchmark_codigo,
+    'vectorizado': benchmark_vectorizado,
+    'tokens': benchmark_tokens,
+    'mmap': benchmark_mmap,
+    'modos': benchmark_modos,
+    'render': benchmark_render,
+}
+
+
+def main(argumentos):
+    seleccion = argumentos or list(BENCHMARKS)
+    for nombre in seleccion:
+        if nombre not in BENCHMARKS:
+            print(f"Benchmark desconocido: {nombre}. Disponibles: {', '.join(BENCHMARKS)}")
+            return 1
+        BENCHMARKS[nombre]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
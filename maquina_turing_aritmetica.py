@@ -18,6 +18,8 @@ from tkinter import ttk, scrolledtext, messagebox
 from datetime import datetime
 import time
 
+from tareas import PanelProgreso, TareaSegundoPlano, verificar_cancelacion
+
 
 class MaquinaTuring:
     """Implementación de una Máquina de Turing para operaciones aritméticas"""
@@ -29,6 +31,9 @@ class MaquinaTuring:
         self.estado_aceptacion = 'qf'
         self.simbolo_blanco = '_'
         self.historial = []
+        # threading.Event opcional: al activarlo, la ejecución se detiene con
+        # TareaCancelada en el siguiente paso
+        self.cancelacion = None
         
     def inicializar_cinta(self, contenido):
         """Inicializa la cinta con el contenido dado"""
@@ -67,6 +72,7 @@ class MaquinaTuring:
     
     def registrar_paso(self, accion=""):
         """Registra el estado actual en el historial"""
+        verificar_cancelacion(self.cancelacion)
         cinta_str = ''.join(self.cinta) if self.cinta else self.simbolo_blanco
         self.historial.append({
             'paso': len(self.historial),
@@ -195,6 +201,7 @@ class InterfazMaquinaTuring:
         self.root.geometry("1000x700")
         
         self.maquina = MaquinaTuring()
+        self.tarea = None  # Ejecución en segundo plano en curso
         self.crear_interfaz()
     
     def crear_interfaz(self):
@@ -256,6 +263,10 @@ class InterfazMaquinaTuring:
         ttk.Button(botones_frame, text="📚 Ejemplos",
                   command=self.mostrar_ejemplos, width=15).pack(side=tk.LEFT, padx=3)
         
+        # Progreso de la ejecución en segundo plano
+        self.progreso = PanelProgreso(botones_frame, self.cancelar_operacion)
+        self.progreso.frame.pack(side=tk.LEFT, padx=(12, 0))
+        
         # Notebook
         self.notebook = ttk.Notebook(main_frame)
         self.notebook.pack(fill=tk.BOTH, expand=True)
@@ -313,22 +324,52 @@ class InterfazMaquinaTuring:
                                       "Números grandes pueden tardar. Se recomienda ≤ 20")
             
             tipo = self.tipo_operacion.get()
-            
-            self.limpiar_resultados()
-            
+        except ValueError:
+            messagebox.showerror("Error", "Por favor ingrese números válidos")
+            return
+        
+        self.cancelar_operacion()
+        self.limpiar_resultados()
+        
+        # La máquina corre en un hilo de trabajo (una máquina nueva por
+        # ejecución); los resultados se muestran en el hilo de tkinter
+        def ejecutar(cancelacion):
+            maquina = MaquinaTuring()
+            maquina.cancelacion = cancelacion
             if tipo == "Suma":
-                resultado, historial = self.maquina.suma_unaria(a, b)
+                resultado, historial = maquina.suma_unaria(a, b)
                 operador = "+"
             else:  # Multiplicación
-                resultado, historial = self.maquina.multiplicacion_unaria(a, b)
+                resultado, historial = maquina.multiplicacion_unaria(a, b)
                 operador = "×"
-            
-            self.mostrar_resultado(a, b, resultado, tipo, operador)
-            self.mostrar_traza(historial)
-            self.mostrar_cinta_visual(historial)
-            
-        except ValueError:
-            messagebox.showerror("Error", "Por favor ingrese números válidos")
+            return maquina, resultado, historial, operador
+        
+        self.progreso.iniciar("Ejecutando la máquina...")
+        self.tarea = TareaSegundoPlano(self.root, ejecutar,
+                                       lambda datos: self.mostrar_operacion(a, b, tipo, *datos),
+                                       self.mostrar_error_ejecucion).iniciar()
+    
+    def cancelar_operacion(self):
+        """Detiene la ejecución en segundo plano en curso (si la hay)"""
+        if self.tarea is not None:
+            if self.tarea.activa:
+                self.progreso.detener("Ejecución cancelada")
+            self.tarea.cancelar()
+            self.tarea = None
+    
+    def mostrar_error_ejecucion(self, excepcion):
+        self.tarea = None
+        self.progreso.detener()
+        messagebox.showerror("Error", f"Error durante la ejecución: {str(excepcion)}")
+    
+    def mostrar_operacion(self, a, b, tipo, maquina, resultado, historial, operador):
+        """Muestra el resultado de una ejecución en segundo plano"""
+        self.tarea = None
+        self.progreso.detener()
+        self.maquina = maquina
+        self.mostrar_resultado(a, b, resultado, tipo, operador)
+        self.mostrar_traza(historial)
+        self.mostrar_cinta_visual(historial)
     
     def mostrar_resultado(self, a, b, resultado, tipo, operador):
         """Muestra el resultado de la operación"""
@@ -563,6 +604,7 @@ CARACTERÍSTICAS:
     
     def limpiar(self):
         """Limpia los campos de entrada"""
+        self.cancelar_operacion()
         self.entrada_a.delete(0, tk.END)
         self.entrada_b.delete(0, tk.END)
         self.limpiar_resultados()
@@ -18,6 +18,8 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 from datetime import datetime
 
+from tareas import PanelProgreso, TareaSegundoPlano, verificar_cancelacion
+
 
 class MaquinaTuringLenguajes:
     """Máquina de Turing para reconocer lenguajes formales"""
@@ -31,6 +33,9 @@ class MaquinaTuringLenguajes:
         self.simbolo_blanco = '∅'
         self.historial = []
         self.max_pasos = 1000
+        # threading.Event opcional: al activarlo, la ejecución se detiene con
+        # TareaCancelada en el siguiente paso
+        self.cancelacion = None
         
     def inicializar_cinta(self, cadena):
         """Inicializa la cinta con la cadena de entrada"""
@@ -65,6 +70,7 @@ class MaquinaTuringLenguajes:
     
     def registrar_paso(self, accion=""):
         """Registra el estado actual en el historial"""
+        verificar_cancelacion(self.cancelacion)
         cinta_visual = ''.join(self.cinta).replace(self.simbolo_blanco, '_')
         self.historial.append({
             'paso': len(self.historial),
@@ -308,6 +314,7 @@ class InterfazMTLenguajes:
         self.root.geometry("1100x750")
         
         self.maquina = MaquinaTuringLenguajes()
+        self.tarea = None  # Ejecución en segundo plano en curso
         self.crear_interfaz()
     
     def crear_interfaz(self):
@@ -365,6 +372,10 @@ class InterfazMTLenguajes:
         ttk.Button(botones_frame, text="📚 Ejemplos",
                   command=self.mostrar_ejemplos, width=15).pack(side=tk.LEFT, padx=3)
         
+        # Progreso de la ejecución en segundo plano
+        self.progreso = PanelProgreso(botones_frame, self.cancelar_verificacion)
+        self.progreso.frame.pack(side=tk.LEFT, padx=(12, 0))
+        
         # Notebook
         self.notebook = ttk.Notebook(main_frame)
         self.notebook.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -430,19 +441,50 @@ USO:
         cadena = self.entrada_cadena.get().strip()
         tipo = self.tipo_lenguaje.get()
         
+        self.cancelar_verificacion()
         self.limpiar_resultados()
         
-        # Ejecutar verificación según el tipo
-        if tipo == "a^n b^n c^n":
-            aceptada, historial = self.maquina.reconocer_anbn(cadena)
-            lenguaje_desc = "L = {a^n b^n c^n | n ≥ 1}"
-        elif tipo == "Palíndromo":
-            aceptada, historial = self.maquina.reconocer_palindromo(cadena)
-            lenguaje_desc = "L = {w | w = w^R, w ∈ {a,b}*}"
-        else:  # a^n b^2n
-            aceptada, historial = self.maquina.reconocer_anb2n(cadena)
-            lenguaje_desc = "L = {a^n b^2n | n ≥ 1}"
-        
+        # La máquina corre en un hilo de trabajo (una máquina nueva por
+        # ejecución); los resultados se muestran en el hilo de tkinter
+        def ejecutar(cancelacion):
+            maquina = MaquinaTuringLenguajes()
+            maquina.cancelacion = cancelacion
+            
+            # Ejecutar verificación según el tipo
+            if tipo == "a^n b^n c^n":
+                aceptada, historial = maquina.reconocer_anbn(cadena)
+                lenguaje_desc = "L = {a^n b^n c^n | n ≥ 1}"
+            elif tipo == "Palíndromo":
+                aceptada, historial = maquina.reconocer_palindromo(cadena)
+                lenguaje_desc = "L = {w | w = w^R, w ∈ {a,b}*}"
+            else:  # a^n b^2n
+                aceptada, historial = maquina.reconocer_anb2n(cadena)
+                lenguaje_desc = "L = {a^n b^2n | n ≥ 1}"
+            return maquina, aceptada, historial, lenguaje_desc
+        
+        self.progreso.iniciar("Ejecutando la máquina...")
+        self.tarea = TareaSegundoPlano(self.root, ejecutar,
+                                       lambda datos: self.mostrar_verificacion(cadena, tipo, *datos),
+                                       self.mostrar_error_ejecucion).iniciar()
+    
+    def cancelar_verificacion(self):
+        """Detiene la ejecución en segundo plano en curso (si la hay)"""
+        if self.tarea is not None:
+            if self.tarea.activa:
+                self.progreso.detener("Ejecución cancelada")
+            self.tarea.cancelar()
+            self.tarea = None
+    
+    def mostrar_error_ejecucion(self, excepcion):
+        self.tarea = None
+        self.progreso.detener()
+        messagebox.showerror("Error", f"Error durante la ejecución: {str(excepcion)}")
+    
+    def mostrar_verificacion(self, cadena, tipo, maquina, aceptada, historial, lenguaje_desc):
+        """Muestra el resultado de una ejecución en segundo plano"""
+        self.tarea = None
+        self.progreso.detener()
+        self.maquina = maquina
         self.mostrar_resultado(cadena, tipo, aceptada, historial, lenguaje_desc)
         self.mostrar_traza(historial)
         self.mostrar_tabla_transiciones(tipo)
@@ -580,6 +622,7 @@ USO:
     
     def limpiar(self):
         """Limpia todos los campos"""
+        self.cancelar_verificacion()
         self.entrada_cadena.delete(0, tk.END)
         self.limpiar_resultados()
     
@@ -0,0 +1,156 @@
+"""
+Métricas de rendimiento de los analizadores
+
+Autores:
+    - Juan Esteban Cardozo Rivera
+    - Juan Sebastián Gómez Usuga
+
+Descripción:
+    Registro de tiempos por fase (léxico, sintáctico y evaluación) y contadores
+    de cada análisis, y un agregador por proceso que acumula los registros y
+    los muestra como histogramas. Sirve para saber en qué fase se va el tiempo
+    de las expresiones lentas. Los analizadores que evalúan durante el análisis
+    sintáctico (los dos de este proyecto) no tienen una fase de evaluación
+    aparte: su tiempo queda en la fase sintáctica.
+
+Uso:
+    resultado, errores, metricas = calculadora.analizar("2 + 3", metricas=True)
+    var, valor, traza, metricas = analizador.evaluar_expresion("x = 2", metricas=True)
+    AGREGADOR.volcar()   # Histogramas de todo lo registrado en el proceso
+"""
+
+import sys
+import threading
+from typing import NamedTuple, Optional
+
+
+class MetricasAnalisis(NamedTuple):
+    """Tiempos (en segundos) y contadores de un análisis"""
+    tiempo_lexico: float
+    tiempo_sintactico: float
+    tiempo_evaluacion: Optional[float]   # None: se evalúa durante el análisis sintáctico
+    tokens: int
+    profundidad_maxima: int   # Mayor altura de la pila del análisis
+    longitud_traza: int       # Líneas de traza o pasos Shift-Reduce
+
+    @property
+    def tiempo_total(self):
+        return self.tiempo_lexico + self.tiempo_sintactico + (self.tiempo_evaluacion or 0)
+
+
+# Fases con tiempo medido y su nombre en los reportes
+FASES = (
+    ('tiempo_lexico', 'léxico'),
+    ('tiempo_sintactico', 'sintáctico'),
+    ('tiempo_evaluacion', 'evaluación'),
+    ('tiempo_total', 'total'),
+)
+
+
+class _Histograma:
+    """
+    Histograma con cubetas de potencias de 2: la cubeta k cuenta los valores
+    menores que 2**k (en microsegundos para los tiempos)
+    """
+
+    __slots__ = ('cubetas', 'cantidad', 'suma', 'maximo')
+
+    def __init__(self):
+        self.cubetas = {}
+        self.cantidad = 0
+        self.suma = 0
+        self.maximo = 0
+
+    def agregar(self, valor):
+        cubeta = int(valor).bit_length()
+        self.cubetas[cubeta] = self.cubetas.get(cubeta, 0) + 1
+        self.cantidad += 1
+        self.suma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def como_diccionario(self):
+        return {
+            'cantidad': self.cantidad,
+            'media': self.suma / self.cantidad if self.cantidad else 0,
+            'maximo': self.maximo,
+            'cubetas': {2 ** cubeta: cuenta for cubeta, cuenta in sorted(self.cubetas.items())},
+        }
+
+
+class AgregadorMetricas:
+    """
+    Acumula MetricasAnalisis por origen ('descendente', 'ascendente'...) en
+    histogramas. Es seguro usarlo desde varios hilos; cada proceso tiene el
+    suyo (AGREGADOR).
+    """
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._origenes = {}
+
+    def registrar(self, origen, metricas):
+        """Agrega un registro de métricas al histograma de su origen"""
+        with self._candado:
+            histogramas = self._origenes.get(origen)
+            if histogramas is None:
+                histogramas = {campo: _Histograma() for campo, _ in FASES}
+                histogramas['tokens'] = _Histograma()
+                histogramas['profundidad_maxima'] = _Histograma()
+                self._origenes[origen] = histogramas
+            for campo, _ in FASES:
+                valor = getattr(metricas, campo)
+                if valor is not None:
+                    histogramas[campo].agregar(valor * 1e6)
+            histogramas['tokens'].agregar(metricas.tokens)
+            histogramas['profundidad_maxima'].agregar(metricas.profundidad_maxima)
+
+    def histogramas(self):
+        """
+        Retorna {origen: {medida: {'cantidad', 'media', 'maximo', 'cubetas'}}};
+        los tiempos están en microsegundos y cada cubeta se identifica por su
+        límite superior (exclusivo)
+        """
+        with self._candado:
+            return {origen: {medida: histograma.como_diccionario()
+                             for medida, histograma in histogramas.items()}
+                    for origen, histogramas in self._origenes.items()}
+
+    def reiniciar(self):
+        """Descarta todo lo registrado"""
+        with self._candado:
+            self._origenes.clear()
+
+    def volcar(self, salida=None):
+        """Escribe un resumen y los histogramas de tiempo de cada origen"""
+        salida = salida or sys.stdout
+        for origen, medidas in self.histogramas().items():
+            cantidad = medidas['tiempo_total']['cantidad']
+            print(f"MÉTRICAS: {origen} ({cantidad} análisis)", file=salida)
+            print("=" * 60, file=salida)
+            print(f"{'FASE':<12} {'MEDIA (µs)':>12} {'MÁXIMO (µs)':>14} {'% DEL TOTAL':>12}", file=salida)
+            total = medidas['tiempo_total']['media'] or 1
+            # Las fases que ningún análisis midió por separado no se muestran
+            fases = [(campo, nombre) for campo, nombre in FASES if medidas[campo]['cantidad']]
+            for campo, nombre in fases:
+                medida = medidas[campo]
+                print(f"{nombre:<12} {medida['media']:>12.1f} {medida['maximo']:>14.1f} "
+                      f"{medida['media'] / total * 100:>11.1f}%", file=salida)
+            print(f"{'tokens':<12} {medidas['tokens']['media']:>12.1f} {medidas['tokens']['maximo']:>14}", file=salida)
+            print(f"{'profundidad':<12} {medidas['profundidad_maxima']['media']:>12.1f} "
+                  f"{medidas['profundidad_maxima']['maximo']:>14}", file=salida)
+            for campo, nombre in fases:
+                print(f"\nHistograma {nombre} (µs):", file=salida)
+                _escribir_cubetas(medidas[campo]['cubetas'], cantidad, salida)
+            print(file=salida)
+
+
+def _escribir_cubetas(cubetas, cantidad, salida, ancho=40):
+    """Una línea por cubeta con una barra proporcional a su cuenta"""
+    for limite, cuenta in cubetas.items():
+        barra = '█' * max(1, round(cuenta / cantidad * ancho))
+        print(f"  < {limite:>9} | {barra} {cuenta}", file=salida)
+
+
+# Agregador del proceso: los analizadores registran aquí cada análisis con métricas
+AGREGADOR = AgregadorMetricas()
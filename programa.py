@@ -14,9 +14,21 @@ Características:
     - Análisis léxico con tokenización mediante expresiones regulares
     - Análisis sintáctico descendente recursivo
     - Soporte para operadores: +, -, *, /, %, ** (potenciación)
+    - Variables (x, tasa_1...) con valores escalares o arreglos de NumPy
     - Manejo de paréntesis y precedencia de operadores
-    - Interfaz gráfica con tkinter
+    - Modos numéricos: float, enteros exactos, fracciones (Fraction) o Decimal
+    - Interfaz gráfica con tkinter (el análisis corre en segundo plano y se puede cancelar)
+    - Vista previa del resultado mientras se escribe (evaluación incremental)
     - Historial de cálculos y exportación de resultados
+    - Modo de línea de comandos sin interfaz gráfica (CSV / JSONL)
+
+Uso:
+    python programa.py                                  # Interfaz gráfica
+    python programa.py --cli [ARCHIVO ...] [--formato csv|jsonl]
+        Lee una expresión por línea (de los archivos o de la entrada estándar)
+        y escribe los resultados en la salida estándar a medida que los calcula.
+    python programa.py --cli --mmap ARCHIVO ... [--procesos N]
+        Igual, pero lee los archivos con mmap: pensado para archivos enormes.
 
 Gramática:
     E  → T E'
@@ -25,83 +37,552 @@ Gramática:
     T' → * P T' | / P T' | % P T' | ε
     P  → F P'
     P' → ** F P' | ^ F P' | ε
-    F  → ( E ) | número | -número
+    F  → ( E ) | número | -número | variable | -variable
 """
 
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog, scrolledtext
+import argparse
+import csv
+import json
+import math
+import mmap
+import os
 import re
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime
+from decimal import Decimal
+from fractions import Fraction
+from itertools import islice
+from typing import NamedTuple, Optional, Tuple
+
+from metricas import AGREGADOR, MetricasAnalisis
+from tareas import PanelProgreso, TareaCancelada, TareaSegundoPlano, verificar_cancelacion
+
+# tkinter se importa bajo demanda (ver _importar_tkinter): el modo de línea de
+# comandos y los usos sin interfaz no lo necesitan
+tk = ttk = messagebox = filedialog = scrolledtext = None
+
+# NumPy es opcional: solo lo necesita la evaluación vectorizada (ver _importar_numpy)
+np = None
+
+
+def _importar_tkinter():
+    """Importa tkinter y sus módulos solo cuando se crea la interfaz gráfica"""
+    global tk, ttk, messagebox, filedialog, scrolledtext
+    if tk is None:
+        import tkinter
+        from tkinter import ttk as _ttk, messagebox as _messagebox
+        from tkinter import filedialog as _filedialog, scrolledtext as _scrolledtext
+        tk, ttk, messagebox = tkinter, _ttk, _messagebox
+        filedialog, scrolledtext = _filedialog, _scrolledtext
+
+def _importar_numpy():
+    """Importa NumPy la primera vez que se evalúa una expresión vectorizada"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("La evaluación vectorizada requiere NumPy (pip install numpy)") from None
+        np = numpy
+    return np
+
+# Patrones para tokens, en orden de prioridad (gana el primero que coincide)
+PATRONES_TOKENS = [
+    ('NUMERO', r'\d+(?:\.\d+)?'),    # Números enteros o decimales
+    ('VARIABLE', r'[A-Za-z_][A-Za-z0-9_]*'),  # Identificadores de variables
+    ('POT', r'\*\*|\^'),             # Potenciación (** o ^)
+    ('MOD', r'%'),                   # Módulo
+    ('SUMA', r'\+'),                 # Suma
+    ('RESTA', r'\-'),                # Resta
+    ('MULT', r'\*'),                 # Multiplicación
+    ('DIV', r'\/'),                  # División
+    ('PAREN_IZQ', r'\('),            # Paréntesis izquierdo
+    ('PAREN_DER', r'\)'),            # Paréntesis derecho
+    ('ESPACIO', r'\s+'),             # Espacios (se ignoran)
+]
+
+# Expresión regular maestra: una sola alternancia con grupos con nombre,
+# compilada una vez por proceso. La alternativa INVALIDO captura cualquier
+# otro caracter para reportarlo como error léxico.
+_REGEX_TOKENS = re.compile(
+    '|'.join(f'(?P<{tipo}>{patron})' for tipo, patron in PATRONES_TOKENS)
+    + r'|(?P<INVALIDO>.)',
+    re.DOTALL
+)
+
+# Tipos de token que llegan al analizador. FlujoTokens guarda cada tipo como
+# su índice en esta tupla; el código siguiente al último representa EOF.
+TIPOS_TOKEN = tuple(tipo for tipo, _ in PATRONES_TOKENS if tipo != 'ESPACIO')
+_CODIGOS_TOKEN = {tipo: codigo for codigo, tipo in enumerate(TIPOS_TOKEN)}
+_CODIGO_EOF = len(TIPOS_TOKEN)
+
+
+# Niveles de traza de derivación
+TRAZA_DESACTIVADA = 'desactivada'  # No se genera traza (sin costo)
+TRAZA_RESUMEN = 'resumen'          # Solo inicio, resumen y fin del análisis
+TRAZA_ARBOL = 'arbol'              # Todas las producciones, guardadas como ArbolDerivacion
+                                   # (el texto se genera solo si se muestra)
+TRAZA_COMPLETA = 'completa'        # Todas las producciones aplicadas
+NIVELES_TRAZA = (TRAZA_DESACTIVADA, TRAZA_RESUMEN, TRAZA_ARBOL, TRAZA_COMPLETA)
+
+# Motores de análisis sintáctico
+MOTOR_RECURSIVO = 'recursivo'      # Métodos E/T/P/F (una llamada por producción)
+MOTOR_ITERATIVO = 'iterativo'      # Bucle con pila explícita (sin límite de recursión)
+MOTORES = (MOTOR_RECURSIVO, MOTOR_ITERATIVO)
+
+# Formas de evaluar una expresión compilada
+BACKEND_CLAUSURAS = 'clausuras'    # Árbol de clausuras de Python
+BACKEND_CODIGO = 'codigo'          # Código fuente Python compilado con compile()
+BACKENDS = (BACKEND_CLAUSURAS, BACKEND_CODIGO)
+
+# Representación de los números de la expresión
+MODO_FLOTANTE = 'flotante'         # float para todos los literales (comportamiento original)
+MODO_ENTERO = 'entero'             # int para literales sin punto decimal; / produce float
+MODO_FRACCION = 'fraccion'         # Fraction: aritmética racional exacta
+MODO_DECIMAL = 'decimal'           # Decimal con la precisión del contexto actual (% toma
+                                   # el signo del dividendo, como en Decimal)
+MODOS_NUMERICOS = (MODO_FLOTANTE, MODO_ENTERO, MODO_FRACCION, MODO_DECIMAL)
+
+
+def _convertir_entero(texto):
+    """int si el literal no tiene punto decimal; float en otro caso"""
+    return float(texto) if '.' in texto else int(texto)
+
+
+# Función que convierte el texto de un token NUMERO en cada modo numérico
+_CONVERSORES_NUMERO = {
+    MODO_FLOTANTE: float,
+    MODO_ENTERO: _convertir_entero,
+    MODO_FRACCION: Fraction,
+    MODO_DECIMAL: Decimal,
+}
+
+
+def normalizar_expresion(expresion):
+    """Colapsa los espacios de la expresión (no cambia sus tokens): clave de la caché"""
+    return ' '.join(expresion.split())
+
+
+class CacheExpresiones:
+    """Caché LRU acotada para expresiones, con contadores de aciertos, fallos y desalojos"""
+    
+    def __init__(self, tamano_maximo=1024):
+        if tamano_maximo < 1:
+            raise ValueError("El tamaño máximo de la caché debe ser al menos 1")
+        self.tamano_maximo = tamano_maximo
+        self._entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+    
+    def obtener(self, clave):
+        """Retorna el valor guardado (marcándolo como usado recientemente) o None"""
+        try:
+            valor = self._entradas[clave]
+        except KeyError:
+            self.fallos += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return valor
+    
+    def guardar(self, clave, valor):
+        """Guarda un valor; si la caché está llena desaloja el menos usado recientemente"""
+        self._entradas[clave] = valor
+        self._entradas.move_to_end(clave)
+        if len(self._entradas) > self.tamano_maximo:
+            self._entradas.popitem(last=False)
+            self.desalojos += 1
+    
+    def limpiar(self):
+        """Vacía la caché y reinicia los contadores"""
+        self._entradas.clear()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+    
+    def estadisticas(self):
+        """Retorna un diccionario con el estado de la caché"""
+        return {
+            'tamano': len(self._entradas),
+            'tamano_maximo': self.tamano_maximo,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'desalojos': self.desalojos,
+        }
+    
+    def __len__(self):
+        return len(self._entradas)
+
+
+class PresupuestoEvaluacion(NamedTuple):
+    """
+    Límites de costo de cada evaluación (None = sin límite). Una expresión que
+    los supera se aborta con un 'Error de presupuesto'.
+    """
+    magnitud_maxima: Optional[float] = None   # Mayor valor absoluto de un número o resultado parcial
+    exponente_maximo: Optional[float] = None  # Mayor valor absoluto de un exponente
+    tiempo_maximo: Optional[float] = None     # Segundos de reloj por expresión (sin la tokenización)
+
+
+class PresupuestoExcedido(Exception):
+    """La evaluación superó alguno de los límites de su PresupuestoEvaluacion"""
+
+
+class _ControlPresupuesto:
+    """
+    Verificaciones de un PresupuestoEvaluacion durante una evaluación. El
+    tiempo se mide desde la creación del control.
+    
+    Las potencias se verifican antes de calcularlas: el exponente contra
+    exponente_maximo, y la magnitud estimada con logaritmos (la del resultado
+    o la de su inverso) contra magnitud_maxima. Así se rechaza 9 ** 9 ** 9
+    sin calcularla, porque una operación ya iniciada no se puede interrumpir. Por la misma razón cada
+    verificación consulta también el evento `cancelacion` (si lo hay).
+    """
+    
+    __slots__ = ('presupuesto', 'limite_tiempo', '_log_magnitud', 'cancelacion')
+    
+    def __init__(self, presupuesto, cancelacion=None):
+        self.presupuesto = presupuesto
+        self.cancelacion = cancelacion
+        self.limite_tiempo = (None if presupuesto.tiempo_maximo is None
+                              else time.perf_counter() + presupuesto.tiempo_maximo)
+        self._log_magnitud = (None if presupuesto.magnitud_maxima is None
+                              else math.log(presupuesto.magnitud_maxima))
+    
+    def verificar(self, valor):
+        """Verifica la magnitud de un valor y el tiempo transcurrido; retorna el valor"""
+        if self.cancelacion is not None:
+            verificar_cancelacion(self.cancelacion)
+        magnitud_maxima = self.presupuesto.magnitud_maxima
+        if magnitud_maxima is not None and abs(valor) > magnitud_maxima:
+            raise PresupuestoExcedido(f"El resultado supera la magnitud máxima permitida ({magnitud_maxima:g})")
+        if self.limite_tiempo is not None and time.perf_counter() > self.limite_tiempo:
+            raise PresupuestoExcedido(
+                f"Se superó el tiempo máximo de evaluación ({self.presupuesto.tiempo_maximo:g} s)")
+        return valor
+    
+    def potencia(self, base, exponente):
+        """Verifica una potencia antes de calcularla"""
+        exponente_maximo = self.presupuesto.exponente_maximo
+        if exponente_maximo is not None and abs(exponente) > exponente_maximo:
+            raise PresupuestoExcedido(f"El exponente supera el máximo permitido ({exponente_maximo:g})")
+        if self._log_magnitud is None or isinstance(base, complex) or isinstance(exponente, complex):
+            return
+        if base == 0:
+            # 0 ** e es 0, 1 o una división por cero: nunca un número costoso
+            return
+        # Se acota también el inverso: con fracciones 0.3 ** -20000000 (o
+        # 0.3 ** 20000000) tiene un numerador o un denominador enorme
+        if abs(float(exponente) * _logaritmo(abs(base))) > self._log_magnitud:
+            raise PresupuestoExcedido(
+                f"La potencia supera la magnitud máxima permitida ({self.presupuesto.magnitud_maxima:g})")
+    
+    def operar(self, operador, izquierdo, derecho):
+        """_operar() con las verificaciones del presupuesto"""
+        if operador == 'POT':
+            self.potencia(izquierdo, derecho)
+        return self.verificar(_operar(operador, izquierdo, derecho))
+
+
+def _logaritmo(valor):
+    """Logaritmo natural de un número positivo de cualquier modo numérico, como float"""
+    if isinstance(valor, Decimal):
+        return float(valor.ln())
+    if isinstance(valor, Fraction):
+        # Sin pasar por float: el cociente podría no caber en uno
+        return math.log(valor.numerator) - math.log(valor.denominator)
+    return math.log(valor)
+
+
+def _validar_presupuesto(presupuesto):
+    """Verifica que los límites del presupuesto sean positivos"""
+    for campo, valor in zip(PresupuestoEvaluacion._fields, presupuesto):
+        if valor is not None and not valor > 0:
+            raise ValueError(f"{campo} debe ser mayor que cero: {valor!r}")
+
+
+# Producciones de la gramática: (símbolo, cuerpo, línea de traza). La línea se
+# completa con el dato que se registró al aplicar la producción: la posición
+# (E, T, P), el resultado parcial (E', T', P'), el valor (número) o el par
+# (nombre, valor) (variable)
+PRODUCCIONES = (
+    ('E', "T E'", "  E → T E' (posición {})"),
+    ("E'", "+ T E'", "    E' → + T E' (sumando {} + ...)"),
+    ("E'", "- T E'", "    E' → - T E' (restando {} - ...)"),
+    ("E'", "ε", "    E' → ε (resultado parcial: {})"),
+    ('T', "P T'", "    T → P T' (posición {})"),
+    ("T'", "* P T'", "      T' → * P T' (multiplicando {} * ...)"),
+    ("T'", "/ P T'", "      T' → / P T' (dividiendo {} / ...)"),
+    ("T'", "% P T'", "      T' → % P T' (módulo {} % ...)"),
+    ("T'", "ε", "      T' → ε (resultado parcial: {})"),
+    ('P', "F P'", "      P → F P' (posición {})"),
+    ("P'", "** F P'", "        P' → ** F P' (potencia {} ** ...)"),
+    ("P'", "ε", "        P' → ε (resultado parcial: {})"),
+    ('F', "( E )", "        F → ( E ) (subexpresión en paréntesis)"),
+    ('F', "número", "        F → {} (número)"),
+    ('F', "variable", "        F → {} (variable = {})"),
+    ('F', "-número", "        F → -número (número negativo)"),
+)
+(_PROD_E, _PROD_E_SUMA, _PROD_E_RESTA, _PROD_E_VACIA,
+ _PROD_T, _PROD_T_MULT, _PROD_T_DIV, _PROD_T_MOD, _PROD_T_VACIA,
+ _PROD_P, _PROD_P_POT, _PROD_P_VACIA,
+ _PROD_F_PAREN, _PROD_F_NUMERO, _PROD_F_VARIABLE, _PROD_F_NEGATIVO) = range(len(PRODUCCIONES))
+
+# Cantidad de no terminales en el cuerpo de cada producción (hijos del nodo).
+# F → -número tiene un hijo F solo en -( E ): ver _hijos_produccion()
+_HIJOS_PRODUCCION = (2, 2, 2, 0, 2, 2, 2, 2, 0, 2, 2, 0, 1, 0, 0, 0)
+
+
+def _formatear_produccion(produccion, dato):
+    """Línea de traza (igual a la de TRAZA_COMPLETA) de una producción registrada"""
+    formato = PRODUCCIONES[produccion][2]
+    if produccion == _PROD_F_VARIABLE:
+        return formato.format(*dato)
+    return formato.format(dato)
+
+
+def _hijos_produccion(produccion, dato):
+    if produccion == _PROD_F_NEGATIVO:
+        return 1 if dato == 'PAREN_IZQ' else 0
+    return _HIJOS_PRODUCCION[produccion]
+
+
+class NodoDerivacion:
+    """Nodo del árbol de derivación: una producción aplicada y sus hijos"""
+
+    __slots__ = ('produccion', 'dato', 'hijos')
+
+    def __init__(self, produccion, dato):
+        self.produccion = produccion
+        self.dato = dato
+        self.hijos = []
+
+    @property
+    def simbolo(self):
+        return PRODUCCIONES[self.produccion][0]
+
+    @property
+    def cuerpo(self):
+        return PRODUCCIONES[self.produccion][1]
+
+    def etiqueta(self):
+        """Texto del nodo en el dibujo del árbol"""
+        if self.produccion == _PROD_F_NUMERO:
+            return f"F → {self.dato}"
+        if self.produccion == _PROD_F_VARIABLE:
+            return f"F → {self.dato[0]} (= {self.dato[1]})"
+        return f"{self.simbolo} → {self.cuerpo}"
+
+    def __repr__(self):
+        return f"NodoDerivacion({self.etiqueta()!r}, hijos={len(self.hijos)})"
+
+
+class ArbolDerivacion:
+    """
+    Árbol de derivación guardado como tabla: el código de cada producción
+    aplicada (array de bytes) y su dato, en preorden. El analizador solo
+    agrega dos elementos por producción; el texto de la traza (lineas_traza)
+    y los NodoDerivacion (raiz, dibujar) se construyen cuando se piden. Tras
+    un error de sintaxis la tabla contiene las producciones aplicadas hasta
+    el error, igual que la traza de texto.
+    """
+
+    __slots__ = ('producciones', 'datos')
 
-class CalculadoraDescendente:
     def __init__(self):
+        self.producciones = array('B')
+        self.datos = []
+
+    def agregar(self, produccion, dato=None):
+        self.producciones.append(produccion)
+        self.datos.append(dato)
+
+    def __len__(self):
+        return len(self.producciones)
+
+    def lineas_traza(self):
+        """Genera las líneas de traza de las producciones, sin construir los nodos"""
+        for produccion, dato in zip(self.producciones, self.datos):
+            yield _formatear_produccion(produccion, dato)
+
+    def raiz(self):
+        """
+        Construye los NodoDerivacion y retorna la raíz (None si la tabla está
+        vacía). En preorden cada nodo es hijo del último nodo que aún espera hijos.
+        """
+        raiz = None
+        pendientes = []  # [nodo, hijos que faltan]
+        for produccion, dato in zip(self.producciones, self.datos):
+            nodo = NodoDerivacion(produccion, dato)
+            if pendientes:
+                padre = pendientes[-1]
+                padre[0].hijos.append(nodo)
+                padre[1] -= 1
+                if not padre[1]:
+                    pendientes.pop()
+            else:
+                raiz = nodo
+            hijos = _hijos_produccion(produccion, dato)
+            if hijos:
+                pendientes.append([nodo, hijos])
+        return raiz
+
+    def dibujar(self):
+        """Genera las líneas del árbol dibujado con ├── y └── (sin recursión)"""
+        raiz = self.raiz()
+        if raiz is None:
+            return
+        yield raiz.etiqueta()
+        pendientes = [(hijo, '', hijo is raiz.hijos[-1]) for hijo in reversed(raiz.hijos)]
+        while pendientes:
+            nodo, prefijo, ultimo = pendientes.pop()
+            yield f"{prefijo}{'└── ' if ultimo else '├── '}{nodo.etiqueta()}"
+            prefijo_hijos = prefijo + ('    ' if ultimo else '│   ')
+            pendientes.extend((hijo, prefijo_hijos, hijo is nodo.hijos[-1])
+                              for hijo in reversed(nodo.hijos))
+
+
+def lineas_traza(traza, arbol=None):
+    """
+    Líneas de una traza de derivación. Con un ArbolDerivacion (TRAZA_ARBOL)
+    sus producciones se intercalan, ya formateadas, después de la primera
+    línea ("Inicio del análisis sintáctico") de `traza`.
+    """
+    if arbol is None:
+        yield from traza
+        return
+    yield from traza[:1]
+    yield from arbol.lineas_traza()
+    yield from traza[1:]
+
+
+class _AnalisisDescendente:
+    """
+    Estado de un análisis descendente recursivo (tokens, posición, variables,
+    traza y control del presupuesto) y las producciones de la gramática que lo
+    recorren. CalculadoraDescendente guarda en él su último análisis;
+    evaluar(traza=True) usa uno propio de la llamada.
+    """
+    
+    def __init__(self, nivel_traza=TRAZA_COMPLETA, motor=MOTOR_RECURSIVO, presupuesto=None,
+                 convertir=float, cancelacion=None):
         self.tokens = []
         self.posicion = 0
         self.errores = []
         self.traza_derivacion = []  # Para guardar el árbol de derivación
+        self.arbol_derivacion = None  # ArbolDerivacion del último análisis (solo con TRAZA_ARBOL)
+        self.variables = {}         # Valores de las variables del análisis en curso
+        self.nivel_traza = nivel_traza
+        self.motor = motor
+        # Límites de costo opcionales (PresupuestoEvaluacion) y su control durante el análisis
+        self.presupuesto = presupuesto
+        self._control = None
+        # threading.Event opcional: al activarlo, el análisis en curso se
+        # detiene con TareaCancelada en el siguiente número u operación
+        self.cancelacion = cancelacion
+        # Conversor del texto de cada número (ver _CONVERSORES_NUMERO)
+        self._convertir = convertir
+        # Con _medir_profundidad (solo las métricas) las producciones cuentan
+        # cuántas están en curso; profundidad_maxima queda con el máximo
+        # alcanzado por el motor, aunque el análisis falle
+        self._medir_profundidad = False
+        self.profundidad = self.profundidad_maxima = 0
+    
+    @property
+    def nivel_traza(self):
+        """Nivel de traza de derivación: 'desactivada', 'resumen', 'arbol' o 'completa'"""
+        return self._nivel_traza
+    
+    @nivel_traza.setter
+    def nivel_traza(self, nivel):
+        if nivel not in NIVELES_TRAZA:
+            raise ValueError(f"Nivel de traza no válido: {nivel!r}. Opciones: {', '.join(NIVELES_TRAZA)}")
+        self._nivel_traza = nivel
+        # Banderas consultadas en cada producción: con la traza desactivada no se
+        # construye ninguna cadena. _traza_completa indica que se registran las
+        # producciones (como texto o, con TRAZA_ARBOL, como nodos)
+        self._traza_activa = nivel != TRAZA_DESACTIVADA
+        self._traza_completa = nivel in (TRAZA_COMPLETA, TRAZA_ARBOL)
         
-    def analizar(self, expresion):
-        """Método principal para analizar la expresión"""
-        self.tokens = self.tokenizar(expresion)
+    def _analizar_tokens(self, tokens, variables=None):
+        """Análisis sintáctico y evaluación de tokens ya obtenidos (lista o FlujoTokens)"""
+        self.tokens = tokens
         self.posicion = 0
         self.errores = []
         self.traza_derivacion = []  # Reiniciar traza
+        self.arbol_derivacion = ArbolDerivacion() if self._nivel_traza == TRAZA_ARBOL else None
+        self.variables = variables or {}
+        self._control = self._crear_control()
+        self.profundidad = self.profundidad_maxima = 0
         
         if not self.tokens:
             return None, ["Error: Expresión vacía"]
             
         try:
-            self.traza_derivacion.append("Inicio del análisis sintáctico")
-            resultado = self.E()
+            if self._traza_activa:
+                self.traza_derivacion.append("Inicio del análisis sintáctico")
+            if self.motor == MOTOR_ITERATIVO:
+                marcos = [0] if self._medir_profundidad else None
+                try:
+                    resultado, self.posicion = _ejecutar_motor_iterativo(
+                        self.tokens, _acciones_evaluacion(self.variables, self._control, self._convertir),
+                        marcos)
+                finally:
+                    if marcos is not None:
+                        self.profundidad_maxima = marcos[0]
+            else:
+                resultado = self.E()
             if self.posicion < len(self.tokens):
-                tokens_restantes = ' '.join([t[1] for t in self.tokens[self.posicion:]])
-                self.errores.append(f"Error de sintaxis: Caracteres adicionales después de la expresión válida: '{tokens_restantes}'")
+                self.errores.append(_error_caracteres_adicionales(self.tokens, self.posicion))
                 return None, self.errores
-            self.traza_derivacion.append("✓ Análisis sintáctico completado exitosamente")
+            if self._traza_activa:
+                # El motor iterativo no registra producciones: solo deja el resumen
+                if not self._traza_completa or self.motor == MOTOR_ITERATIVO:
+                    self.traza_derivacion.append(f"  Resumen: {len(self.tokens)} tokens analizados, resultado {resultado}")
+                self.traza_derivacion.append("✓ Análisis sintáctico completado exitosamente")
             return resultado, self.errores
+        except TareaCancelada:
+            raise
+        except PresupuestoExcedido as e:
+            self.errores.append(f"Error de presupuesto: {str(e)}")
+            return None, self.errores
         except Exception as e:
             self.errores.append(f"Error de sintaxis: {str(e)}")
             return None, self.errores
     
-    def tokenizar(self, expresion):
-        """Convierte la expresión en una lista de tokens"""
-        # Patrones para tokens
-        patrones = [
-            ('NUMERO', r'\d+(\.\d+)?'),      # Números enteros o decimales
-            ('POT', r'\*\*|\^'),             # Potenciación (** o ^)
-            ('MOD', r'%'),                   # Módulo
-            ('SUMA', r'\+'),                 # Suma
-            ('RESTA', r'\-'),                # Resta
-            ('MULT', r'\*'),                 # Multiplicación
-            ('DIV', r'\/'),                  # División
-            ('PAREN_IZQ', r'\('),            # Paréntesis izquierdo
-            ('PAREN_DER', r'\)'),            # Paréntesis derecho
-            ('ESPACIO', r'\s+'),             # Espacios (se ignoran)
-        ]
-        
-        tokens = []
-        pos = 0
-        
-        while pos < len(expresion):
-            coincide = False
-            for tipo, patron in patrones:
-                regex = re.compile(patron)
-                match = regex.match(expresion, pos)
-                if match:
-                    valor = match.group()
-                    if tipo != 'ESPACIO':  # Ignorar espacios
-                        tokens.append((tipo, valor))
-                    pos = match.end()
-                    coincide = True
-                    break
-            
-            if not coincide:
-                # Caracter no reconocido
-                self.errores.append(f"Error léxico: Caracter no válido '{expresion[pos]}' en la posición {pos}")
-                self.errores.append(f"  Sugerencia: Solo se permiten números, operadores (+, -, *, /, **, ^, %) y paréntesis")
-                return []
-        
-        return tokens
+    def _entrar(self):
+        """Cuenta una producción más en curso (solo al medir la profundidad)"""
+        self.profundidad += 1
+        if self.profundidad > self.profundidad_maxima:
+            self.profundidad_maxima = self.profundidad
+    
+    def _registrar(self, produccion, dato=None):
+        """Registra una producción aplicada: como nodo del árbol o como línea de traza"""
+        if self.arbol_derivacion is not None:
+            self.arbol_derivacion.agregar(produccion, dato)
+        else:
+            self.traza_derivacion.append(_formatear_produccion(produccion, dato))
+    
+    def _crear_control(self):
+        """Control del presupuesto y de la cancelación de un análisis (None si no hacen falta)"""
+        if self.presupuesto is None and self.cancelacion is None:
+            return None
+        return _ControlPresupuesto(self.presupuesto or PresupuestoEvaluacion(), self.cancelacion)
+    
+    def valor_variable(self, nombre):
+        """Retorna el valor de una variable del análisis en curso"""
+        if nombre not in self.variables:
+            raise Exception(f"Variable no definida: '{nombre}'")
+        if self._control is not None:
+            self._control.verificar(self.variables[nombre])
+        return self.variables[nombre]
     
     def token_actual(self):
         """Retorna el token actual"""
@@ -124,112 +605,187 @@ class CalculadoraDescendente:
     
     def E(self):
         """E → T E'"""
-        self.traza_derivacion.append(f"  E → T E' (posición {self.posicion})")
+        if self._medir_profundidad:
+            self._entrar()
+        if self._traza_completa:
+            self._registrar(_PROD_E, self.posicion)
         resultado = self.T()
-        return self.E_prima(resultado)
+        resultado = self.E_prima(resultado)
+        if self._medir_profundidad:
+            self.profundidad -= 1
+        return resultado
     
     def E_prima(self, resultado_anterior):
         """E' → + T E' | - T E' | ε"""
+        if self._medir_profundidad:
+            self._entrar()
         token_actual = self.token_actual()
         
         if token_actual[0] == 'SUMA':
-            self.traza_derivacion.append(f"    E' → + T E' (sumando {resultado_anterior} + ...)")
+            if self._traza_completa:
+                self._registrar(_PROD_E_SUMA, resultado_anterior)
             self.consumir('SUMA')
             resultado = resultado_anterior + self.T()
-            return self.E_prima(resultado)
+            if self._control is not None:
+                self._control.verificar(resultado)
+            resultado = self.E_prima(resultado)
         elif token_actual[0] == 'RESTA':
-            self.traza_derivacion.append(f"    E' → - T E' (restando {resultado_anterior} - ...)")
+            if self._traza_completa:
+                self._registrar(_PROD_E_RESTA, resultado_anterior)
             self.consumir('RESTA')
             resultado = resultado_anterior - self.T()
-            return self.E_prima(resultado)
+            if self._control is not None:
+                self._control.verificar(resultado)
+            resultado = self.E_prima(resultado)
         else:
             # ε (epsilon - producción vacía)
-            self.traza_derivacion.append(f"    E' → ε (resultado parcial: {resultado_anterior})")
-            return resultado_anterior
+            if self._traza_completa:
+                self._registrar(_PROD_E_VACIA, resultado_anterior)
+            resultado = resultado_anterior
+        if self._medir_profundidad:
+            self.profundidad -= 1
+        return resultado
     
     def T(self):
         """T → P T'"""
-        self.traza_derivacion.append(f"    T → P T' (posición {self.posicion})")
+        if self._medir_profundidad:
+            self._entrar()
+        if self._traza_completa:
+            self._registrar(_PROD_T, self.posicion)
         resultado = self.P()
-        return self.T_prima(resultado)
+        resultado = self.T_prima(resultado)
+        if self._medir_profundidad:
+            self.profundidad -= 1
+        return resultado
     
     def T_prima(self, resultado_anterior):
         """T' → * P T' | / P T' | % P T' | ε"""
+        if self._medir_profundidad:
+            self._entrar()
         token_actual = self.token_actual()
         
         if token_actual[0] == 'MULT':
-            self.traza_derivacion.append(f"      T' → * P T' (multiplicando {resultado_anterior} * ...)")
+            if self._traza_completa:
+                self._registrar(_PROD_T_MULT, resultado_anterior)
             self.consumir('MULT')
             resultado = resultado_anterior * self.P()
-            return self.T_prima(resultado)
+            if self._control is not None:
+                self._control.verificar(resultado)
+            resultado = self.T_prima(resultado)
         elif token_actual[0] == 'DIV':
-            self.traza_derivacion.append(f"      T' → / P T' (dividiendo {resultado_anterior} / ...)")
+            if self._traza_completa:
+                self._registrar(_PROD_T_DIV, resultado_anterior)
             self.consumir('DIV')
             divisor = self.P()
             if divisor == 0:
                 raise Exception("División por cero detectada")
             resultado = resultado_anterior / divisor
-            return self.T_prima(resultado)
+            if self._control is not None:
+                self._control.verificar(resultado)
+            resultado = self.T_prima(resultado)
         elif token_actual[0] == 'MOD':
-            self.traza_derivacion.append(f"      T' → % P T' (módulo {resultado_anterior} % ...)")
+            if self._traza_completa:
+                self._registrar(_PROD_T_MOD, resultado_anterior)
             self.consumir('MOD')
             divisor = self.P()
             if divisor == 0:
                 raise Exception("Módulo por cero no está definido")
             resultado = resultado_anterior % divisor
-            return self.T_prima(resultado)
+            if self._control is not None:
+                self._control.verificar(resultado)
+            resultado = self.T_prima(resultado)
         else:
             # ε (epsilon - producción vacía)
-            self.traza_derivacion.append(f"      T' → ε (resultado parcial: {resultado_anterior})")
-            return resultado_anterior
+            if self._traza_completa:
+                self._registrar(_PROD_T_VACIA, resultado_anterior)
+            resultado = resultado_anterior
+        if self._medir_profundidad:
+            self.profundidad -= 1
+        return resultado
     
     def P(self):
         """P → F P'"""
-        self.traza_derivacion.append(f"      P → F P' (posición {self.posicion})")
+        if self._medir_profundidad:
+            self._entrar()
+        if self._traza_completa:
+            self._registrar(_PROD_P, self.posicion)
         resultado = self.F()
-        return self.P_prima(resultado)
+        resultado = self.P_prima(resultado)
+        if self._medir_profundidad:
+            self.profundidad -= 1
+        return resultado
     
     def P_prima(self, resultado_anterior):
         """P' → ** F P' | ^ F P' | ε"""
+        if self._medir_profundidad:
+            self._entrar()
         token_actual = self.token_actual()
         
         if token_actual[0] == 'POT':
-            self.traza_derivacion.append(f"        P' → ** F P' (potencia {resultado_anterior} ** ...)")
+            if self._traza_completa:
+                self._registrar(_PROD_P_POT, resultado_anterior)
             self.consumir('POT')
             exponente = self.F()
+            if self._control is not None:
+                self._control.potencia(resultado_anterior, exponente)
             resultado = resultado_anterior ** exponente
-            return self.P_prima(resultado)
+            if self._control is not None:
+                self._control.verificar(resultado)
+            resultado = self.P_prima(resultado)
         else:
             # ε (epsilon - producción vacía)
-            self.traza_derivacion.append(f"        P' → ε (resultado parcial: {resultado_anterior})")
-            return resultado_anterior
+            if self._traza_completa:
+                self._registrar(_PROD_P_VACIA, resultado_anterior)
+            resultado = resultado_anterior
+        if self._medir_profundidad:
+            self.profundidad -= 1
+        return resultado
     
     def F(self):
-        """F → ( E ) | numero | -numero"""
+        """F → ( E ) | numero | -numero | variable | -variable"""
+        if self._medir_profundidad:
+            self._entrar()
         token_actual = self.token_actual()
         
         if token_actual[0] == 'PAREN_IZQ':
-            self.traza_derivacion.append(f"        F → ( E ) (subexpresión en paréntesis)")
+            if self._traza_completa:
+                self._registrar(_PROD_F_PAREN)
             self.consumir('PAREN_IZQ')
             resultado = self.E()
             self.consumir('PAREN_DER')
-            return resultado
         elif token_actual[0] == 'NUMERO':
             token = self.consumir('NUMERO')
-            valor = float(token[1])
-            self.traza_derivacion.append(f"        F → {valor} (número)")
-            return valor
+            valor = self._convertir(token[1])
+            if self._control is not None:
+                self._control.verificar(valor)
+            if self._traza_completa:
+                self._registrar(_PROD_F_NUMERO, valor)
+            resultado = valor
+        elif token_actual[0] == 'VARIABLE':
+            token = self.consumir('VARIABLE')
+            valor = self.valor_variable(token[1])
+            if self._traza_completa:
+                self._registrar(_PROD_F_VARIABLE, (token[1], valor))
+            resultado = valor
         elif token_actual[0] == 'RESTA':
             # Manejar números negativos
-            self.traza_derivacion.append(f"        F → -número (número negativo)")
             self.consumir('RESTA')
             siguiente = self.token_actual()
+            if self._traza_completa:
+                # El tipo del siguiente token indica si el nodo tiene un F hijo: -( E )
+                self._registrar(_PROD_F_NEGATIVO, siguiente[0])
             if siguiente[0] == 'NUMERO':
                 token = self.consumir('NUMERO')
-                return -float(token[1])
+                valor = -self._convertir(token[1])
+                if self._control is not None:
+                    self._control.verificar(valor)
+                resultado = valor
+            elif siguiente[0] == 'VARIABLE':
+                token = self.consumir('VARIABLE')
+                resultado = -self.valor_variable(token[1])
             elif siguiente[0] == 'PAREN_IZQ':
                 # Permitir -(expresión)
-                return -self.F()
+                resultado = -self.F()
             else:
                 raise Exception("Se esperaba un número o expresión después del signo negativo")
         else:
@@ -237,17 +793,1650 @@ class CalculadoraDescendente:
                 raise Exception(f"Expresión incompleta: se esperaba un número o paréntesis")
             else:
                 raise Exception(f"Token inesperado '{token_actual[1]}'. Se esperaba un número o paréntesis")
+        if self._medir_profundidad:
+            self.profundidad -= 1
+        return resultado
+
+
+class CalculadoraDescendente(_AnalisisDescendente):
+    def __init__(self, tamano_cache=0, nivel_traza=TRAZA_COMPLETA, motor=MOTOR_RECURSIVO,
+                 tokens_compactos=False, presupuesto=None, modo_numerico=MODO_FLOTANTE):
+        if motor not in MOTORES:
+            raise ValueError(f"Motor no válido: {motor!r}. Opciones: {', '.join(MOTORES)}")
+        if modo_numerico not in MODOS_NUMERICOS:
+            raise ValueError(f"Modo numérico no válido: {modo_numerico!r}. "
+                             f"Opciones: {', '.join(MODOS_NUMERICOS)}")
+        if presupuesto is not None:
+            _validar_presupuesto(presupuesto)
+        super().__init__(nivel_traza, motor, presupuesto, _CONVERSORES_NUMERO[modo_numerico])
+        # Con tokens_compactos=True el análisis usa un FlujoTokens en lugar de
+        # una lista de tuplas (menos memoria en expresiones muy grandes)
+        self.tokens_compactos = tokens_compactos
+        # Tipo de los números: con MODO_ENTERO los literales enteros no pasan
+        # por float y solo la división / produce un float
+        self.modo_numerico = modo_numerico
+        # Caché opcional (tamano_cache > 0) de resultados y expresiones compiladas
+        self.cache = CacheExpresiones(tamano_cache) if tamano_cache > 0 else None
+    
+    def analizar(self, expresion, variables=None, metricas=False):
+        """
+        Método principal para analizar la expresión. `variables` asocia cada
+        nombre de variable con su valor; usar una variable sin valor es un error.
+        Con metricas=True retorna (resultado, errores, MetricasAnalisis) y
+        registra las métricas en metricas.AGREGADOR (sin pasar por la caché).
+        """
+        if metricas:
+            return self._analizar_con_metricas(expresion, variables)
+        if self.cache is None or variables:
+            return self._analizar(expresion, variables)
+        
+        # Sin variables el resultado (o el error) es siempre el mismo para el
+        # mismo texto, así que se guarda completo
+        clave = ('resultado', self.motor, self._nivel_traza, self.presupuesto, self.modo_numerico,
+                 normalizar_expresion(expresion))
+        entrada = self.cache.obtener(clave)
+        if entrada is None:
+            resultado, errores = self._analizar(expresion)
+            self.cache.guardar(clave, (resultado, tuple(errores), tuple(self.traza_derivacion),
+                                       self.arbol_derivacion, _congelar_tokens(self.tokens)))
+            return resultado, errores
+        
+        # El ArbolDerivacion no se modifica después del análisis: se comparte
+        resultado, errores, traza, arbol, tokens = entrada
+        self.tokens = tokens if isinstance(tokens, FlujoTokens) else list(tokens)
+        self.posicion = len(self.tokens)
+        self.errores = list(errores)
+        self.traza_derivacion = list(traza)
+        self.arbol_derivacion = arbol
+        return resultado, self.errores
+    
+    def _analizar(self, expresion, variables=None):
+        """Análisis completo (léxico, sintáctico y evaluación) sin pasar por la caché"""
+        # Lista nueva: la del análisis anterior ya fue retornada a quien lo pidió
+        self.errores = []
+        return self._analizar_tokens(self._tokenizar_analisis(expresion), variables)
+    
+    def _analizar_con_metricas(self, expresion, variables=None):
+        """
+        _analizar() midiendo cada fase. Los dos motores analizan y evalúan en
+        el mismo recorrido, así que el tiempo sintáctico incluye la evaluación
+        y tiempo_evaluacion es None. La profundidad es la mayor que alcanzó el
+        motor, también si el análisis falla: producciones en curso (marcos de
+        la pila de Python) en el recursivo y marcos abiertos en el iterativo.
+        """
+        inicio = time.perf_counter()
+        self.errores = []
+        tokens = self._tokenizar_analisis(expresion)
+        fin_lexico = time.perf_counter()
+        self._medir_profundidad = True
+        try:
+            resultado, errores = self._analizar_tokens(tokens, variables)
+        finally:
+            self._medir_profundidad = False
+        fin_analisis = time.perf_counter()
+        
+        longitud_traza = len(self.traza_derivacion)
+        if self.arbol_derivacion is not None:
+            longitud_traza += len(self.arbol_derivacion)
+        metricas = MetricasAnalisis(fin_lexico - inicio, fin_analisis - fin_lexico, None, len(tokens),
+                                    self.profundidad_maxima, longitud_traza)
+        AGREGADOR.registrar('descendente', metricas)
+        return resultado, errores, metricas
+    
+    def lineas_traza(self):
+        """
+        Genera las líneas de la traza del último análisis. Con TRAZA_ARBOL las
+        líneas de las producciones se formatean recién aquí, a partir del árbol.
+        """
+        return lineas_traza(self.traza_derivacion, self.arbol_derivacion)
+    
+    def compilar(self, expresion, optimizar=False, backend=BACKEND_CLAUSURAS):
+        """
+        Analiza la expresión una sola vez y retorna (ExpresionCompilada, errores).
+        La expresión compilada puede evaluarse muchas veces sin volver a
+        tokenizar ni a recorrer la gramática. Con optimizar=True el árbol pasa
+        además por optimizar_arbol(); con backend=BACKEND_CODIGO se traduce a
+        una función de Python (ver generar_codigo()). La expresión compilada
+        aplica el presupuesto de la calculadora en cada evaluación.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend no válido: {backend!r}. Opciones: {', '.join(BACKENDS)}")
+        if self.cache is not None:
+            clave = ('compilado', optimizar, backend, self.modo_numerico, self.presupuesto,
+                     normalizar_expresion(expresion))
+            compilada = self.cache.obtener(clave)
+            if compilada is None:
+                compilada, errores = self._compilar(expresion, optimizar, backend)
+                if compilada is not None:
+                    self.cache.guardar(clave, compilada)
+                return compilada, errores
+            self.errores = []
+            return compilada, self.errores
+        return self._compilar(expresion, optimizar, backend)
+    
+    def _compilar(self, expresion, optimizar=False, backend=BACKEND_CLAUSURAS):
+        """Compilación sin pasar por la caché"""
+        self.errores = []
+        self.tokens = self._tokenizar_analisis(expresion)
+        self.posicion = 0
+        
+        if not self.tokens:
+            return None, self.errores or ["Error: Expresión vacía"]
+        
+        try:
+            # El árbol se construye con el motor iterativo: admite expresiones
+            # de cualquier longitud y profundidad
+            arbol, self.posicion = _ejecutar_motor_iterativo(self.tokens, _acciones_arbol(self._convertir))
+            if self.posicion < len(self.tokens):
+                self.errores.append(_error_caracteres_adicionales(self.tokens, self.posicion))
+                return None, self.errores
+            if optimizar:
+                arbol = optimizar_arbol(arbol, type(self._convertir('0')))
+            return ExpresionCompilada(expresion, arbol, backend, self.presupuesto), self.errores
+        except Exception as e:
+            self.errores.append(f"Error de sintaxis: {str(e)}")
+            return None, self.errores
+    
+    def configuracion(self):
+        """Parámetros con los que se puede crear una calculadora equivalente (p. ej. en otro proceso)"""
+        return {
+            'tamano_cache': self.cache.tamano_maximo if self.cache is not None else 0,
+            'nivel_traza': self._nivel_traza,
+            'motor': self.motor,
+            'tokens_compactos': self.tokens_compactos,
+            'presupuesto': self.presupuesto,
+            'modo_numerico': self.modo_numerico,
+        }
+    
+    def analizar_lote(self, expresiones, workers=None, chunk_size=256, ordenado=True):
+        """
+        Analiza muchas expresiones repartiéndolas entre varios procesos.
+        
+        Las expresiones se envían en bloques de `chunk_size` para reducir la
+        comunicación entre procesos, y solo se mantienen unos pocos bloques en
+        vuelo a la vez, así que `expresiones` puede ser un iterable muy grande.
+        Genera tuplas (indice, resultado, errores): en el orden de entrada si
+        `ordenado` es True, o a medida que terminan los bloques si es False.
+        
+        Cada proceso usa su propia calculadora con esta misma configuración,
+        sin traza de derivación. Con workers=1 todo se analiza en el proceso actual.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size debe ser al menos 1")
+        if workers is None:
+            workers = os.cpu_count() or 1
+        
+        configuracion = self.configuracion()
+        configuracion['nivel_traza'] = TRAZA_DESACTIVADA
+        bloques = _dividir_en_bloques(expresiones, chunk_size)
+        
+        if workers <= 1:
+            calculadora = CalculadoraDescendente(**configuracion)
+            for inicio, bloque in bloques:
+                for indice, expresion in enumerate(bloque, inicio):
+                    resultado, errores = calculadora.analizar(expresion)
+                    yield indice, resultado, errores
+            return
+        
+        ejecutor = ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_proceso,
+                                       initargs=(configuracion,))
+        try:
+            for resultado_bloque in _repartir(ejecutor, _analizar_bloque, bloques, workers * 2, ordenado):
+                yield from _desempaquetar_bloque(resultado_bloque)
+        finally:
+            ejecutor.shutdown(wait=True, cancel_futures=True)
+    
+    def analizar_archivo(self, archivo, workers=None, ordenado=True):
+        """
+        Analiza cada línea no vacía de un ArchivoMapeado. Genera tuplas
+        (numero_linea, inicio, fin, resultado, errores), donde inicio y fin
+        delimitan el texto de la línea en archivo.buffer (ver archivo.texto()).
+        
+        A cada proceso solo se le envían rangos (linea_inicial, desplazamiento,
+        longitud) de los bloques del índice: el proceso mapea el mismo archivo
+        y tokeniza directamente sobre los bytes, sin copiar las líneas a
+        cadenas de Python. El orden y el paralelismo funcionan como en
+        analizar_lote().
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        
+        configuracion = self.configuracion()
+        configuracion['nivel_traza'] = TRAZA_DESACTIVADA
+        
+        if workers <= 1:
+            calculadora = CalculadoraDescendente(**configuracion)
+            for rango in archivo.bloques():
+                yield from _analizar_rango(calculadora, archivo.buffer, rango)
+            return
+        
+        ejecutor = ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_proceso_archivo,
+                                       initargs=(configuracion, archivo.ruta))
+        try:
+            yield from (fila
+                        for resultados in _repartir(ejecutor, _analizar_rango_proceso, archivo.bloques(),
+                                                    workers * 2, ordenado)
+                        for fila in resultados)
+        finally:
+            ejecutor.shutdown(wait=True, cancel_futures=True)
+    
+    def tokenizar(self, expresion):
+        """Convierte la expresión en una lista de tokens"""
+        tokens, errores = _tokenizar(expresion)
+        self.errores.extend(errores)
+        return tokens
+    
+    def tokenizar_flujo(self, expresion):
+        """Convierte la expresión en un FlujoTokens (representación compacta)"""
+        tokens, errores = _tokenizar_flujo(expresion)
+        self.errores.extend(errores)
+        return tokens
+    
+    def _tokenizar_analisis(self, expresion):
+        """Tokeniza con la representación configurada en tokens_compactos"""
+        if self.tokens_compactos:
+            return self.tokenizar_flujo(expresion)
+        return self.tokenizar(expresion)
+    
+    def evaluar(self, expresion, traza=False, variables=None):
+        """
+        Versión reentrante de analizar(): todo el estado del análisis es local a
+        la llamada y el resultado es un ResultadoAnalisis inmutable. Una misma
+        calculadora puede atender varios hilos o tareas a la vez sin bloqueos.
+        
+        Sin traza se usa el motor iterativo (mismos resultados y errores que
+        analizar()). Con traza=True la derivación completa se registra en un
+        _AnalisisDescendente local a la llamada.
+        """
+        tokens, _ = _tokenizar_flujo(expresion) if self.tokens_compactos else _tokenizar(expresion)
+        if traza:
+            # Las producciones escriben en un estado propio de la llamada, no en el de la calculadora
+            analisis = _AnalisisDescendente(TRAZA_COMPLETA, self.motor, self.presupuesto, self._convertir,
+                                            self.cancelacion)
+            valor, errores = analisis._analizar_tokens(tokens, variables)
+            return ResultadoAnalisis(valor, tuple(errores), _congelar_tokens(tokens),
+                                     tuple(analisis.traza_derivacion))
+        
+        if not tokens:
+            return ResultadoAnalisis(None, ("Error: Expresión vacía",), (), None)
+        control = self._crear_control()
+        try:
+            valor, posicion = _ejecutar_motor_iterativo(
+                tokens, _acciones_evaluacion(variables, control, self._convertir))
+        except TareaCancelada:
+            raise
+        except PresupuestoExcedido as e:
+            return ResultadoAnalisis(None, (f"Error de presupuesto: {str(e)}",), _congelar_tokens(tokens), None)
+        except Exception as e:
+            return ResultadoAnalisis(None, (f"Error de sintaxis: {str(e)}",), _congelar_tokens(tokens), None)
+        if posicion < len(tokens):
+            return ResultadoAnalisis(None, (_error_caracteres_adicionales(tokens, posicion),),
+                                     _congelar_tokens(tokens), None)
+        return ResultadoAnalisis(valor, (), _congelar_tokens(tokens), None)
+    
+class ResultadoAnalisis(NamedTuple):
+    """Resultado inmutable de CalculadoraDescendente.evaluar()"""
+    valor: object                       # Resultado numérico, o None si hubo errores
+    errores: Tuple[str, ...]            # Mensajes de error (vacío si no hubo)
+    tokens: Tuple[Tuple[str, str], ...] # Tokens (tipo, valor) de la expresión (o un FlujoTokens)
+    traza: Optional[Tuple[str, ...]]    # Traza de derivación, solo si se pidió
+    
+    @property
+    def exitoso(self):
+        return not self.errores
+
+
+def _tokenizar(expresion):
+    """
+    Convierte la expresión en una lista de tokens sin tocar ningún estado
+    compartido. Retorna (tokens, errores); ante un error léxico tokens es [].
+    """
+    tokens = []
+    
+    # Un único recorrido con la expresión regular maestra: cada coincidencia
+    # indica por su grupo con nombre el tipo de token reconocido
+    for match in _REGEX_TOKENS.finditer(expresion):
+        tipo = match.lastgroup
+        if tipo == 'ESPACIO':  # Ignorar espacios
+            continue
+        if tipo == 'INVALIDO':
+            # Caracter no reconocido
+            return [], _errores_lexicos(expresion, match.start())
+        tokens.append((tipo, match.group()))
+    
+    return tokens, []
+
+
+def _error_caracteres_adicionales(tokens, posicion):
+    """Mensaje de error para los tokens que sobran después de una expresión válida"""
+    tokens_restantes = ' '.join([t[1] for t in tokens[posicion:]])
+    return f"Error de sintaxis: Caracteres adicionales después de la expresión válida: '{tokens_restantes}'"
+
+
+def _congelar_tokens(tokens):
+    """Copia inmutable de los tokens; un FlujoTokens no se modifica y se comparte"""
+    return tokens if isinstance(tokens, FlujoTokens) else tuple(tokens)
+
+
+def _errores_lexicos(expresion, pos):
+    """Mensajes de error para un caracter no reconocido en la posición `pos`"""
+    return [
+        f"Error léxico: Caracter no válido '{expresion[pos]}' en la posición {pos}",
+        f"  Sugerencia: Solo se permiten números, operadores (+, -, *, /, **, ^, %) y paréntesis",
+    ]
+
+
+class FlujoTokens:
+    """
+    Secuencia de tokens compacta para entradas grandes. En lugar de una tupla
+    (tipo, valor) y una subcadena por token, guarda tres arreglos paralelos:
+    el código del tipo (índice en TIPOS_TOKEN, 1 byte) y las posiciones de
+    inicio y fin del token en el texto original (4 bytes cada una). El valor
+    se extrae del texto solo cuando se pide.
+    
+    Se comporta como una secuencia de solo lectura de tuplas (tipo, valor),
+    así que sirve donde se espera la lista de tokenizar(); el motor iterativo
+    la recorre directamente por sus códigos.
+    """
+    
+    __slots__ = ('texto', 'codigos', 'inicios', 'finales')
+    
+    def __init__(self, texto):
+        self.texto = texto
+        self.codigos = array('B')
+        self.inicios = array('I')
+        self.finales = array('I')
+    
+    def tipo(self, indice):
+        """Tipo del token en la posición indicada"""
+        return TIPOS_TOKEN[self.codigos[indice]]
+    
+    def valor(self, indice):
+        """Texto del token en la posición indicada"""
+        return self.texto[self.inicios[indice]:self.finales[indice]]
+    
+    def tamano_bytes(self):
+        """Memoria ocupada por los arreglos (sin contar el texto original)"""
+        return sum(len(a) * a.itemsize for a in (self.codigos, self.inicios, self.finales))
+    
+    def __len__(self):
+        return len(self.codigos)
+    
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self[i] for i in range(*indice.indices(len(self)))]
+        return TIPOS_TOKEN[self.codigos[indice]], self.valor(indice)
+    
+    def __iter__(self):
+        for indice in range(len(self)):
+            yield self[indice]
+    
+    def __repr__(self):
+        return f"FlujoTokens({len(self)} tokens)"
+
+
+def _tokenizar_flujo(expresion):
+    """
+    Como _tokenizar(), pero retorna (FlujoTokens, errores). Ante un error
+    léxico el flujo queda vacío.
+    """
+    flujo = FlujoTokens(expresion)
+    codigos, inicios, finales = flujo.codigos, flujo.inicios, flujo.finales
+    codigo_espacio = len(TIPOS_TOKEN) + 1
+    codigo_invalido = codigo_espacio + 1
+    codigo_grupo = {**_CODIGOS_TOKEN, 'ESPACIO': codigo_espacio, 'INVALIDO': codigo_invalido}
+    
+    for match in _REGEX_TOKENS.finditer(expresion):
+        codigo = codigo_grupo[match.lastgroup]
+        if codigo == codigo_espacio:
+            continue
+        if codigo == codigo_invalido:
+            return FlujoTokens(expresion), _errores_lexicos(expresion, match.start())
+        codigos.append(codigo)
+        inicio, fin = match.span()
+        inicios.append(inicio)
+        finales.append(fin)
+    
+    return flujo, []
+
+
+# ==================== ANÁLISIS POR LOTES EN VARIOS PROCESOS ====================
+
+# Calculadora propia de cada proceso de trabajo (creada por _inicializar_proceso)
+_calculadora_proceso = None
+
+
+def _inicializar_proceso(configuracion):
+    """Inicializador de cada proceso de trabajo de analizar_lote()"""
+    global _calculadora_proceso
+    _calculadora_proceso = CalculadoraDescendente(**configuracion)
+
+
+def _analizar_bloque(bloque):
+    """Analiza un bloque (inicio, expresiones) en un proceso de trabajo"""
+    inicio, expresiones = bloque
+    analizar = _calculadora_proceso.analizar
+    return inicio, [analizar(expresion) for expresion in expresiones]
+
+
+def _dividir_en_bloques(expresiones, tamano):
+    """Genera (indice_inicial, lista_de_expresiones) con bloques de `tamano` elementos"""
+    iterador = iter(expresiones)
+    inicio = 0
+    while True:
+        bloque = list(islice(iterador, tamano))
+        if not bloque:
+            return
+        yield inicio, bloque
+        inicio += len(bloque)
+
+
+def _desempaquetar_bloque(resultado_bloque):
+    """Convierte el resultado de un bloque en tuplas (indice, resultado, errores)"""
+    inicio, resultados = resultado_bloque
+    for indice, (resultado, errores) in enumerate(resultados, inicio):
+        yield indice, resultado, errores
+
+
+def _repartir(ejecutor, funcion, bloques, max_en_vuelo, ordenado):
+    """
+    Envía cada bloque a `funcion` en el ejecutor y genera sus resultados,
+    con a lo sumo `max_en_vuelo` bloques pendientes a la vez. Si `ordenado`
+    es False, los resultados se generan a medida que terminan.
+    """
+    if ordenado:
+        en_vuelo = deque()
+        for bloque in bloques:
+            en_vuelo.append(ejecutor.submit(funcion, bloque))
+            if len(en_vuelo) >= max_en_vuelo:
+                yield en_vuelo.popleft().result()
+        while en_vuelo:
+            yield en_vuelo.popleft().result()
+    else:
+        en_vuelo = set()
+        for bloque in bloques:
+            en_vuelo.add(ejecutor.submit(funcion, bloque))
+            if len(en_vuelo) >= max_en_vuelo:
+                terminados, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in terminados:
+                    yield futuro.result()
+        for futuro in wait(en_vuelo).done:
+            yield futuro.result()
+
+
+# ==================== ENTRADA MAPEADA EN MEMORIA ====================
+
+# Expresión regular maestra sobre bytes (los patrones de los tokens son ASCII).
+# Cada coincidencia consume los espacios anteriores junto con el token, así
+# que hay una iteración por token; \Z reconoce los espacios del final.
+_REGEX_TOKENS_BYTES = re.compile(
+    (r'\s*(?:' + '|'.join(f'(?P<{tipo}>{patron})' for tipo, patron in PATRONES_TOKENS if tipo != 'ESPACIO')
+     + r'|(?P<INVALIDO>.)|\Z)').encode('ascii'),
+    re.DOTALL
+)
+# Código de tipo de cada grupo de _REGEX_TOKENS_BYTES, por número de grupo
+# (None para INVALIDO)
+_CODIGOS_GRUPO_BYTES = [None] + [
+    _CODIGOS_TOKEN.get(tipo)
+    for tipo in sorted(_REGEX_TOKENS_BYTES.groupindex, key=_REGEX_TOKENS_BYTES.groupindex.get)
+]
+
+
+class ArchivoMapeado:
+    """
+    Archivo de expresiones (una por línea) leído con mmap. La primera vez que
+    se piden los bloques se construye un índice: el desplazamiento del primer
+    byte y el número de la primera línea de cada bloque de unos
+    `tamano_bloque` bytes, cortados siempre al final de una línea. El índice
+    se calcula con búsquedas y conteos de saltos de línea sobre el buffer,
+    sin crear una cadena por línea.
+    
+    Uso:
+        with ArchivoMapeado('expresiones.txt') as archivo:
+            for numero, inicio, fin, resultado, errores in calc.analizar_archivo(archivo):
+                ...
+    """
+    
+    def __init__(self, ruta, tamano_bloque=1 << 20):
+        if tamano_bloque < 1:
+            raise ValueError("tamano_bloque debe ser al menos 1")
+        self.ruta = ruta
+        self.tamano_bloque = tamano_bloque
+        self._archivo = open(ruta, 'rb')
+        try:
+            self.buffer = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap no admite archivos vacíos
+            self.buffer = b''
+        self._indice = None
+    
+    def indice(self):
+        """Retorna (limites, lineas_iniciales); ver _indexar_bloques()"""
+        if self._indice is None:
+            self._indice = _indexar_bloques(self.buffer, self.tamano_bloque)
+        return self._indice
+    
+    def bloques(self):
+        """Genera los rangos (linea_inicial, desplazamiento, longitud) de cada bloque"""
+        limites, lineas_iniciales = self.indice()
+        for indice, linea in enumerate(lineas_iniciales):
+            yield linea, limites[indice], limites[indice + 1] - limites[indice]
+    
+    def texto(self, inicio, fin):
+        """Texto de una línea (o de cualquier rango) del archivo"""
+        return self.buffer[inicio:fin].decode('utf-8', errors='replace')
+    
+    def cerrar(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self._archivo.close()
+    
+    def __len__(self):
+        return len(self.indice()[1])
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+def _indexar_bloques(buffer, tamano_bloque):
+    """
+    Retorna (limites, lineas_iniciales): los desplazamientos donde empieza
+    cada bloque (más el final del buffer) y el número de su primera línea
+    """
+    limites = array('Q')
+    lineas_iniciales = array('Q')
+    total = len(buffer)
+    inicio = 0
+    linea = 1
+    while inicio < total:
+        limites.append(inicio)
+        lineas_iniciales.append(linea)
+        salto = buffer.find(b'\n', min(inicio + tamano_bloque, total) - 1)
+        fin = total if salto < 0 else salto + 1
+        # mmap no tiene count(): se cuenta sobre una copia temporal del bloque
+        linea += buffer[inicio:fin].count(b'\n')
+        inicio = fin
+    limites.append(total)
+    return limites, lineas_iniciales
+
+
+def _lineas_rango(buffer, inicio, fin, numero):
+    """Genera (numero_linea, inicio, fin) de cada línea del rango, sin el salto de línea"""
+    while inicio < fin:
+        salto = buffer.find(b'\n', inicio, fin)
+        final = fin if salto < 0 else salto
+        ultimo = final
+        while ultimo > inicio and buffer[ultimo - 1] == 13:   # '\r'
+            ultimo -= 1
+        yield numero, inicio, ultimo
+        numero += 1
+        inicio = final + 1
+
+
+class FlujoTokensBuffer(FlujoTokens):
+    """
+    FlujoTokens sobre una línea de un buffer de bytes (por ejemplo un mmap):
+    las posiciones son relativas a `base`, el inicio de la línea en el buffer
+    """
+    
+    __slots__ = ('base',)
+    
+    def __init__(self, buffer, base):
+        super().__init__(buffer)
+        self.base = base
+    
+    def valor(self, indice):
+        base = self.base
+        return str(self.texto[base + self.inicios[indice]:base + self.finales[indice]], 'ascii')
+
+
+def _tokenizar_buffer(buffer, inicio, fin):
+    """
+    Tokeniza la línea buffer[inicio:fin] sin copiarla. Retorna None si la
+    línea tiene algún caracter que no es un token ASCII válido: en ese caso
+    la línea se decodifica y se analiza como texto (mismos errores y
+    mismos espacios Unicode que la lectura normal).
+    """
+    flujo = FlujoTokensBuffer(buffer, inicio)
+    codigos, inicios, finales = flujo.codigos, flujo.inicios, flujo.finales
+    codigos_grupo = _CODIGOS_GRUPO_BYTES
+    
+    for match in _REGEX_TOKENS_BYTES.finditer(buffer, inicio, fin):
+        grupo = match.lastindex
+        if grupo is None:
+            # Espacios al final de la línea
+            break
+        codigo = codigos_grupo[grupo]
+        if codigo is None:
+            # INVALIDO
+            return None
+        codigos.append(codigo)
+        desde, hasta = match.span(grupo)
+        inicios.append(desde - inicio)
+        finales.append(hasta - inicio)
+    return flujo
+
+
+def _analizar_rango(calculadora, buffer, rango):
+    """
+    Analiza las líneas no vacías de un rango (linea_inicial, desplazamiento,
+    longitud) y retorna una lista de (numero_linea, inicio, fin, resultado, errores)
+    """
+    linea_inicial, desplazamiento, longitud = rango
+    resultados = []
+    for numero, inicio, fin in _lineas_rango(buffer, desplazamiento, desplazamiento + longitud, linea_inicial):
+        tokens = None if calculadora.cache is not None else _tokenizar_buffer(buffer, inicio, fin)
+        if tokens is not None and not tokens:
+            # Línea en blanco (solo espacios ASCII)
+            continue
+        if tokens is None:
+            # La caché necesita el texto, y las líneas no ASCII se analizan como texto
+            texto = buffer[inicio:fin].decode('utf-8', errors='replace')
+            if not texto.strip():
+                continue
+            resultado, errores = calculadora.analizar(texto)
+        else:
+            resultado, errores = calculadora._analizar_tokens(tokens)
+        resultados.append((numero, inicio, fin, resultado, errores))
+    return resultados
+
+
+# Archivo mapeado propio de cada proceso de trabajo de analizar_archivo()
+_archivo_proceso = None
+
+
+def _inicializar_proceso_archivo(configuracion, ruta):
+    """Inicializador de cada proceso de trabajo de analizar_archivo()"""
+    global _archivo_proceso
+    _inicializar_proceso(configuracion)
+    _archivo_proceso = ArchivoMapeado(ruta)
+
+
+def _analizar_rango_proceso(rango):
+    """Analiza un rango del archivo en un proceso de trabajo"""
+    return _analizar_rango(_calculadora_proceso, _archivo_proceso.buffer, rango)
+
+
+# ==================== MOTOR ITERATIVO ====================
+# Recorre la misma gramática que E/T/P/F, con los mismos mensajes de error y
+# el mismo orden de evaluación, pero con un bucle y una pila explícita de
+# paréntesis abiertos: no depende del límite de recursión de Python y usa
+# tiempo lineal y memoria proporcional solo a la profundidad de paréntesis.
+# Lo que se hace con cada número y operador lo deciden las "acciones"
+# (evaluar o construir el árbol de sintaxis abstracta).
+
+class _Marco:
+    """Estado de un nivel de paréntesis: operaciones pendientes de E', T' y P'"""
+    
+    __slots__ = ('negar', 'suma', 'op_suma', 'producto', 'op_producto', 'base', 'en_exponente')
+    
+    def __init__(self, negar):
+        self.negar = negar              # -( E ): negar el valor al cerrar
+        self.suma = None                # Operando izquierdo pendiente de E'
+        self.op_suma = None             # SUMA / RESTA pendiente
+        self.producto = None            # Operando izquierdo pendiente de T'
+        self.op_producto = None         # MULT / DIV / MOD pendiente
+        self.base = None                # Base pendiente de P'
+        self.en_exponente = False       # El próximo F es un exponente
+
+
+def _ejecutar_motor_iterativo(tokens, acciones, marcos=None):
+    """
+    Analiza E a partir del primer token y retorna (valor, posicion), donde
+    posicion es el índice del primer token no consumido. `tokens` es una lista
+    de tuplas (tipo, valor) o un FlujoTokens; en ambos casos el bucle compara
+    códigos de tipo y solo extrae el texto de números, variables y errores.
+    Si se pasa la lista `marcos`, su primer elemento queda con la mayor
+    cantidad de marcos abiertos a la vez (1 sin paréntesis), aunque falle.
+    """
+    if isinstance(tokens, FlujoTokens):
+        codigos = tokens.codigos
+        texto = tokens.valor
+    else:
+        codigos = [_CODIGOS_TOKEN[token[0]] for token in tokens]
+        texto = lambda indice: tokens[indice][1]
+    
+    NUMERO, VARIABLE = _CODIGOS_TOKEN['NUMERO'], _CODIGOS_TOKEN['VARIABLE']
+    SUMA, RESTA = _CODIGOS_TOKEN['SUMA'], _CODIGOS_TOKEN['RESTA']
+    MULT, DIV, MOD = _CODIGOS_TOKEN['MULT'], _CODIGOS_TOKEN['DIV'], _CODIGOS_TOKEN['MOD']
+    POT = _CODIGOS_TOKEN['POT']
+    PAREN_IZQ, PAREN_DER = _CODIGOS_TOKEN['PAREN_IZQ'], _CODIGOS_TOKEN['PAREN_DER']
+    EOF = _CODIGO_EOF
+    
+    numero = acciones.numero
+    negativo = acciones.negativo
+    variable = acciones.variable
+    negar = acciones.negar
+    operar = acciones.operar
+    
+    total = len(codigos)
+    pos = 0
+    pila = []                           # Marcos de los paréntesis abiertos
+    marco = _Marco(False)
+    if marcos is not None:
+        marcos[0] = 1
+    
+    while True:
+        # F → ( E ) | numero | -numero | variable | -variable
+        tipo = codigos[pos] if pos < total else EOF
+        if tipo == NUMERO:
+            valor = numero(texto(pos))
+            pos += 1
+        elif tipo == VARIABLE:
+            valor = variable(texto(pos))
+            pos += 1
+        elif tipo == PAREN_IZQ:
+            pos += 1
+            pila.append(marco)
+            marco = _Marco(False)
+            if marcos is not None and len(pila) >= marcos[0]:
+                marcos[0] = len(pila) + 1
+            continue
+        elif tipo == RESTA:
+            pos += 1
+            tipo = codigos[pos] if pos < total else EOF
+            if tipo == NUMERO:
+                valor = negativo(texto(pos))
+                pos += 1
+            elif tipo == VARIABLE:
+                valor = negar(variable(texto(pos)))
+                pos += 1
+            elif tipo == PAREN_IZQ:
+                pos += 1
+                pila.append(marco)
+                marco = _Marco(True)
+                if marcos is not None and len(pila) >= marcos[0]:
+                    marcos[0] = len(pila) + 1
+                continue
+            else:
+                raise Exception("Se esperaba un número o expresión después del signo negativo")
+        elif tipo == EOF:
+            raise Exception("Expresión incompleta: se esperaba un número o paréntesis")
+        else:
+            raise Exception(f"Token inesperado '{texto(pos)}'. Se esperaba un número o paréntesis")
+        
+        # `valor` es un F completo: aplicar las operaciones pendientes mientras
+        # el siguiente token no abra una nueva operación
+        while True:
+            if marco.en_exponente:
+                valor = operar('POT', marco.base, valor)
+                marco.en_exponente = False
+            tipo = codigos[pos] if pos < total else EOF
+            
+            # P' → ** F P' | ^ F P' | ε
+            if tipo == POT:
+                pos += 1
+                marco.base = valor
+                marco.en_exponente = True
+                break
+            if marco.op_producto is not None:
+                valor = operar(marco.op_producto, marco.producto, valor)
+                marco.op_producto = None
+            
+            # T' → * P T' | / P T' | % P T' | ε
+            if tipo == MULT or tipo == DIV or tipo == MOD:
+                pos += 1
+                marco.producto = valor
+                marco.op_producto = TIPOS_TOKEN[tipo]
+                break
+            if marco.op_suma is not None:
+                valor = operar(marco.op_suma, marco.suma, valor)
+                marco.op_suma = None
+            
+            # E' → + T E' | - T E' | ε
+            if tipo == SUMA or tipo == RESTA:
+                pos += 1
+                marco.suma = valor
+                marco.op_suma = TIPOS_TOKEN[tipo]
+                break
+            
+            # E completo
+            if not pila:
+                return valor, pos
+            if tipo != PAREN_DER:
+                if tipo == EOF:
+                    raise Exception("Se esperaba 'PAREN_DER' pero la expresión terminó inesperadamente")
+                raise Exception(f"Se esperaba 'PAREN_DER' pero se encontró '{texto(pos)}'")
+            pos += 1
+            if marco.negar:
+                valor = negar(valor)
+            # El paréntesis cerrado es un F del nivel exterior
+            marco = pila.pop()
+
+
+def _operar(operador, izquierdo, derecho):
+    """Aplica un operador binario con las mismas verificaciones que T' y P'"""
+    if operador == 'SUMA':
+        return izquierdo + derecho
+    if operador == 'RESTA':
+        return izquierdo - derecho
+    if operador == 'MULT':
+        return izquierdo * derecho
+    if operador == 'DIV':
+        if derecho == 0:
+            raise Exception("División por cero detectada")
+        return izquierdo / derecho
+    if operador == 'MOD':
+        if derecho == 0:
+            raise Exception("Módulo por cero no está definido")
+        return izquierdo % derecho
+    if operador == 'POT':
+        return izquierdo ** derecho
+    raise ValueError(f"Operador desconocido: {operador}")
+
+
+def _operar_vectorial(operador, izquierdo, derecho):
+    """
+    Como _operar, pero con arreglos de NumPy: la división y el módulo fallan
+    si algún elemento del divisor es cero
+    """
+    if operador == 'DIV' or operador == 'MOD':
+        if np.any(derecho == 0):
+            if operador == 'DIV':
+                raise Exception("División por cero detectada")
+            raise Exception("Módulo por cero no está definido")
+        return izquierdo / derecho if operador == 'DIV' else izquierdo % derecho
+    return _operar(operador, izquierdo, derecho)
+
+
+# Tipos de nodo del árbol sin hijos
+_HOJAS = ('NUMERO', 'VARIABLE')
+
+
+class _AccionesEvaluacion:
+    """
+    Acciones del motor iterativo que evalúan la expresión. `convertir`
+    transforma el texto de cada número (ver _CONVERSORES_NUMERO).
+    """
+    
+    numero = staticmethod(float)
+    operar = staticmethod(_operar)
+    
+    def __init__(self, variables=None, control=None, convertir=float):
+        self.variables = variables or {}
+        self.control = control
+        if convertir is not float:
+            self.numero = convertir
+            self.negativo = lambda texto: -convertir(texto)
+        if control is not None:
+            # Con presupuesto se verifica cada número y cada operación
+            self.numero = lambda texto: control.verificar(convertir(texto))
+            self.negativo = lambda texto: control.verificar(-convertir(texto))
+            self.operar = control.operar
+    
+    def variable(self, nombre):
+        if nombre not in self.variables:
+            raise Exception(f"Variable no definida: '{nombre}'")
+        if self.control is not None:
+            self.control.verificar(self.variables[nombre])
+        return self.variables[nombre]
+    
+    @staticmethod
+    def negativo(texto):
+        return -float(texto)
+    
+    @staticmethod
+    def negar(valor):
+        return -valor
+
+
+class _AccionesArbol:
+    """
+    Acciones del motor iterativo que construyen el árbol de sintaxis abstracta
+    con tuplas: ('NUMERO', valor) | ('VARIABLE', nombre) | ('NEG', hijo) |
+    (operador, izquierdo, derecho) donde operador es el tipo de token: SUMA,
+    RESTA, MULT, DIV, MOD o POT. `convertir` transforma el texto de cada número.
+    """
+    
+    def __init__(self, convertir=float):
+        self.convertir = convertir
+    
+    def numero(self, texto):
+        return ('NUMERO', self.convertir(texto))
+    
+    @staticmethod
+    def variable(nombre):
+        return ('VARIABLE', nombre)
+    
+    def negativo(self, texto):
+        return ('NUMERO', -self.convertir(texto))
+    
+    @staticmethod
+    def negar(nodo):
+        return ('NEG', nodo)
+    
+    @staticmethod
+    def operar(operador, izquierdo, derecho):
+        return (operador, izquierdo, derecho)
+
+
+# Acciones sin variables ni presupuesto, una por conversor de números
+_ACCIONES_EVALUACION = {convertir: _AccionesEvaluacion(convertir=convertir)
+                        for convertir in _CONVERSORES_NUMERO.values()}
+_ACCIONES_ARBOL = {convertir: _AccionesArbol(convertir) for convertir in _CONVERSORES_NUMERO.values()}
+
+
+def _acciones_evaluacion(variables, control, convertir=float):
+    """Acciones de evaluación para unas variables y un control de presupuesto (opcionales)"""
+    if not variables and control is None:
+        return _ACCIONES_EVALUACION[convertir]
+    return _AccionesEvaluacion(variables, control, convertir)
+
+
+def _acciones_arbol(convertir=float):
+    """Acciones que construyen el árbol con los números convertidos por `convertir`"""
+    return _ACCIONES_ARBOL[convertir]
+
+
+class ExpresionCompilada:
+    """
+    Expresión ya analizada: guarda el árbol de sintaxis abstracta y una
+    función que lo evalúa (árbol de clausuras o código Python compilado,
+    según el backend). Llamar al objeto no vuelve a tokenizar ni a analizar
+    la expresión.
+    
+    Con un PresupuestoEvaluacion cada llamada recorre el árbol con una pila
+    explícita y verifica cada número y cada operación, igual que analizar():
+    las clausuras y el código generado no pueden detener una potencia a
+    mitad de cálculo.
+    """
+    
+    __slots__ = ('expresion', 'arbol', 'backend', 'presupuesto', 'variables', '_evaluar')
+    
+    # Los árboles más profundos se evalúan con una pila explícita en lugar de
+    # clausuras anidadas, para no alcanzar el límite de recursión
+    PROFUNDIDAD_MAXIMA_CLAUSURAS = 200
+    
+    def __init__(self, expresion, arbol, backend=BACKEND_CLAUSURAS, presupuesto=None):
+        self.expresion = expresion
+        self.arbol = arbol
+        self.backend = backend
+        self.presupuesto = presupuesto
+        self.variables = _variables_arbol(arbol)   # Nombres, por orden de aparición
+        if presupuesto is not None:
+            self._evaluar = self._evaluar_con_presupuesto
+            return
+        if backend == BACKEND_CODIGO:
+            self._evaluar = _compilar_codigo(arbol)
+            if self._evaluar is not None:
+                return
+            # Demasiado anidada para compile(): se usa el backend de clausuras
+            self.backend = BACKEND_CLAUSURAS
+        if _profundidad_arbol(arbol) <= self.PROFUNDIDAD_MAXIMA_CLAUSURAS:
+            self._evaluar = _construir_evaluador(arbol)
+        else:
+            self._evaluar = lambda entorno: _evaluar_arbol(arbol, entorno)
+    
+    def __call__(self, variables=None):
+        """Evalúa la expresión y retorna (resultado, errores), igual que analizar()"""
+        entorno = self._entorno(variables or {})
+        try:
+            return self._evaluar(entorno), []
+        except PresupuestoExcedido as e:
+            return None, [f"Error de presupuesto: {str(e)}"]
+        except Exception as e:
+            return None, [f"Error de sintaxis: {str(e)}"]
+    
+    def _evaluar_con_presupuesto(self, entorno):
+        """Evaluación con un _ControlPresupuesto nuevo (el tiempo se mide por llamada)"""
+        control = _ControlPresupuesto(self.presupuesto)
+        return _evaluar_arbol(self.arbol, entorno, control.operar, control.verificar,
+                              lambda nombre: control.verificar(entorno[nombre]))
+    
+    def evaluar_vectorizado(self, variables=None):
+        """
+        Evalúa la expresión una sola vez con arreglos de NumPy: cada variable
+        recibe un arreglo (o un escalar) y el resultado es el arreglo calculado
+        elemento a elemento con broadcasting. Retorna (resultado, errores).
+        
+        La división y el módulo fallan si algún divisor es cero, igual que en
+        analizar(). Los demás casos siguen las reglas de NumPy: un
+        desbordamiento da inf y una base negativa con exponente fraccionario da
+        nan (analizar() retornaría un error o un número complejo).
+        
+        El cálculo es siempre en coma flotante, sea cual sea el modo numérico
+        con el que se compiló: las constantes int, Fraction y Decimal del
+        árbol se convierten a float, igual que las variables.
+        """
+        numpy = _importar_numpy()
+        entorno = {}
+        for nombre, valor in (variables or {}).items():
+            arreglo = numpy.asarray(valor)
+            if arreglo.dtype.kind not in 'fc':
+                arreglo = arreglo.astype(float)
+            entorno[nombre] = arreglo
+        entorno = self._entorno(entorno)
+        try:
+            return _evaluar_arbol(self.arbol, entorno, _operar_vectorial, _a_flotante), []
+        except Exception as e:
+            return None, [f"Error de sintaxis: {str(e)}"]
+    
+    def _entorno(self, entorno):
+        """
+        Si falta alguna variable, el entorno se envuelve en un _EntornoIncompleto:
+        el error se produce al leerla, en el mismo orden que en analizar()
+        """
+        if all(map(entorno.__contains__, self.variables)):
+            return entorno
+        return _EntornoIncompleto(entorno)
+    
+    def __repr__(self):
+        return f"ExpresionCompilada({self.expresion!r})"
+
+
+class _EntornoIncompleto(dict):
+    """Entorno al que le faltan variables: leer una de ellas es un error"""
+    
+    __slots__ = ()
+    
+    def __missing__(self, nombre):
+        raise Exception(f"Variable no definida: '{nombre}'")
+
+
+def _profundidad_arbol(arbol):
+    """Profundidad del árbol, calculada sin recursión"""
+    maxima = 0
+    pendientes = [(arbol, 1)]
+    while pendientes:
+        nodo, profundidad = pendientes.pop()
+        if profundidad > maxima:
+            maxima = profundidad
+        if nodo[0] not in _HOJAS:
+            for hijo in nodo[1:]:
+                pendientes.append((hijo, profundidad + 1))
+    return maxima
+
+
+def _variables_arbol(arbol):
+    """Nombres de las variables del árbol, sin repetir y por orden de aparición"""
+    nombres = {}
+    pendientes = [arbol]
+    while pendientes:
+        nodo = pendientes.pop()
+        if nodo[0] == 'VARIABLE':
+            nombres[nodo[1]] = None
+        elif nodo[0] != 'NUMERO':
+            pendientes.extend(reversed(nodo[1:]))
+    return tuple(nombres)
+
+
+def _a_flotante(valor):
+    """Convierte una constante a float (los complejos se conservan)"""
+    return valor if isinstance(valor, complex) else float(valor)
+
+
+def _evaluar_arbol(arbol, entorno=None, operar=_operar, convertir=None, variable=None):
+    """
+    Evalúa el árbol en postorden con una pila explícita, de izquierda a derecha.
+    `entorno` da el valor de cada variable y `operar` aplica los operadores;
+    `convertir`, si se indica, transforma cada constante antes de usarla, y
+    `variable` reemplaza la lectura de cada variable del entorno.
+    """
+    valores = []
+    pendientes = [(arbol, False)]
+    while pendientes:
+        nodo, hijos_evaluados = pendientes.pop()
+        tipo = nodo[0]
+        if tipo == 'NUMERO':
+            valores.append(nodo[1] if convertir is None else convertir(nodo[1]))
+        elif tipo == 'VARIABLE':
+            valores.append(entorno[nodo[1]] if variable is None else variable(nodo[1]))
+        elif hijos_evaluados:
+            if tipo == 'NEG':
+                valores.append(-valores.pop())
+            else:
+                # Nodos binarios o n-arios (SUMA / MULT aplanados): de izquierda a derecha
+                cantidad = len(nodo) - 1
+                operandos = valores[-cantidad:]
+                del valores[-cantidad:]
+                acumulado = operandos[0]
+                for operando in operandos[1:]:
+                    acumulado = operar(tipo, acumulado, operando)
+                valores.append(acumulado)
+        else:
+            pendientes.append((nodo, True))
+            for hijo in reversed(nodo[1:]):
+                pendientes.append((hijo, False))
+    return valores[0]
+
+
+def _construir_evaluador(nodo):
+    """
+    Convierte un nodo del árbol en una clausura que lo evalúa. La clausura
+    recibe el entorno (diccionario nombre → valor de las variables).
+    """
+    tipo = nodo[0]
+    
+    if tipo == 'NUMERO':
+        valor = nodo[1]
+        return lambda entorno: valor
+    if tipo == 'VARIABLE':
+        nombre = nodo[1]
+        return lambda entorno: entorno[nombre]
+    if tipo == 'NEG':
+        hijo = _construir_evaluador(nodo[1])
+        return lambda entorno: -hijo(entorno)
+    
+    if len(nodo) > 3:
+        # Cadena n-aria aplanada por optimizar_arbol(): ((a + b) + c) + ...
+        hijos = [_construir_evaluador(hijo) for hijo in nodo[1:]]
+        primero, resto = hijos[0], hijos[1:]
+        if tipo == 'SUMA':
+            def sumar(entorno):
+                total = primero(entorno)
+                for hijo in resto:
+                    total = total + hijo(entorno)
+                return total
+            return sumar
+        if tipo == 'MULT':
+            def multiplicar(entorno):
+                total = primero(entorno)
+                for hijo in resto:
+                    total = total * hijo(entorno)
+                return total
+            return multiplicar
+        raise ValueError(f"Nodo n-ario desconocido: {tipo}")
+    
+    # Operadores binarios: el operando izquierdo se evalúa primero, como en E/T/P
+    izquierdo = _construir_evaluador(nodo[1])
+    derecho = _construir_evaluador(nodo[2])
+    
+    if tipo == 'SUMA':
+        return lambda entorno: izquierdo(entorno) + derecho(entorno)
+    if tipo == 'RESTA':
+        return lambda entorno: izquierdo(entorno) - derecho(entorno)
+    if tipo == 'MULT':
+        return lambda entorno: izquierdo(entorno) * derecho(entorno)
+    if tipo == 'POT':
+        return lambda entorno: izquierdo(entorno) ** derecho(entorno)
+    if tipo == 'DIV':
+        def dividir(entorno):
+            dividendo = izquierdo(entorno)
+            divisor = derecho(entorno)
+            if divisor == 0:
+                raise Exception("División por cero detectada")
+            return dividendo / divisor
+        return dividir
+    if tipo == 'MOD':
+        def modulo(entorno):
+            dividendo = izquierdo(entorno)
+            divisor = derecho(entorno)
+            if divisor == 0:
+                raise Exception("Módulo por cero no está definido")
+            return dividendo % divisor
+        return modulo
+    raise ValueError(f"Nodo desconocido: {tipo}")
+
+
+# ==================== OPTIMIZACIÓN DEL ÁRBOL ====================
+
+# Elemento neutro de cada operador asociativo que se aplana en nodos n-arios
+_NEUTROS = {'SUMA': 0.0, 'MULT': 1.0}
+
+# Una potencia entre constantes solo se pliega si la magnitud estimada del
+# resultado (o de su inverso) no supera este valor: en modo entero o fracción,
+# plegar 9 ** 387420489 tardaría minutos antes de evaluar nada
+MAGNITUD_MAXIMA_PLEGADO = 1e300
+_LOG_MAGNITUD_PLEGADO = math.log(MAGNITUD_MAXIMA_PLEGADO)
+
+
+def optimizar_arbol(arbol, tipo_numero=float):
+    """
+    Simplifica un árbol de sintaxis abstracta sin cambiar su resultado:
+    
+    - Pliega subárboles constantes (calcula su valor de antemano). Si el
+      cálculo falla (división o módulo por cero, desbordamiento...) el
+      subárbol se conserva y el error se sigue produciendo al evaluar. Las
+      potencias cuyo resultado superaría MAGNITUD_MAXIMA_PLEGADO tampoco se
+      pliegan: su costo (y el presupuesto) queda para la evaluación.
+    - Aplana cadenas asociativas por la izquierda de + y * en nodos n-arios:
+      ((a + b) + c) → ('SUMA', a, b, c), que se evalúan en el mismo orden.
+    - Elimina identidades: x * 1, 1 * x, x + 0, 0 + x, x - 0, x ** 1 y -(-x).
+      (Con x = -0.0, x + 0 daría 0.0: la única diferencia es el signo del cero.)
+      La constante solo se elimina si su tipo es `tipo_numero`, el de los
+      literales del modo numérico: en modo fracción x * 1.0 es un float, así
+      que un 1.0 plegado de 1 ** 3.5 se conserva.
+    
+    Solo se pliegan las constantes iniciales de una cadena: (x + 1) + 2 no se
+    reescribe como x + 3, porque el redondeo de coma flotante podría cambiar.
+    Recorre el árbol con una pila explícita, así que admite cualquier profundidad.
+    """
+    resultados = []
+    pendientes = [(arbol, False)]
+    while pendientes:
+        nodo, hijos_listos = pendientes.pop()
+        if nodo[0] in _HOJAS:
+            resultados.append(nodo)
+        elif hijos_listos:
+            cantidad = len(nodo) - 1
+            hijos = resultados[-cantidad:]
+            del resultados[-cantidad:]
+            resultados.append(_simplificar_nodo(nodo[0], hijos, tipo_numero))
+        else:
+            pendientes.append((nodo, True))
+            for hijo in reversed(nodo[1:]):
+                pendientes.append((hijo, False))
+    return resultados[0]
+
+
+def _es_constante(nodo):
+    """Indica si el nodo es un número"""
+    return nodo[0] == 'NUMERO'
+
+
+def _es_neutro(nodo, valor, tipo_numero):
+    """Indica si el nodo es la constante `valor` con el tipo exacto `tipo_numero`"""
+    return nodo[0] == 'NUMERO' and type(nodo[1]) is tipo_numero and nodo[1] == valor
+
+
+def _plegar(operador, izquierdo, derecho):
+    """Calcula la operación entre dos constantes, o None si produce un error o es muy costosa"""
+    try:
+        if operador == 'POT' and not _potencia_acotada(izquierdo[1], derecho[1]):
+            return None
+        return ('NUMERO', _operar(operador, izquierdo[1], derecho[1]))
+    except Exception:
+        return None
+
+
+def _potencia_acotada(base, exponente):
+    """Indica si |base ** exponente| (o su inverso) se mantiene dentro de MAGNITUD_MAXIMA_PLEGADO"""
+    if isinstance(base, complex) or isinstance(exponente, complex) or base == 0:
+        return True
+    return abs(float(exponente) * _logaritmo(abs(base))) <= _LOG_MAGNITUD_PLEGADO
+
+
+def _simplificar_nodo(tipo, hijos, tipo_numero=float):
+    """Simplifica un nodo cuyos hijos ya están optimizados"""
+    if tipo == 'NEG':
+        hijo = hijos[0]
+        if _es_constante(hijo):
+            return ('NUMERO', -hijo[1])
+        if hijo[0] == 'NEG':
+            return hijo[1]
+        return ('NEG', hijo)
+    
+    if tipo in _NEUTROS:
+        # Aplanar solo la rama izquierda conserva el orden de evaluación
+        terminos = list(hijos[0][1:]) if hijos[0][0] == tipo else [hijos[0]]
+        terminos.extend(hijos[1:])
+        
+        while len(terminos) >= 2 and _es_constante(terminos[0]) and _es_constante(terminos[1]):
+            plegado = _plegar(tipo, terminos[0], terminos[1])
+            if plegado is None:
+                break
+            terminos[0:2] = [plegado]
+        
+        neutro = _NEUTROS[tipo]
+        terminos = [t for t in terminos if not _es_neutro(t, neutro, tipo_numero)] or terminos[:1]
+        if len(terminos) == 1:
+            return terminos[0]
+        return (tipo, *terminos)
+    
+    izquierdo, derecho = hijos
+    if _es_constante(izquierdo) and _es_constante(derecho):
+        plegado = _plegar(tipo, izquierdo, derecho)
+        if plegado is not None:
+            return plegado
+    if tipo == 'RESTA' and _es_neutro(derecho, 0, tipo_numero):
+        return izquierdo
+    if tipo == 'POT' and _es_neutro(derecho, 1, tipo_numero):
+        return izquierdo
+    return (tipo, izquierdo, derecho)
+
+
+# ==================== GENERACIÓN DE CÓDIGO ====================
+
+# Símbolo de Python de cada operador que no necesita verificaciones
+_OPERADORES_PYTHON = {'SUMA': '+', 'RESTA': '-', 'MULT': '*', 'POT': '**'}
+
+# Anidamiento máximo del código generado. El analizador de Python rechaza
+# más de 200 paréntesis anidados y compile() es recursivo.
+PROFUNDIDAD_MAXIMA_CODIGO = 90
+
+
+def _dividir(dividendo, divisor):
+    """División con la misma verificación que T'"""
+    if divisor == 0:
+        raise Exception("División por cero detectada")
+    return dividendo / divisor
+
+
+def _modulo(dividendo, divisor):
+    """Módulo con la misma verificación que T'"""
+    if divisor == 0:
+        raise Exception("Módulo por cero no está definido")
+    return dividendo % divisor
+
+
+def generar_codigo(arbol):
+    """
+    Traduce el árbol a una expresión de Python equivalente y retorna
+    (fuente, constantes). Todas las operaciones van entre paréntesis, así que
+    la precedencia y la asociatividad son las del árbol. / y % se traducen a
+    llamadas a _dividir() y _modulo(), que verifican el divisor después de
+    evaluar ambos operandos, en el mismo orden que T'. Las variables se leen
+    del parámetro _entorno de la función generada. Los números que repr()
+    no representa como literal (complejos, inf, nan, Fraction, Decimal o
+    enteros muy grandes) se pasan en `constantes` con nombres _c0, _c1...
+    Retorna None si el anidamiento supera PROFUNDIDAD_MAXIMA_CODIGO.
+    """
+    constantes = {}
+    partes = []
+    # Pila de (nodo, profundidad) y cadenas literales que se copian tal cual
+    pendientes = [(arbol, 1)]
+    while pendientes:
+        elemento = pendientes.pop()
+        if isinstance(elemento, str):
+            partes.append(elemento)
+            continue
+        nodo, profundidad = elemento
+        tipo = nodo[0]
+        if tipo == 'NUMERO':
+            valor = nodo[1]
+            if (isinstance(valor, float) and math.isfinite(valor)
+                    or type(valor) is int and valor.bit_length() <= 64):
+                partes.append(f"({valor!r})")
+            else:
+                nombre = f"_c{len(constantes)}"
+                constantes[nombre] = valor
+                partes.append(nombre)
+            continue
+        if tipo == 'VARIABLE':
+            partes.append(f"_entorno[{nodo[1]!r}]")
+            continue
+        
+        hijos = nodo[1:]
+        # Una cadena n-aria a + b + c se anida en el árbol de Python como ((a + b) + c)
+        profundidad += max(len(hijos) - 1, 1)
+        if profundidad > PROFUNDIDAD_MAXIMA_CODIGO:
+            return None
+        if tipo == 'NEG':
+            siguiente = [")", (hijos[0], profundidad), "(-"]
+        elif tipo in ('DIV', 'MOD'):
+            funcion = '_dividir' if tipo == 'DIV' else '_modulo'
+            siguiente = [")", (hijos[1], profundidad), ", ", (hijos[0], profundidad), f"{funcion}("]
+        else:
+            simbolo = f" {_OPERADORES_PYTHON[tipo]} "
+            siguiente = [")"]
+            for indice in range(len(hijos) - 1, -1, -1):
+                siguiente.append((hijos[indice], profundidad))
+                siguiente.append(simbolo if indice else "(")
+        pendientes.extend(siguiente)
+    return ''.join(partes), constantes
+
+
+def _compilar_codigo(arbol):
+    """
+    Compila el árbol a una función de Python que recibe el entorno de
+    variables, o retorna None si la expresión es demasiado anidada para
+    generar código.
+    """
+    generado = generar_codigo(arbol)
+    if generado is None:
+        return None
+    fuente, constantes = generado
+    espacio = {'_dividir': _dividir, '_modulo': _modulo, '__builtins__': {}}
+    espacio.update(constantes)
+    try:
+        codigo = compile(f"def _expresion(_entorno):\n    return {fuente}\n", '<expresion>', 'exec')
+    except (SyntaxError, RecursionError, MemoryError):
+        return None
+    exec(codigo, espacio)
+    return espacio['_expresion']
+
+
+# ==================== EVALUACIÓN INCREMENTAL ====================
+
+def _longitud_prefijo_comun(a, b):
+    """Longitud del prefijo común de dos cadenas (bisección comparando bloques)"""
+    bajo, alto = 0, min(len(a), len(b))
+    while bajo < alto:
+        medio = (bajo + alto + 1) // 2
+        if a[bajo:medio] == b[bajo:medio]:
+            bajo = medio
+        else:
+            alto = medio - 1
+    return bajo
+
+
+class EvaluadorIncremental:
+    """
+    Evaluación en vivo de una expresión que se edita de a poco (vista previa
+    de la interfaz mientras se escribe). Entre una llamada y la siguiente:
+
+    - Solo se vuelve a tokenizar la región editada: los tokens anteriores al
+      cambio se conservan, y los posteriores se reutilizan (desplazados) en
+      cuanto el análisis léxico vuelve a coincidir con un token anterior.
+    - La expresión se evalúa por términos del nivel exterior (E → T + T - T...),
+      guardando el valor acumulado al final de cada término. Los términos que
+      terminan antes del primer token modificado no se vuelven a analizar.
+
+    Retorna los mismos resultados y errores que calculadora.evaluar(): los
+    términos se evalúan en el mismo orden, y el primer error de sintaxis o de
+    evaluación aparece en el término que se está analizando. Los errores
+    léxicos y la expresión vacía se reportan con la evaluación completa.
+    """
+
+    # Caracteres que el análisis léxico puede mirar después del final de un
+    # token ("12." seguido de un dígito, "*" seguido de "*")
+    ANTICIPACION = 2
+
+    def __init__(self, calculadora=None):
+        self.calculadora = calculadora or CalculadoraDescendente(nivel_traza=TRAZA_DESACTIVADA)
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Olvida la expresión anterior: la siguiente se analiza completa"""
+        self._texto = None
+        self.tokens = []
+        self._inicios = []            # Posición de cada token en el texto
+        self._fines = []
+        self._acumulados = []         # (índice del operador tras el término, valor acumulado)
+        self._contexto = None
+        self.tokens_relexeados = 0    # Tokens obtenidos en la última llamada
+        self.terminos_reutilizados = 0
+
+    def evaluar(self, expresion, variables=None):
+        """Retorna (resultado, errores) de la expresión reutilizando el análisis anterior"""
+        variables = variables or {}
+        primer_cambio = self._relexear(expresion)
+        if primer_cambio is None:
+            return self._evaluar_completa(expresion, variables)
+
+        # Otro modo numérico, otro presupuesto u otros valores de las variables
+        # invalidan los acumulados
+        if not self._mismo_contexto(variables):
+            self._contexto = (self.calculadora._convertir, self.calculadora.presupuesto, dict(variables))
+            self._acumulados = []
+        while self._acumulados and self._acumulados[-1][0] >= primer_cambio:
+            self._acumulados.pop()
+        self.terminos_reutilizados = len(self._acumulados)
+
+        if not self.tokens:
+            return self._evaluar_completa(expresion, variables)
+        control = self.calculadora._crear_control()
+        acciones = _acciones_evaluacion(variables, control, self.calculadora._convertir)
+        try:
+            resultado, posicion = self._evaluar_terminos(acciones)
+        except TareaCancelada:
+            raise
+        except PresupuestoExcedido as e:
+            return None, [f"Error de presupuesto: {str(e)}"]
+        except Exception as e:
+            return None, [f"Error de sintaxis: {str(e)}"]
+        if posicion < len(self.tokens):
+            return None, [_error_caracteres_adicionales(self.tokens, posicion)]
+        return resultado, []
+
+    def _mismo_contexto(self, variables):
+        # Los valores se comparan por identidad: también sirve para arreglos de NumPy
+        if self._contexto is None:
+            return False
+        convertir, presupuesto, anteriores = self._contexto
+        return (convertir is self.calculadora._convertir and presupuesto == self.calculadora.presupuesto
+                and anteriores.keys() == variables.keys()
+                and all(valor is anteriores[nombre] for nombre, valor in variables.items()))
+
+    def _evaluar_completa(self, expresion, variables):
+        resultado = self.calculadora.evaluar(expresion, variables=variables)
+        return resultado.valor, list(resultado.errores)
+
+    def _evaluar_terminos(self, acciones):
+        """
+        Evalúa desde el último acumulado vigente y retorna (valor, posicion)
+        como _ejecutar_motor_iterativo(): posicion es el primer token no consumido
+        """
+        tokens = self.tokens
+        if self._acumulados:
+            operador_en, acumulado = self._acumulados[-1]
+            operador = tokens[operador_en][0]
+            inicio = operador_en + 1
+        else:
+            acumulado = operador = None
+            inicio = 0
+
+        while True:
+            fin = _fin_termino(tokens, inicio)
+            termino = tokens[inicio:fin]
+            valor, consumidos = _ejecutar_motor_iterativo(termino, acciones)
+            if consumidos < len(termino):
+                return None, inicio + consumidos
+            acumulado = valor if operador is None else acciones.operar(operador, acumulado, valor)
+            if fin == len(tokens):
+                return acumulado, fin
+            self._acumulados.append((fin, acumulado))
+            operador = tokens[fin][0]
+            inicio = fin + 1
+
+    def _relexear(self, texto):
+        """
+        Actualiza self.tokens para `texto` y retorna el índice del primer token
+        que cambió (None ante un error léxico, que se reporta con la evaluación
+        completa)
+        """
+        anterior = self._texto
+        if anterior == texto:
+            self.tokens_relexeados = 0
+            return len(self.tokens)
+        if anterior is None:
+            prefijo = sufijo = 0
+        else:
+            prefijo = _longitud_prefijo_comun(anterior, texto)
+            limite = min(len(anterior), len(texto)) - prefijo
+            sufijo = min(_longitud_prefijo_comun(anterior[::-1], texto[::-1]), limite)
+
+        # Se conservan los tokens cuyo reconocimiento no miró la región editada
+        conservados = bisect_right(self._fines, prefijo - self.ANTICIPACION) if anterior is not None else 0
+        reinicio = self._fines[conservados - 1] if conservados else 0
+        desplazamiento = len(texto) - len(anterior or '')
+        inicio_sufijo = len(texto) - sufijo
+
+        nuevos, inicios, fines = [], [], []
+        reutilizado = len(self.tokens)
+        for match in _REGEX_TOKENS.finditer(texto, reinicio):
+            tipo = match.lastgroup
+            if tipo == 'ESPACIO':
+                continue
+            if tipo == 'INVALIDO':
+                self.reiniciar()
+                return None
+            posicion = match.start()
+            if posicion >= inicio_sufijo:
+                # El resto del texto no cambió: si un token anterior empezaba
+                # aquí, los siguientes son los mismos
+                indice = bisect_left(self._inicios, posicion - desplazamiento, conservados)
+                if indice < len(self._inicios) and self._inicios[indice] == posicion - desplazamiento:
+                    reutilizado = indice
+                    break
+            nuevos.append((tipo, match.group()))
+            inicios.append(posicion)
+            fines.append(match.end())
+
+        # Las listas se modifican en su lugar: escribir al final de una
+        # expresión larga no copia los tokens anteriores
+        self.tokens[conservados:reutilizado] = nuevos
+        if desplazamiento:
+            inicios += [inicio + desplazamiento for inicio in self._inicios[reutilizado:]]
+            fines += [fin + desplazamiento for fin in self._fines[reutilizado:]]
+            reutilizado = len(self._inicios)
+        self._inicios[conservados:reutilizado] = inicios
+        self._fines[conservados:reutilizado] = fines
+        self._texto = texto
+        self.tokens_relexeados = len(nuevos)
+        return conservados
+
+
+def _fin_termino(tokens, inicio):
+    """
+    Índice del primer + o - binario fuera de paréntesis a partir de `inicio`
+    (o len(tokens)): el final del término T que empieza en `inicio`. Un signo
+    es binario cuando sigue a un operando (número, variable o paréntesis derecho).
+    """
+    nivel = 0
+    despues_de_operando = False
+    for indice in range(inicio, len(tokens)):
+        tipo = tokens[indice][0]
+        if tipo == 'PAREN_IZQ':
+            nivel += 1
+        elif tipo == 'PAREN_DER':
+            nivel -= 1
+        elif (tipo == 'SUMA' or tipo == 'RESTA') and despues_de_operando and nivel == 0:
+            return indice
+        despues_de_operando = tipo == 'NUMERO' or tipo == 'VARIABLE' or tipo == 'PAREN_DER'
+    return len(tokens)
+
+
+def insertar_texto(widget, partes):
+    """
+    Inserta al final de un widget Text una secuencia de partes con una sola
+    llamada a Tcl: cada insert es un viaje de ida y vuelta al intérprete, y
+    con miles de líneas ese costo domina el tiempo de dibujo. Cada parte es
+    un texto o un par (texto, etiqueta); las partes seguidas con la misma
+    etiqueta se unen, y las etiquetas se aplican a sus rangos en la misma
+    llamada (insert admite varios pares texto, etiquetas).
+    """
+    argumentos = []
+    bloque = []
+    etiqueta_bloque = None
+    for parte in partes:
+        texto, etiqueta = (parte, None) if isinstance(parte, str) else parte
+        if etiqueta != etiqueta_bloque and bloque:
+            argumentos += [''.join(bloque), etiqueta_bloque or ()]
+            bloque = []
+        bloque.append(texto)
+        etiqueta_bloque = etiqueta
+    if bloque:
+        argumentos += [''.join(bloque), etiqueta_bloque or ()]
+    if argumentos:
+        widget.insert(tk.END, *argumentos)
 
 
 class InterfazCalculadora:
     def __init__(self, root):
+        _importar_tkinter()
         self.root = root
         self.root.title("Analizador Sintáctico Descendente - Calculadora Avanzada")
         self.root.geometry("800x700")
         self.root.resizable(True, True)
         
-        self.calculadora = CalculadoraDescendente()
+        # La derivación se guarda como ArbolDerivacion: su texto solo se genera
+        # si se abre la pestaña de la traza o se exporta el análisis
+        self.calculadora = CalculadoraDescendente(nivel_traza=TRAZA_ARBOL)
         self.historial = []  # Para guardar el historial de cálculos
+        self.tarea = None    # Análisis en segundo plano en curso
+        self.derivacion_pendiente = None  # (traza, árbol) aún no dibujados
+        # Vista previa mientras se escribe: se evalúa RETARDO_VISTA_PREVIA_MS
+        # después de la última tecla, en un hilo de trabajo y reutilizando el
+        # análisis anterior. El evaluador tiene su propia calculadora, porque
+        # su cancelación es la de la tarea de la vista previa
+        self.evaluador_vivo = EvaluadorIncremental(CalculadoraDescendente(
+            **dict(self.calculadora.configuracion(), nivel_traza=TRAZA_DESACTIVADA)))
+        self.vista_previa_pendiente = None  # Identificador de root.after
+        self.tarea_vista_previa = None      # Evaluación de la vista previa en curso
         
         self.crear_interfaz()
     
@@ -284,6 +2473,14 @@ class InterfazCalculadora:
         self.entrada_expresion = ttk.Entry(entrada_frame, width=60, font=("Consolas", 12))
         self.entrada_expresion.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 10))
         self.entrada_expresion.bind('<Return>', lambda e: self.analizar_expresion())
+        self.entrada_expresion.bind('<KeyRelease>', lambda e: self.programar_vista_previa())
+        
+        self.vista_previa_activa = tk.BooleanVar(value=True)
+        ttk.Checkbutton(entrada_frame, text="Vista previa", variable=self.vista_previa_activa,
+                        command=self.programar_vista_previa).grid(row=0, column=1)
+        self.etiqueta_vista_previa = ttk.Label(entrada_frame, text="", font=("Consolas", 10),
+                                               foreground="#555")
+        self.etiqueta_vista_previa.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
         
         entrada_frame.columnconfigure(0, weight=1)
         
@@ -302,6 +2499,10 @@ class InterfazCalculadora:
         ttk.Button(botones_frame, text="💾 Exportar", 
                   command=self.exportar_resultados, width=15).grid(row=0, column=4, padx=5)
         
+        # Progreso del análisis en segundo plano
+        self.progreso = PanelProgreso(botones_frame, self.cancelar_analisis)
+        self.progreso.frame.grid(row=1, column=0, columnspan=5, pady=(8, 0))
+        
         # Notebook para organizar resultados en pestañas
         self.notebook = ttk.Notebook(main_frame)
         self.notebook.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
@@ -322,9 +2523,11 @@ class InterfazCalculadora:
                                                       font=("Consolas", 9), wrap=tk.WORD)
         self.tokens_texto.pack(fill=tk.BOTH, expand=True)
         
-        # Pestaña 3: Árbol de derivación
+        # Pestaña 3: Árbol de derivación (se dibuja al seleccionarla)
         arbol_frame = ttk.Frame(self.notebook, padding="10")
         self.notebook.add(arbol_frame, text="🌳 Traza de Derivación")
+        self.arbol_frame = arbol_frame
+        self.notebook.bind('<<NotebookTabChanged>>', lambda e: self.al_cambiar_pestana())
         
         self.arbol_texto = scrolledtext.ScrolledText(arbol_frame, width=70, height=8, 
                                                      font=("Consolas", 9), wrap=tk.WORD)
@@ -357,7 +2560,7 @@ T  → P T'                    (Término)
 T' → * P T' | / P T' | % P T' | ε    (Término prima - mult/div/mod)
 P  → F P'                    (Potencia)
 P' → ** F P' | ^ F P' | ε    (Potencia prima)
-F  → ( E ) | número | -número  (Factor)
+F  → ( E ) | número | -número | variable | -variable  (Factor)
 
 Precedencia de Operadores (Mayor a Menor):
 ──────────────────────────────────────────
@@ -374,8 +2577,9 @@ Tipo de Análisis:
 
 Tokens Reconocidos:
 ───────────────────
-NUMERO, SUMA (+), RESTA (-), MULT (*), DIV (/), 
-MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
+NUMERO, VARIABLE (identificador: letra o _ seguida de
+letras, dígitos o _), SUMA (+), RESTA (-), MULT (*),
+DIV (/), MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
 """
         gramatica_texto.insert(tk.END, info)
         gramatica_texto.config(state=tk.DISABLED)
@@ -387,40 +2591,128 @@ MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
             messagebox.showwarning("Advertencia", "Por favor ingrese una expresión")
             return
         
+        self.cancelar_analisis()
         self.limpiar_resultados()
         
+        # El análisis corre en un hilo de trabajo con una calculadora propia;
+        # los resultados se muestran en el hilo de tkinter al terminar
+        configuracion = self.calculadora.configuracion()
+        
+        def analizar(cancelacion):
+            calculadora = CalculadoraDescendente(**configuracion)
+            calculadora.cancelacion = cancelacion
+            resultado, errores = calculadora.analizar(expresion)
+            return (calculadora.tokens, resultado, errores,
+                    calculadora.traza_derivacion, calculadora.arbol_derivacion)
+        
+        self.progreso.iniciar("Analizando expresión...")
+        self.tarea = TareaSegundoPlano(self.root, analizar,
+                                       lambda datos: self.mostrar_analisis(expresion, *datos),
+                                       self.mostrar_error_inesperado).iniciar()
+    
+    RETARDO_VISTA_PREVIA_MS = 150
+    
+    def programar_vista_previa(self):
+        """Reinicia la espera de la vista previa: solo se evalúa cuando se deja de escribir"""
+        if self.vista_previa_pendiente is not None:
+            self.root.after_cancel(self.vista_previa_pendiente)
+        self.vista_previa_pendiente = self.root.after(self.RETARDO_VISTA_PREVIA_MS, self.actualizar_vista_previa)
+    
+    def actualizar_vista_previa(self):
+        """
+        Evalúa la vista previa en un hilo de trabajo: una expresión enorme o
+        costosa no congela la ventana. Solo un hilo usa el evaluador a la vez;
+        el resultado de una evaluación anterior que sigue en curso se descarta.
+        """
+        self.vista_previa_pendiente = None
+        expresion = self.entrada_expresion.get()
+        tarea = self.tarea_vista_previa
+        if tarea is not None:
+            tarea.cancelar()
+        if not self.vista_previa_activa.get() or not expresion.strip():
+            self.etiqueta_vista_previa.config(text="")
+            return
+        if tarea is not None and tarea.en_curso:
+            # El hilo anterior aún no se detuvo (una operación ya iniciada no
+            # se interrumpe): se vuelve a intentar más tarde
+            self.vista_previa_pendiente = self.root.after(self.RETARDO_VISTA_PREVIA_MS,
+                                                          self.actualizar_vista_previa)
+            return
+        
+        evaluador = self.evaluador_vivo
+        
+        def evaluar(cancelacion):
+            evaluador.calculadora.cancelacion = cancelacion
+            try:
+                return evaluador.evaluar(expresion)
+            finally:
+                evaluador.calculadora.cancelacion = None
+        
+        self.tarea_vista_previa = TareaSegundoPlano(self.root, evaluar, self.mostrar_vista_previa,
+                                                    self.mostrar_error_vista_previa).iniciar()
+    
+    def mostrar_vista_previa(self, datos):
+        self.tarea_vista_previa = None
+        resultado, errores = datos
+        if errores:
+            self.etiqueta_vista_previa.config(text=f"… {errores[0]}", foreground="#B03A2E")
+        else:
+            self.etiqueta_vista_previa.config(text=f"= {resultado}", foreground="#1E8449")
+    
+    def mostrar_error_vista_previa(self, excepcion):
+        self.tarea_vista_previa = None
+        self.evaluador_vivo.reiniciar()
+        self.etiqueta_vista_previa.config(text=f"… {excepcion}", foreground="#B03A2E")
+    
+    def cancelar_analisis(self):
+        """Detiene el análisis en segundo plano en curso (si lo hay)"""
+        if self.tarea is not None:
+            if self.tarea.activa:
+                self.progreso.detener("Análisis cancelado")
+            # Aunque el hilo ya haya terminado, su resultado aún no mostrado se descarta
+            self.tarea.cancelar()
+            self.tarea = None
+    
+    def mostrar_analisis(self, expresion, tokens, resultado, errores, traza, arbol=None):
+        """Muestra en las pestañas el resultado del análisis en segundo plano"""
+        self.tarea = None
+        self.progreso.detener()
         try:
             # Mostrar tokens
-            tokens = self.calculadora.tokenizar(expresion)
             if tokens:
                 self.mostrar_tokens(tokens)
             
-            # Realizar análisis sintáctico
-            resultado, errores = self.calculadora.analizar(expresion)
-            
             # Mostrar resultados
             if errores:
                 self.mostrar_errores(errores)
             else:
                 self.mostrar_resultado(resultado, expresion)
-                self.mostrar_arbol_derivacion()
+                self.derivacion_pendiente = (traza, arbol)
+                if self.notebook.select() == str(self.arbol_frame):
+                    self.mostrar_derivacion_pendiente()
                 
                 # Agregar al historial
                 self.agregar_al_historial(expresion, resultado)
                 
         except Exception as e:
-            self.resultado_texto.insert(tk.END, f"❌ Error inesperado: {str(e)}")
+            self.mostrar_error_inesperado(e)
+    
+    def mostrar_error_inesperado(self, excepcion):
+        self.tarea = None
+        self.progreso.detener()
+        self.resultado_texto.insert(tk.END, f"❌ Error inesperado: {str(excepcion)}")
     
     def mostrar_tokens(self, tokens):
-        self.tokens_texto.insert(tk.END, "ANÁLISIS LÉXICO - TOKENS IDENTIFICADOS\n")
-        self.tokens_texto.insert(tk.END, "=" * 60 + "\n\n")
+        # Todo el texto se arma primero y se inserta con una sola llamada
+        lineas = ["ANÁLISIS LÉXICO - TOKENS IDENTIFICADOS\n", "=" * 60 + "\n\n"]
         
         # Tabla de tokens
-        self.tokens_texto.insert(tk.END, f"{'#':<4} {'TIPO':<15} {'VALOR':<15} {'CATEGORÍA':<20}\n")
-        self.tokens_texto.insert(tk.END, "-" * 60 + "\n")
+        lineas.append(f"{'#':<4} {'TIPO':<15} {'VALOR':<15} {'CATEGORÍA':<20}\n")
+        lineas.append("-" * 60 + "\n")
         
         categorias = {
             'NUMERO': 'Operando',
+            'VARIABLE': 'Operando',
             'SUMA': 'Operador Aritmético',
             'RESTA': 'Operador Aritmético',
             'MULT': 'Operador Aritmético',
@@ -431,62 +2723,82 @@ MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
             'PAREN_DER': 'Delimitador'
         }
         
-        for i, (tipo, valor) in enumerate(tokens, 1):
-            categoria = categorias.get(tipo, 'Desconocido')
-            self.tokens_texto.insert(tk.END, f"{i:<4} {tipo:<15} {valor:<15} {categoria:<20}\n")
+        lineas.extend(f"{i:<4} {tipo:<15} {valor:<15} {categorias.get(tipo, 'Desconocido'):<20}\n"
+                      for i, (tipo, valor) in enumerate(tokens, 1))
         
-        self.tokens_texto.insert(tk.END, f"\n✓ Total de tokens: {len(tokens)}\n")
+        lineas.append(f"\n✓ Total de tokens: {len(tokens)}\n")
+        insertar_texto(self.tokens_texto, lineas)
     
     def mostrar_resultado(self, resultado, expresion):
-        self.resultado_texto.insert(tk.END, "╔═══════════════════════════════════════════════════════╗\n")
-        self.resultado_texto.insert(tk.END, "║          ✓ ANÁLISIS COMPLETADO EXITOSAMENTE          ║\n")
-        self.resultado_texto.insert(tk.END, "╚═══════════════════════════════════════════════════════╝\n\n")
-        
-        self.resultado_texto.insert(tk.END, f"Expresión Original:\n")
-        self.resultado_texto.insert(tk.END, f"  {expresion}\n\n")
-        
-        self.resultado_texto.insert(tk.END, f"Resultado de la Evaluación:\n")
-        self.resultado_texto.insert(tk.END, f"  {resultado}\n\n")
-        
-        self.resultado_texto.insert(tk.END, f"Estado del Análisis:\n")
-        self.resultado_texto.insert(tk.END, f"  ✓ Análisis léxico: CORRECTO\n")
-        self.resultado_texto.insert(tk.END, f"  ✓ Análisis sintáctico: CORRECTO\n")
-        self.resultado_texto.insert(tk.END, f"  ✓ Evaluación semántica: CORRECTO\n\n")
-        
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.resultado_texto.insert(tk.END, f"Fecha y hora: {timestamp}\n")
+        insertar_texto(self.resultado_texto, [
+            "╔═══════════════════════════════════════════════════════╗\n",
+            "║          ✓ ANÁLISIS COMPLETADO EXITOSAMENTE          ║\n",
+            "╚═══════════════════════════════════════════════════════╝\n\n",
+            
+            f"Expresión Original:\n",
+            f"  {expresion}\n\n",
+            
+            f"Resultado de la Evaluación:\n",
+            f"  {resultado}\n\n",
+            
+            f"Estado del Análisis:\n",
+            f"  ✓ Análisis léxico: CORRECTO\n",
+            f"  ✓ Análisis sintáctico: CORRECTO\n",
+            f"  ✓ Evaluación semántica: CORRECTO\n\n",
+            
+            f"Fecha y hora: {timestamp}\n",
+        ])
     
     def mostrar_errores(self, errores):
-        self.resultado_texto.insert(tk.END, "╔═══════════════════════════════════════════════════════╗\n")
-        self.resultado_texto.insert(tk.END, "║            ❌ ERRORES DETECTADOS                      ║\n")
-        self.resultado_texto.insert(tk.END, "╚═══════════════════════════════════════════════════════╝\n\n")
-        
-        for i, error in enumerate(errores, 1):
-            self.resultado_texto.insert(tk.END, f"{i}. {error}\n\n")
-        
-        self.resultado_texto.insert(tk.END, "SUGERENCIAS:\n")
-        self.resultado_texto.insert(tk.END, "• Revise la sintaxis de la expresión\n")
-        self.resultado_texto.insert(tk.END, "• Verifique el balance de paréntesis\n")
-        self.resultado_texto.insert(tk.END, "• Asegúrese de usar solo caracteres válidos\n")
-        self.resultado_texto.insert(tk.END, "• Consulte la pestaña 'Gramática' para más información\n")
-    
-    def mostrar_arbol_derivacion(self):
-        self.arbol_texto.insert(tk.END, "TRAZA DEL ANÁLISIS SINTÁCTICO DESCENDENTE\n")
-        self.arbol_texto.insert(tk.END, "=" * 60 + "\n\n")
-        
-        if self.calculadora.traza_derivacion:
-            for i, paso in enumerate(self.calculadora.traza_derivacion, 1):
-                self.arbol_texto.insert(tk.END, f"{paso}\n")
+        lineas = [
+            "╔═══════════════════════════════════════════════════════╗\n",
+            "║            ❌ ERRORES DETECTADOS                      ║\n",
+            "╚═══════════════════════════════════════════════════════╝\n\n",
+        ]
+        lineas.extend(f"{i}. {error}\n\n" for i, error in enumerate(errores, 1))
+        lineas += [
+            "SUGERENCIAS:\n",
+            "• Revise la sintaxis de la expresión\n",
+            "• Verifique el balance de paréntesis\n",
+            "• Asegúrese de usar solo caracteres válidos\n",
+            "• Consulte la pestaña 'Gramática' para más información\n",
+        ]
+        insertar_texto(self.resultado_texto, lineas)
+    
+    def al_cambiar_pestana(self):
+        if self.notebook.select() == str(self.arbol_frame):
+            self.mostrar_derivacion_pendiente()
+    
+    def mostrar_derivacion_pendiente(self):
+        """Dibuja la derivación del último análisis si todavía no se dibujó"""
+        if self.derivacion_pendiente is not None:
+            traza, arbol = self.derivacion_pendiente
+            self.derivacion_pendiente = None
+            self.mostrar_arbol_derivacion(traza, arbol)
+    
+    def mostrar_arbol_derivacion(self, traza, arbol=None):
+        lineas = ["TRAZA DEL ANÁLISIS SINTÁCTICO DESCENDENTE\n", "=" * 60 + "\n\n"]
+        
+        if traza:
+            lineas.extend(f"{paso}\n" for paso in lineas_traza(traza, arbol))
         else:
-            self.arbol_texto.insert(tk.END, "No hay información de derivación disponible.\n")
+            lineas.append("No hay información de derivación disponible.\n")
         
-        self.arbol_texto.insert(tk.END, "\n" + "=" * 60 + "\n")
-        self.arbol_texto.insert(tk.END, "LEYENDA:\n")
-        self.arbol_texto.insert(tk.END, "• E: Expresión (suma/resta)\n")
-        self.arbol_texto.insert(tk.END, "• T: Término (multiplicación/división/módulo)\n")
-        self.arbol_texto.insert(tk.END, "• P: Potencia\n")
-        self.arbol_texto.insert(tk.END, "• F: Factor (número o subexpresión)\n")
-        self.arbol_texto.insert(tk.END, "• ε: Producción vacía (epsilon)\n")
+        if arbol:
+            lineas += ["\n" + "=" * 60 + "\n", "ÁRBOL DE DERIVACIÓN\n\n"]
+            lineas.extend(f"{linea}\n" for linea in arbol.dibujar())
+        
+        lineas += [
+            "\n" + "=" * 60 + "\n",
+            "LEYENDA:\n",
+            "• E: Expresión (suma/resta)\n",
+            "• T: Término (multiplicación/división/módulo)\n",
+            "• P: Potencia\n",
+            "• F: Factor (número o subexpresión)\n",
+            "• ε: Producción vacía (epsilon)\n",
+        ]
+        insertar_texto(self.arbol_texto, lineas)
     
     def agregar_al_historial(self, expresion, resultado):
         """Agrega una entrada al historial"""
@@ -514,12 +2826,10 @@ MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
         if not self.historial:
             historial_texto.insert(tk.END, "No hay cálculos en el historial.\n")
         else:
-            historial_texto.insert(tk.END, f"{'HORA':<12} {'EXPRESIÓN':<30} {'RESULTADO':<15}\n")
-            historial_texto.insert(tk.END, "=" * 60 + "\n")
-            
-            for entrada in self.historial:
-                historial_texto.insert(tk.END, 
-                    f"{entrada['tiempo']:<12} {entrada['expresion']:<30} {entrada['resultado']:<15}\n")
+            lineas = [f"{'HORA':<12} {'EXPRESIÓN':<30} {'RESULTADO':<15}\n", "=" * 60 + "\n"]
+            lineas.extend(f"{entrada['tiempo']:<12} {entrada['expresion']:<30} {entrada['resultado']:<15}\n"
+                          for entrada in self.historial)
+            insertar_texto(historial_texto, lineas)
         
         historial_texto.config(state=tk.DISABLED)
         
@@ -541,6 +2851,7 @@ MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
     
     def exportar_resultados(self):
         """Exporta los resultados actuales a un archivo"""
+        self.mostrar_derivacion_pendiente()
         contenido_resultado = self.resultado_texto.get(1.0, tk.END).strip()
         contenido_tokens = self.tokens_texto.get(1.0, tk.END).strip()
         contenido_arbol = self.arbol_texto.get(1.0, tk.END).strip()
@@ -587,10 +2898,13 @@ MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
     
     
     def limpiar(self):
+        self.cancelar_analisis()
         self.entrada_expresion.delete(0, tk.END)
+        self.programar_vista_previa()
         self.limpiar_resultados()
     
     def limpiar_resultados(self):
+        self.derivacion_pendiente = None
         self.resultado_texto.delete(1.0, tk.END)
         self.tokens_texto.delete(1.0, tk.END)
         self.arbol_texto.delete(1.0, tk.END)
@@ -637,6 +2951,7 @@ MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
                 self.entrada_expresion.delete(0, tk.END)
                 self.entrada_expresion.insert(0, exp)
                 ejemplo_window.destroy()
+                self.programar_vista_previa()
                 self.analizar_expresion()
             
             ttk.Button(frame, text=f"{nombre}: {ejemplo}", 
@@ -646,11 +2961,220 @@ MOD (%), POT (** o ^), PAREN_IZQ ((), PAREN_DER ())
         scrollbar.pack(side="right", fill="y", pady=(0, 10), padx=(0, 10))
 
 
-def main():
+# ==================== MODO LÍNEA DE COMANDOS ====================
+
+FORMATOS_SALIDA = ('csv', 'jsonl')
+
+
+def crear_parser_cli():
+    """Parser de argumentos del modo de línea de comandos"""
+    parser = argparse.ArgumentParser(
+        prog='programa.py',
+        description="Evalúa expresiones (una por línea) sin interfaz gráfica y escribe "
+                    "los resultados en la salida estándar.")
+    parser.add_argument('--cli', action='store_true',
+                        help="ejecutar en modo línea de comandos (sin interfaz gráfica)")
+    parser.add_argument('archivos', nargs='*', metavar='ARCHIVO',
+                        help="archivos de entrada; sin archivos o con '-' se lee la entrada estándar")
+    parser.add_argument('--formato', choices=FORMATOS_SALIDA, default='csv',
+                        help="formato de salida (por defecto: csv)")
+    parser.add_argument('--motor', choices=MOTORES, default=MOTOR_ITERATIVO,
+                        help="motor de análisis (por defecto: iterativo)")
+    parser.add_argument('--modo', choices=MODOS_NUMERICOS, default=MODO_FLOTANTE,
+                        help="representación de los números (por defecto: flotante)")
+    parser.add_argument('--cache', type=int, default=0, metavar='N',
+                        help="tamaño de la caché de resultados (por defecto: sin caché)")
+    parser.add_argument('--procesos', type=int, default=1, metavar='N',
+                        help="cantidad de procesos de trabajo (por defecto: 1, sin paralelismo)")
+    parser.add_argument('--bloque', type=int, default=256, metavar='K',
+                        help="expresiones enviadas a cada proceso por bloque (por defecto: 256)")
+    parser.add_argument('--magnitud-maxima', type=float, default=None, metavar='M',
+                        help="abortar las expresiones con números o resultados parciales mayores que M")
+    parser.add_argument('--exponente-maximo', type=float, default=None, metavar='E',
+                        help="abortar las expresiones con exponentes mayores que E en valor absoluto")
+    parser.add_argument('--tiempo-maximo', type=float, default=None, metavar='S',
+                        help="abortar las expresiones que tarden más de S segundos")
+    parser.add_argument('--mmap', action='store_true',
+                        help="leer los archivos con mmap y enviar a los procesos rangos de "
+                             "bytes en lugar de líneas (no admite la entrada estándar)")
+    parser.add_argument('--bloque-bytes', type=int, default=1 << 20, metavar='B',
+                        help="tamaño aproximado en bytes de cada rango con --mmap (por defecto: 1 MiB)")
+    return parser
+
+
+def _leer_lineas(archivos):
+    """Genera (numero_linea, texto) de cada archivo sin cargarlo completo en memoria"""
+    for nombre in archivos or ['-']:
+        if nombre == '-':
+            entrada = sys.stdin
+            for numero, linea in enumerate(entrada, 1):
+                yield numero, linea.rstrip('\r\n')
+        else:
+            with open(nombre, encoding='utf-8', errors='replace') as entrada:
+                for numero, linea in enumerate(entrada, 1):
+                    yield numero, linea.rstrip('\r\n')
+
+
+def _valor_serializable(valor):
+    """Números finitos tal cual; complejos, infinitos y NaN como texto"""
+    if valor is None or isinstance(valor, int):
+        return valor
+    if isinstance(valor, float) and math.isfinite(valor):
+        return valor
+    return str(valor)
+
+
+def _resultados_flujo(lineas, calculadora, procesos, tamano_bloque):
+    """Genera (numero_linea, expresion, resultado, errores) de las líneas no vacías, en orden"""
+    no_vacias = ((numero, expresion) for numero, expresion in lineas if expresion.strip())
+    
+    if procesos <= 1:
+        for numero, expresion in no_vacias:
+            resultado, errores = calculadora.analizar(expresion)
+            yield numero, expresion, resultado, errores
+        return
+    
+    # Solo se guardan las líneas que están en vuelo: los resultados llegan en orden
+    pendientes = deque()
+    
+    def expresiones():
+        for numero, expresion in no_vacias:
+            pendientes.append((numero, expresion))
+            yield expresion
+    
+    for _, resultado, errores in calculadora.analizar_lote(expresiones(), workers=procesos,
+                                                           chunk_size=tamano_bloque):
+        numero, expresion = pendientes.popleft()
+        yield numero, expresion, resultado, errores
+
+
+def _resultados_mapeados(archivos, calculadora, procesos, tamano_bloque_bytes):
+    """Como _resultados_flujo(), pero leyendo cada archivo con ArchivoMapeado"""
+    for nombre in archivos:
+        with ArchivoMapeado(nombre, tamano_bloque_bytes) as archivo:
+            for numero, inicio, fin, resultado, errores in calculadora.analizar_archivo(archivo, workers=procesos):
+                yield numero, archivo.texto(inicio, fin), resultado, errores
+
+
+def evaluar_flujo(lineas, salida, formato='csv', calculadora=None, procesos=1, tamano_bloque=256):
+    """
+    Evalúa cada (numero_linea, expresion) y escribe una fila por expresión en
+    `salida` a medida que avanza (memoria constante). Las líneas en blanco se
+    omiten. Con procesos > 1 se usa analizar_lote() conservando el orden.
+    Retorna la cantidad de expresiones con errores.
+    """
+    if calculadora is None:
+        calculadora = CalculadoraDescendente(nivel_traza=TRAZA_DESACTIVADA, motor=MOTOR_ITERATIVO)
+    return _escribir_resultados(_resultados_flujo(lineas, calculadora, procesos, tamano_bloque),
+                                salida, formato)
+
+
+def evaluar_archivos_mapeados(archivos, salida, formato='csv', calculadora=None, procesos=1,
+                              tamano_bloque_bytes=1 << 20):
+    """
+    Como evaluar_flujo(), pero lee los archivos con mmap (ver ArchivoMapeado y
+    CalculadoraDescendente.analizar_archivo()). La salida es la misma.
+    """
+    if calculadora is None:
+        calculadora = CalculadoraDescendente(nivel_traza=TRAZA_DESACTIVADA, motor=MOTOR_ITERATIVO)
+    return _escribir_resultados(_resultados_mapeados(archivos, calculadora, procesos, tamano_bloque_bytes),
+                                salida, formato)
+
+
+def _escribir_resultados(filas, salida, formato):
+    """Escribe cada (numero_linea, expresion, resultado, errores); retorna las filas con errores"""
+    if formato not in FORMATOS_SALIDA:
+        raise ValueError(f"Formato no válido: {formato!r}. Opciones: {', '.join(FORMATOS_SALIDA)}")
+    
+    if formato == 'csv':
+        escritor = csv.writer(salida, lineterminator='\n')
+        escritor.writerow(['linea', 'expresion', 'resultado', 'error'])
+    
+    con_errores = 0
+    for numero, expresion, resultado, errores in filas:
+        error = '; '.join(errores) if errores else None
+        if errores:
+            con_errores += 1
+        
+        if formato == 'csv':
+            escritor.writerow([numero, expresion, '' if resultado is None else resultado, error or ''])
+        else:
+            salida.write(json.dumps({
+                'linea': numero,
+                'expresion': expresion,
+                'resultado': _valor_serializable(resultado),
+                'error': error,
+            }, ensure_ascii=False) + '\n')
+    
+    return con_errores
+
+
+def ejecutar_cli(argumentos):
+    """Punto de entrada del modo línea de comandos; retorna el código de salida"""
+    parser = crear_parser_cli()
+    opciones = parser.parse_args(argumentos)
+    presupuesto = PresupuestoEvaluacion(opciones.magnitud_maxima, opciones.exponente_maximo,
+                                        opciones.tiempo_maximo)
+    if all(limite is None for limite in presupuesto):
+        presupuesto = None
+    try:
+        calculadora = CalculadoraDescendente(tamano_cache=opciones.cache,
+                                             nivel_traza=TRAZA_DESACTIVADA,
+                                             motor=opciones.motor,
+                                             presupuesto=presupuesto,
+                                             modo_numerico=opciones.modo)
+    except ValueError as e:
+        parser.error(str(e))
+    if opciones.mmap and (not opciones.archivos or '-' in opciones.archivos):
+        print("Error: --mmap requiere archivos (no admite la entrada estándar)", file=sys.stderr)
+        return 2
+    try:
+        if opciones.mmap:
+            evaluar_archivos_mapeados(opciones.archivos, sys.stdout, opciones.formato, calculadora,
+                                      opciones.procesos, opciones.bloque_bytes)
+        else:
+            evaluar_flujo(_leer_lineas(opciones.archivos), sys.stdout,
+                          opciones.formato, calculadora, opciones.procesos, opciones.bloque)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # El consumidor cerró la tubería (por ejemplo `| head`): terminar sin ruido
+        sys.stderr.close()
+        return 0
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    # Los errores de las expresiones son parte de la salida, no un fallo del proceso
+    return 0
+
+
+def _pide_linea_comandos(argumentos):
+    """
+    El modo línea de comandos se elige con --cli, archivos de entrada o
+    --formato. Cualquier otro argumento (p. ej. los que agrega un lanzador)
+    no impide abrir la interfaz gráfica.
+    """
+    parser = crear_parser_cli()
+    parser.set_defaults(formato=None)
+    opciones, _ = parser.parse_known_args(argumentos)
+    return opciones.cli or bool(opciones.archivos) or opciones.formato is not None
+
+
+def ejecutar_interfaz():
+    """Abre la interfaz gráfica y retorna el código de salida al cerrarla"""
+    _importar_tkinter()
     root = tk.Tk()
     app = InterfazCalculadora(root)
     root.mainloop()
+    return 0
+
+
+def main(argumentos=None):
+    if argumentos is None:
+        argumentos = sys.argv[1:]
+    if _pide_linea_comandos(argumentos):
+        return ejecutar_cli(argumentos)
+    return ejecutar_interfaz()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
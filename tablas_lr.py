@@ -0,0 +1,231 @@
+"""
+Generador de tablas LALR(1)
+
+Autores:
+    - Juan Esteban Cardozo Rivera
+    - Juan Sebastián Gómez Usuga
+
+Descripción:
+    Construye las tablas ACCION e IR_A de un analizador LALR(1) a partir de
+    una gramática. Los estados se identifican por su núcleo LR(0) y las
+    anticipaciones se propagan hasta que no cambian (se obtiene el mismo
+    autómata que al fusionar los estados LR(1) con el mismo núcleo).
+
+Formato:
+    La gramática es una secuencia de producciones (cabeza, cuerpo), donde
+    cuerpo es una tupla de símbolos. La producción 0 debe ser la aumentada
+    S' → S. Un símbolo es no terminal si es la cabeza de alguna producción.
+
+    ACCION[estado] es un diccionario terminal → código:
+        código >= 0    desplazar (SHIFT) e ir a ese estado
+        código < 0     reducir por la producción ~código; ~0 (la aumentada) es ACEPTAR
+    IR_A[estado] es un diccionario no terminal → estado.
+
+    cargar_tablas() guarda las tablas generadas en un archivo (marshal) junto
+    con la huella de la gramática, y en los siguientes arranques las lee de
+    ahí en lugar de volver a generarlas.
+"""
+
+import hashlib
+import marshal
+import os
+import tempfile
+
+FIN = '$'  # Terminal de fin de entrada
+
+# Versión del formato del archivo y del generador: cambiarla invalida los
+# archivos de tablas ya guardados
+VERSION_TABLAS = 1
+
+
+def desplazar(estado):
+    """Código de ACCION para desplazar e ir a `estado`"""
+    return estado
+
+
+def reducir(produccion):
+    """Código de ACCION para reducir por `produccion` (0 = aceptar)"""
+    return ~produccion
+
+
+def _calcular_primeros(producciones, no_terminales):
+    """Conjuntos PRIMEROS de cada no terminal y el conjunto de no terminales anulables"""
+    primeros = {simbolo: set() for simbolo in no_terminales}
+    anulables = set()
+    cambio = True
+    while cambio:
+        cambio = False
+        for cabeza, cuerpo in producciones:
+            antes = (len(primeros[cabeza]), cabeza in anulables)
+            for simbolo in cuerpo:
+                if simbolo in no_terminales:
+                    primeros[cabeza] |= primeros[simbolo]
+                    if simbolo not in anulables:
+                        break
+                else:
+                    primeros[cabeza].add(simbolo)
+                    break
+            else:
+                anulables.add(cabeza)
+            if (len(primeros[cabeza]), cabeza in anulables) != antes:
+                cambio = True
+    return primeros, anulables
+
+
+def generar_tablas(producciones):
+    """
+    Retorna (ACCION, IR_A) como tuplas indexadas por estado (el estado
+    inicial es el 0). Lanza una excepción si la gramática no es LALR(1).
+    """
+    no_terminales = {cabeza for cabeza, _ in producciones}
+    primeros, anulables = _calcular_primeros(producciones, no_terminales)
+    por_cabeza = {simbolo: [] for simbolo in no_terminales}
+    for indice, (cabeza, _) in enumerate(producciones):
+        por_cabeza[cabeza].append(indice)
+
+    def anticipaciones(resto, siguientes):
+        """PRIMEROS(resto siguientes) para un ítem A → α · B resto"""
+        resultado = set()
+        for simbolo in resto:
+            if simbolo not in no_terminales:
+                resultado.add(simbolo)
+                return resultado
+            resultado |= primeros[simbolo]
+            if simbolo not in anulables:
+                return resultado
+        return resultado | siguientes
+
+    def cerradura(nucleo):
+        """Ítems (producción, punto) → anticipaciones del estado con ese núcleo"""
+        items = {item: set(siguientes) for item, siguientes in nucleo.items()}
+        pendientes = list(items)
+        while pendientes:
+            produccion, punto = pendientes.pop()
+            cuerpo = producciones[produccion][1]
+            if punto == len(cuerpo) or cuerpo[punto] not in no_terminales:
+                continue
+            nuevas = anticipaciones(cuerpo[punto + 1:], items[(produccion, punto)])
+            for derivada in por_cabeza[cuerpo[punto]]:
+                item = (derivada, 0)
+                actuales = items.get(item)
+                if actuales is None:
+                    items[item] = set(nuevas)
+                elif nuevas <= actuales:
+                    continue
+                else:
+                    actuales |= nuevas
+                pendientes.append(item)
+        return items
+
+    # Autómata LALR(1): un estado por núcleo; si llegan anticipaciones nuevas
+    # a un núcleo ya conocido, el estado se vuelve a procesar
+    nucleos = [{(0, 0): {FIN}}]
+    indices = {frozenset(nucleos[0]): 0}
+    transiciones = [{}]
+    pendientes = [0]
+    while pendientes:
+        estado = pendientes.pop()
+        sucesores = {}
+        for (produccion, punto), siguientes in cerradura(nucleos[estado]).items():
+            cuerpo = producciones[produccion][1]
+            if punto < len(cuerpo):
+                sucesores.setdefault(cuerpo[punto], {})[(produccion, punto + 1)] = siguientes
+        for simbolo, nucleo in sucesores.items():
+            clave = frozenset(nucleo)
+            destino = indices.get(clave)
+            if destino is None:
+                destino = indices[clave] = len(nucleos)
+                nucleos.append({item: set(siguientes) for item, siguientes in nucleo.items()})
+                transiciones.append({})
+                pendientes.append(destino)
+            else:
+                cambio = False
+                for item, siguientes in nucleo.items():
+                    if not siguientes <= nucleos[destino][item]:
+                        nucleos[destino][item] |= siguientes
+                        cambio = True
+                if cambio and destino not in pendientes:
+                    pendientes.append(destino)
+            transiciones[estado][simbolo] = destino
+
+    accion = []
+    ir_a = []
+    for estado, nucleo in enumerate(nucleos):
+        fila_accion = {}
+        fila_ir_a = {}
+        for simbolo, destino in transiciones[estado].items():
+            if simbolo in no_terminales:
+                fila_ir_a[simbolo] = destino
+            else:
+                fila_accion[simbolo] = desplazar(destino)
+        for (produccion, punto), siguientes in cerradura(nucleo).items():
+            if punto < len(producciones[produccion][1]):
+                continue
+            for terminal in siguientes:
+                anterior = fila_accion.get(terminal)
+                if anterior is not None and anterior != reducir(produccion):
+                    tipo = 'desplazar/reducir' if anterior >= 0 else 'reducir/reducir'
+                    raise Exception(f"Conflicto {tipo} en el estado {estado} con '{terminal}': "
+                                    f"la gramática no es LALR(1)")
+                fila_accion[terminal] = reducir(produccion)
+        accion.append(fila_accion)
+        ir_a.append(fila_ir_a)
+    return tuple(accion), tuple(ir_a)
+
+
+def huella_gramatica(producciones):
+    """Huella (SHA-256) de la gramática y de la versión del generador"""
+    contenido = repr((VERSION_TABLAS, tuple((cabeza, tuple(cuerpo)) for cabeza, cuerpo in producciones)))
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def cargar_tablas(producciones, archivo):
+    """
+    Retorna (ACCION, IR_A) de la gramática leyéndolas de `archivo`. Si el
+    archivo no existe, está dañado o es de otra gramática (huella distinta),
+    las tablas se generan y se guardan para el siguiente arranque; si no se
+    puede escribir en el directorio, solo se generan.
+    """
+    huella = huella_gramatica(producciones)
+    try:
+        with open(archivo, 'rb') as f:
+            guardada, accion, ir_a = marshal.load(f)
+        if guardada == huella:
+            return accion, ir_a
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    accion, ir_a = generar_tablas(producciones)
+    guardar_tablas(archivo, huella, accion, ir_a)
+    return accion, ir_a
+
+
+# Permisos del archivo de tablas: mkstemp() lo crea con 0o600 y los procesos
+# de otros usuarios (instalación compartida) no podrían leerlo. La máscara
+# solo se puede leer cambiándola, así que se consulta una vez al importar.
+_MASCARA = os.umask(0)
+os.umask(_MASCARA)
+PERMISOS_TABLAS = 0o644 & ~_MASCARA
+
+
+def guardar_tablas(archivo, huella, accion, ir_a):
+    """
+    Escribe las tablas en un archivo temporal y lo renombra: varios procesos
+    que arrancan a la vez nunca leen un archivo a medio escribir. El archivo
+    queda con PERMISOS_TABLAS (0o644 según la umask del proceso).
+    """
+    directorio = os.path.dirname(os.path.abspath(archivo))
+    try:
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix='.tablas-', suffix='.tmp')
+    except OSError:
+        return
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            marshal.dump((huella, accion, ir_a), f)
+        os.chmod(temporal, PERMISOS_TABLAS)
+        os.replace(temporal, archivo)
+    except OSError:
+        try:
+            os.unlink(temporal)
+        except OSError:
+            pass
@@ -0,0 +1,118 @@
+"""
+Tareas en segundo plano para las interfaces gráficas
+
+Autores:
+    - Juan Esteban Cardozo Rivera
+    - Juan Sebastián Gómez Usuga
+
+Descripción:
+    tkinter solo puede usarse desde el hilo principal. TareaSegundoPlano
+    ejecuta el análisis en un hilo de trabajo y revisa periódicamente (con
+    root.after) si terminó, para entregar el resultado en el hilo principal.
+    Así la ventana sigue respondiendo mientras se analiza una expresión
+    enorme o corre una Máquina de Turing larga.
+
+    La cancelación es cooperativa: la función recibe un threading.Event y el
+    cálculo lo consulta en cada paso, lanzando TareaCancelada cuando está
+    activo.
+"""
+
+import threading
+
+
+class TareaCancelada(Exception):
+    """El cálculo se detuvo porque se pidió cancelar la tarea"""
+
+
+def verificar_cancelacion(cancelacion):
+    """Lanza TareaCancelada si `cancelacion` (threading.Event o None) está activo"""
+    if cancelacion is not None and cancelacion.is_set():
+        raise TareaCancelada("Operación cancelada")
+
+
+class TareaSegundoPlano:
+    """
+    Ejecuta funcion(cancelacion) en un hilo de trabajo. Al terminar se llama,
+    en el hilo de tkinter, a al_terminar(resultado) o a al_fallar(excepcion);
+    si la tarea se canceló no se llama a ninguna de las dos.
+    """
+
+    INTERVALO_MS = 50  # Cada cuánto se revisa si el hilo terminó
+
+    def __init__(self, root, funcion, al_terminar, al_fallar=None):
+        self.root = root
+        self.funcion = funcion
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.cancelacion = threading.Event()
+        self._resultado = None
+        self._excepcion = None
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        self.root.after(self.INTERVALO_MS, self._revisar)
+        return self
+
+    def cancelar(self):
+        """Pide detener el cálculo; el resultado que llegue después se descarta"""
+        self.cancelacion.set()
+
+    @property
+    def activa(self):
+        return self._hilo.is_alive() and not self.cancelacion.is_set()
+
+    @property
+    def en_curso(self):
+        """El hilo sigue ejecutándose, aunque ya se haya pedido cancelar"""
+        return self._hilo.is_alive()
+
+    def _ejecutar(self):
+        # Hilo de trabajo: no toca ningún widget
+        try:
+            self._resultado = self.funcion(self.cancelacion)
+        except BaseException as e:
+            self._excepcion = e
+
+    def _revisar(self):
+        # Hilo de tkinter
+        if self._hilo.is_alive():
+            self.root.after(self.INTERVALO_MS, self._revisar)
+            return
+        if self.cancelacion.is_set():
+            return
+        if self._excepcion is not None:
+            if self.al_fallar is None:
+                raise self._excepcion
+            self.al_fallar(self._excepcion)
+        else:
+            self.al_terminar(self._resultado)
+
+
+class PanelProgreso:
+    """
+    Barra de progreso indeterminada con un botón Cancelar. Está siempre
+    visible (así no cambia la disposición de la ventana) y solo se activa
+    mientras hay una tarea en curso.
+    """
+
+    def __init__(self, padre, al_cancelar):
+        from tkinter import ttk
+        self.frame = ttk.Frame(padre)
+        self.barra = ttk.Progressbar(self.frame, mode='indeterminate', length=220)
+        self.barra.pack(side='left', padx=(0, 8))
+        self.etiqueta = ttk.Label(self.frame, text="", width=28)
+        self.etiqueta.pack(side='left', padx=(0, 8))
+        self.boton = ttk.Button(self.frame, text="⏹ Cancelar", command=al_cancelar, width=12)
+        self.boton.pack(side='left')
+        self.boton.state(['disabled'])
+
+    def iniciar(self, texto="Procesando..."):
+        self.etiqueta.config(text=texto)
+        self.boton.state(['!disabled'])
+        self.barra.start(12)
+
+    def detener(self, texto=""):
+        self.barra.stop()
+        self.etiqueta.config(text=texto)
+        self.boton.state(['disabled'])
@@ -203,26 +203,199 @@ class TestAnalizadorAscendente(unittest.TestCase):
     
     # ==================== PRUEBAS DE ERRORES ====================
     
-    # NOTA: Este test está deshabilitado porque el analizador actualmente
-    # no valida este tipo de error sintáctico (operador sin operando izquierdo)
-    # def test_error_sintaxis(self):
-    #     """Prueba detección de error de sintaxis"""
-    #     resultado, datos = self.analizador.analizar_sintaxis("x = + 5")
-    #     self.assertFalse(resultado)
-    #     self.assertTrue(len(datos) > 0)
-    
-    # NOTA: Este test está deshabilitado porque el analizador actualmente
-    # no valida paréntesis desbalanceados durante el análisis sintáctico
-    # def test_error_parentesis_desbalanceados(self):
-    #     """Prueba detección de paréntesis desbalanceados"""
-    #     resultado, datos = self.analizador.analizar_sintaxis("x = (5 + 3")
-    #     self.assertFalse(resultado)
-    
+    def test_error_sintaxis(self):
+        """Prueba detección de error de sintaxis"""
+        resultado, datos = self.analizador.analizar_sintaxis("x = + 5")
+        self.assertFalse(resultado)
+        self.assertTrue(len(datos) > 0)
+    
+    def test_error_parentesis_desbalanceados(self):
+        """Prueba detección de paréntesis desbalanceados"""
+        resultado, datos = self.analizador.analizar_sintaxis("x = (5 + 3")
+        self.assertFalse(resultado)
+    
+    def test_error_cadenas_invalidas(self):
+        """Prueba que se rechazan cadenas que no genera la gramática"""
+        for expresion in ["x = y = 2", "2 3", ")", "x =", "(2 + 3))", "5 = x", "x = 2 * / 3"]:
+            resultado, datos = self.analizador.analizar_sintaxis(expresion)
+            self.assertFalse(resultado, expresion)
+            self.assertTrue(datos[0].startswith("Error de sintaxis"), expresion)
+            var, valor, errores = self.analizador.evaluar_expresion(expresion)
+            self.assertIsNone(valor, expresion)
+        self.assertEqual(self.analizador.variables, {})
+
+    def test_error_evaluacion(self):
+        """Prueba que los errores de evaluación no asignan la variable"""
+        _, valor, errores = self.analizador.evaluar_expresion("x = 1 / 0")
+        self.assertIsNone(valor)
+        self.assertEqual(errores, ["Error de evaluación: division by zero"])
+        _, valor, errores = self.analizador.evaluar_expresion("y = z * 2")
+        self.assertIsNone(valor)
+        self.assertEqual(errores, ["Error de evaluación: Variable no definida: 'z'"])
+        # Un error de sintaxis posterior tiene prioridad
+        _, _, errores = self.analizador.evaluar_expresion("x = 1 / 0 +")
+        self.assertTrue(errores[0].startswith("Error de sintaxis"))
+        self.assertEqual(self.analizador.variables, {})
+
+    def test_variables_con_prefijo_comun(self):
+        """Prueba variables cuyo nombre es prefijo de otra (antes se sustituía texto)"""
+        self.analizador.evaluar_expresion("x = 2")
+        self.analizador.evaluar_expresion("xy = 10")
+        _, valor, _ = self.analizador.evaluar_expresion("r = xy - x")
+        self.assertEqual(valor, 8)
+        _, valor, errores = self.analizador.evaluar_expresion("__import__")
+        self.assertIsNone(valor)
+        self.assertTrue(errores[0].startswith("Error de evaluación"))
+
     def test_error_caracter_invalido(self):
         """Prueba detección de carácter inválido"""
         tokens = self.analizador.tokenizar("x = 5 @ 3")
         self.assertEqual(len(tokens), 0)
         self.assertTrue(len(self.analizador.errores) > 0)
+    
+    # ==================== PRUEBAS DEL MOTOR LALR(1) ====================
+    
+    def test_traza_sigue_las_producciones(self):
+        """Prueba que cada REDUCE reemplaza el cuerpo de su producción en la pila"""
+        from analizador_ascendente import PRODUCCIONES, _etiqueta_reduccion
+        etiquetas = {_etiqueta_reduccion(i): produccion for i, produccion in enumerate(PRODUCCIONES)}
+        _, traza = self.analizador.analizar_sintaxis("x = (a - 2) * 3 / b + 7")
+        for anterior, paso in zip(traza, traza[1:]):
+            if paso['accion'].startswith('REDUCE'):
+                cabeza, cuerpo = etiquetas[paso['accion']]
+                self.assertEqual(anterior['pila'][-len(cuerpo):], list(cuerpo))
+                self.assertEqual(paso['pila'], anterior['pila'][:-len(cuerpo)] + [cabeza])
+            elif paso['accion'].startswith('SHIFT'):
+                self.assertEqual(paso['pila'][-1], paso['accion'].split()[1])
+        self.assertEqual(traza[-2]['accion'], 'REDUCE S → VAR = E (Asignación)')
+        self.assertEqual(traza[-1]['pila'], ['$', 'S'])
+    
+    def test_tablas_lalr(self):
+        """Prueba el generador de tablas con una gramática ambigua y una LALR(1) que no es SLR(1)"""
+        from tablas_lr import FIN, generar_tablas
+        with self.assertRaises(Exception):
+            generar_tablas([("S'", ('E',)), ('E', ('E', '+', 'E')), ('E', ('n',))])
+        # S → L = R | R, L → * R | id, R → L
+        accion, ir_a = generar_tablas([("S'", ('S',)), ('S', ('L', '=', 'R')), ('S', ('R',)),
+                                       ('L', ('*', 'R')), ('L', ('id',)), ('R', ('L',))])
+        self.assertEqual(len(accion), 10)
+        self.assertEqual(accion[ir_a[0]['S']][FIN], ~0)
+
+    def test_tablas_persistidas(self):
+        """Prueba que las tablas guardadas se reutilizan y se regeneran si cambia la gramática"""
+        import os
+        import tempfile
+        from unittest import mock
+        import tablas_lr
+        from analizador_ascendente import ACCION, IR_A, PRODUCCIONES
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = os.path.join(directorio, 'tablas.bin')
+            self.assertEqual(tablas_lr.cargar_tablas(PRODUCCIONES, archivo), (ACCION, IR_A))
+            self.assertTrue(os.path.exists(archivo))
+            if os.name == 'posix':
+                # Legible por los procesos de otros usuarios (sin ignorar la umask)
+                mascara = os.umask(0)
+                os.umask(mascara)
+                self.assertEqual(os.stat(archivo).st_mode & 0o777, 0o644 & ~mascara)
+            with mock.patch.object(tablas_lr, 'generar_tablas', side_effect=AssertionError):
+                self.assertEqual(tablas_lr.cargar_tablas(PRODUCCIONES, archivo), (ACCION, IR_A))
+
+            # Otra gramática: la huella no coincide y se regenera
+            otra = PRODUCCIONES[:-1]
+            accion, _ = tablas_lr.cargar_tablas(otra, archivo)
+            self.assertNotEqual(accion, ACCION)
+            self.assertEqual(tablas_lr.cargar_tablas(otra, archivo)[0], accion)
+
+            # Un archivo dañado también se regenera
+            with open(archivo, 'wb') as f:
+                f.write(b'\x00basura')
+            self.assertEqual(tablas_lr.cargar_tablas(PRODUCCIONES, archivo), (ACCION, IR_A))
+
+    def test_una_pasada(self):
+        """Prueba que evaluar tokeniza una sola vez y que la traza es opcional"""
+        llamadas = []
+        tokenizar = self.analizador.tokenizar
+        self.analizador.tokenizar = lambda expresion: llamadas.append(expresion) or tokenizar(expresion)
+        var, valor, traza = self.analizador.evaluar_expresion("x = 2(3 + 4.5)")
+        self.assertEqual(llamadas, ["x = 2(3 + 4.5)"])
+        self.assertEqual((var, valor), ("x", 15.0))
+        self.assertEqual(self.analizador.tokens[3:5], [('MULT', '*'), ('PAREN_IZQ', '(')])
+
+        var, valor, traza_omitida, metricas = self.analizador.evaluar_expresion(
+            "y = x / 3", metricas=True, traza=False)
+        self.assertEqual((var, valor, traza_omitida), ("y", 5.0, None))
+        _, _, traza = AnalizadorAscendente().evaluar_expresion("y = 15.0 / 3")
+        self.assertEqual(metricas.longitud_traza, len(traza))
+        self.assertEqual(metricas.profundidad_maxima, max(len(paso['pila']) for paso in traza))
+
+        _, valor, errores = self.analizador.evaluar_expresion("y = (x", traza=False)
+        self.assertIsNone(valor)
+        self.assertTrue(errores[0].startswith("Error de sintaxis"))
+
+    def test_traza_perezosa(self):
+        """Prueba que la traza comparte la pila entre pasos y arma las filas al consultarlas"""
+        from collections.abc import Sequence
+        _, _, traza = self.analizador.evaluar_expresion("x = 5")
+        self.assertIsInstance(traza, Sequence)
+        self.assertEqual(traza[0], {'paso': 0, 'pila': ['$'], 'entrada': 'x = 5', 'accion': 'Estado inicial'})
+        self.assertEqual(traza[3], {'paso': 3, 'pila': ['$', 'VAR', 'IGUAL', 'NUMERO'],
+                                    'entrada': '$', 'accion': 'SHIFT NUMERO'})
+        self.assertEqual(traza[-1], traza[len(traza) - 1])
+        self.assertEqual(list(traza), traza[:])
+        self.assertIn(traza[1], traza)
+        self.assertEqual([paso['paso'] for paso in reversed(traza)], list(range(len(traza)))[::-1])
+        with self.assertRaises(IndexError):
+            traza[len(traza)]
+        # Un SHIFT solo agrega un nodo sobre la pila del paso anterior
+        self.assertIs(traza.pilas[3][1], traza.pilas[2])
+        # analizar_sintaxis() retorna las mismas filas como lista
+        _, filas = self.analizador.analizar_sintaxis("x = 5")
+        self.assertEqual(filas, list(traza))
+
+        expresion = "x = " + " + ".join(["(2 * 3 - 1)"] * 2000)
+        _, _, traza = self.analizador.evaluar_expresion(expresion)
+        self.assertEqual(traza[-1]['accion'], '✓ ACEPTAR')
+        self.assertEqual(traza[2]['accion'], 'SHIFT IGUAL')
+        self.assertTrue(traza[2]['entrada'].startswith("( 2 * 3 - 1 ) + ( 2 * 3 - 1 ) +"))
+        self.assertEqual(traza[-2]['entrada'], '$')
+        cursor = traza.cursores[100]
+        self.assertEqual(traza[100]['entrada'], ' '.join(t[1] for t in self.analizador.tokens[cursor:]))
+
+    # ==================== PRUEBAS DE MÉTRICAS ====================
+    
+    def test_metricas(self):
+        """Prueba el registro de métricas por fase"""
+        var, valor, traza, metricas = self.analizador.evaluar_expresion("x = 2(3 + 4)", metricas=True)
+        self.assertEqual((var, valor), ("x", 14))
+        self.assertEqual(metricas.tokens, 9)
+        self.assertEqual(metricas.longitud_traza, len(traza))
+        self.assertEqual(metricas.profundidad_maxima, max(len(paso['pila']) for paso in traza))
+        self.assertGreater(metricas.tiempo_sintactico, 0)
+        
+        # La evaluación ocurre en las reducciones: no es una fase aparte
+        self.assertIsNone(metricas.tiempo_evaluacion)
+        self.assertAlmostEqual(metricas.tiempo_total, metricas.tiempo_lexico + metricas.tiempo_sintactico)
+        
+        # Con un error léxico no hay análisis sintáctico
+        _, _, errores, metricas = self.analizador.evaluar_expresion("x = 5 @ 3", metricas=True)
+        self.assertTrue(errores[0].startswith("Error léxico"))
+        self.assertEqual((metricas.tokens, metricas.profundidad_maxima), (0, 0))
+        
+        # Con un error de sintaxis se informa lo alcanzado hasta el error
+        _, _, errores, metricas = self.analizador.evaluar_expresion("x = ((2 + ", metricas=True)
+        self.assertTrue(errores[0].startswith("Error de sintaxis"))
+        self.assertGreaterEqual(metricas.profundidad_maxima, 4)
+        self.assertGreater(metricas.longitud_traza, 0)
+    
+    def test_cancelacion(self):
+        """Prueba que un análisis cancelado no asigna la variable"""
+        import threading
+        from tareas import TareaCancelada
+        self.analizador.cancelacion = threading.Event()
+        self.analizador.cancelacion.set()
+        with self.assertRaises(TareaCancelada):
+            self.analizador.evaluar_expresion("x = 1 + 2")
+        self.assertNotIn("x", self.analizador.variables)
 
 
 def ejecutar_pruebas():
@@ -260,6 +260,19 @@ class TestIntegracion(unittest.TestCase):
         # Estado de aceptación debe ser correcto
         self.assertEqual(mt_leng.estado_aceptacion, 'qaccept')
         self.assertEqual(mt_leng.estado_rechazo, 'qreject')
+    
+    def test_cancelacion(self):
+        """Test: Con la cancelación activa la máquina se detiene en el siguiente paso"""
+        import threading
+        from tareas import TareaCancelada
+        cancelacion = threading.Event()
+        cancelacion.set()
+        for mt, ejecutar in [(MaquinaTuring(), lambda mt: mt.suma_unaria(3, 2)),
+                             (MaquinaTuringLenguajes(), lambda mt: mt.reconocer_palindromo("abba"))]:
+            mt.cancelacion = cancelacion
+            with self.assertRaises(TareaCancelada):
+                ejecutar(mt)
+            self.assertEqual(mt.historial, [])
 
 
 def run_tests():
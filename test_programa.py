@@ -15,6 +15,11 @@ import sys
 import re
 from datetime import datetime
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Importar solo la clase del analizador (sin interfaz gráfica)
 class CalculadoraDescendente:
     def __init__(self):
@@ -515,6 +520,1324 @@ class TestCalculadoraDescendente(unittest.TestCase):
         self.assertEqual(len(errores), 0)
 
 
+
+class TestTokenizadorMaestro(unittest.TestCase):
+    """Pruebas del tokenizador con expresión regular maestra de programa.py"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma()
+        self.referencia = CalculadoraDescendente()
+    
+    def test_mismos_tokens_que_original(self):
+        """Test: Produce los mismos tokens que el tokenizador original"""
+        expresiones = ["2 + 3", "2**3^2", "-(4.25 % 3) / 7", "((1))", "  10\t*\n2  ", "3.", "1.5.2", ""]
+        for expresion in expresiones:
+            self.assertEqual(self.calc.tokenizar(expresion), self.referencia.tokenizar(expresion))
+    
+    def test_mismos_tokens_aleatorios(self):
+        """Test: Coincide con el original en expresiones aleatorias"""
+        import random
+        generador = random.Random(1234)
+        alfabeto = "0123456789.+-*/%^() "
+        for _ in range(500):
+            expresion = ''.join(generador.choice(alfabeto) for _ in range(generador.randint(0, 30)))
+            self.assertEqual(self.calc.tokenizar(expresion), self.referencia.tokenizar(expresion))
+    
+    def test_mismo_error_lexico(self):
+        """Test: Reporta el mismo error léxico que el original"""
+        self.calc.tokenizar("2 + @ 3")
+        self.referencia.tokenizar("2 + @ 3")
+        self.assertEqual(self.calc.errores, self.referencia.errores)
+        self.assertIn("posición 4", self.calc.errores[0])
+
+
+# Expresiones de referencia para comparar los distintos caminos de evaluación
+EXPRESIONES_EQUIVALENCIA = [
+    "2 + 3", "2 + 3 * 4 - 5", "(2 + 3) * 4", "2 ** 3 ** 2", "2 ^ -1", "-5 * 3 + 10",
+    "-(5 + 3)", "-(-(2))", "((2 + 3) * (4 - 1)) / 2", "10 % 3 * 2", "7.5 / 2.5",
+    "(-8) ** (1 / 3)", "10 / 0", "10 % (3 - 3)", "1 / 0 2", "(2 + 3", "2 + 3)", "2 3",
+    "+", "2 + * 3", "2 +", "* 3", "-", "- +", "(", "()", "2 + @", "", "   ",
+    "10 ** 400", "0 ** -1",
+]
+
+
+class TestCompilacion(unittest.TestCase):
+    """Pruebas de compilar(): analizar una vez y evaluar muchas"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma()
+    
+    def test_mismo_resultado_que_analizar(self):
+        """Test: La expresión compilada produce lo mismo que analizar()"""
+        for expresion in EXPRESIONES_EQUIVALENCIA:
+            esperado = self.calc.analizar(expresion)
+            compilada, errores = self.calc.compilar(expresion)
+            if compilada is None:
+                self.assertIsNone(esperado[0], expresion)
+                self.assertGreater(len(errores), 0)
+            else:
+                self.assertEqual(compilada(), esperado, expresion)
+    
+    def test_errores_sintacticos(self):
+        """Test: compilar() reporta los mismos errores sintácticos que analizar()"""
+        for expresion in ["(2 + 3", "2 + 3)", "2 +", "* 3", "- +"]:
+            _, esperados = self.calc.analizar(expresion)
+            compilada, errores = self.calc.compilar(expresion)
+            self.assertIsNone(compilada)
+            self.assertEqual(errores, esperados)
+    
+    def test_error_lexico(self):
+        """Test: compilar() conserva el error léxico"""
+        compilada, errores = self.calc.compilar("2 + @")
+        self.assertIsNone(compilada)
+        self.assertIn("Error léxico", errores[0])
+    
+    def test_evaluar_sin_reanalizar(self):
+        """Test: Evaluar la expresión compilada no vuelve a tokenizar ni analizar"""
+        from unittest import mock
+        import programa
+        compilada, _ = self.calc.compilar("(2 + 3) * 4 ** 2")
+        with mock.patch.object(programa.CalculadoraDescendente, 'tokenizar', side_effect=AssertionError), \
+             mock.patch.object(programa.CalculadoraDescendente, 'E', side_effect=AssertionError):
+            for _ in range(3):
+                self.assertEqual(compilada(), (80.0, []))
+    
+    def test_arbol(self):
+        """Test: El árbol respeta precedencia y asociatividad"""
+        compilada, _ = self.calc.compilar("1 - 2 * -3 ^ 2")
+        self.assertEqual(compilada.arbol,
+                         ('RESTA', ('NUMERO', 1.0), ('MULT', ('NUMERO', 2.0), ('POT', ('NUMERO', -3.0), ('NUMERO', 2.0)))))
+
+
+class TestCacheExpresiones(unittest.TestCase):
+    """Pruebas de la caché LRU opcional de CalculadoraDescendente"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma(tamano_cache=3)
+        self.sin_cache = CalculadoraPrograma()
+    
+    def test_desactivada_por_defecto(self):
+        """Test: Sin tamaño de caché no hay caché"""
+        self.assertIsNone(self.sin_cache.cache)
+    
+    def test_mismos_resultados(self):
+        """Test: Con caché los resultados y errores son los mismos"""
+        for _ in range(2):
+            for expresion in EXPRESIONES_EQUIVALENCIA:
+                self.assertEqual(self.calc.analizar(expresion), self.sin_cache.analizar(expresion), expresion)
+                self.assertEqual(self.calc.traza_derivacion, self.sin_cache.traza_derivacion)
+    
+    def test_normaliza_espacios(self):
+        """Test: Expresiones que solo difieren en espacios comparten entrada"""
+        self.calc.analizar("2 + 3")
+        resultado, errores = self.calc.analizar("  2   +\t3 ")
+        self.assertEqual(resultado, 5.0)
+        self.assertEqual(errores, [])
+        self.assertEqual(self.calc.cache.aciertos, 1)
+        self.assertEqual(self.calc.cache.fallos, 1)
+    
+    def test_desalojo_lru(self):
+        """Test: Se desaloja la entrada usada menos recientemente"""
+        for expresion in ["1 + 1", "2 + 2", "3 + 3"]:
+            self.calc.analizar(expresion)
+        self.calc.analizar("1 + 1")      # 1 + 1 pasa a ser la más reciente
+        self.calc.analizar("4 + 4")      # desaloja 2 + 2
+        estadisticas = self.calc.cache.estadisticas()
+        self.assertEqual(estadisticas['tamano'], 3)
+        self.assertEqual(estadisticas['desalojos'], 1)
+        self.calc.analizar("2 + 2")      # fallo: desaloja 3 + 3
+        self.assertEqual(self.calc.cache.fallos, 5)
+        self.calc.analizar("1 + 1")
+        self.assertEqual(self.calc.cache.aciertos, 2)
+        self.calc.analizar("3 + 3")
+        self.assertEqual(self.calc.cache.fallos, 6)
+    
+    def test_cache_compilados(self):
+        """Test: compilar() reutiliza la expresión compilada"""
+        primera, _ = self.calc.compilar("(2 + 3) * 4")
+        segunda, errores = self.calc.compilar(" (2  +  3) *  4")
+        self.assertIs(primera, segunda)
+        self.assertEqual(errores, [])
+        self.assertEqual(segunda(), (20.0, []))
+    
+    def test_tamano_invalido(self):
+        """Test: El tamaño máximo debe ser positivo"""
+        from programa import CacheExpresiones
+        with self.assertRaises(ValueError):
+            CacheExpresiones(0)
+
+
+class TestNivelTraza(unittest.TestCase):
+    """Pruebas del nivel de traza de derivación configurable"""
+    
+    def crear(self, nivel):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        return CalculadoraPrograma(nivel_traza=nivel)
+    
+    def test_completa_por_defecto(self):
+        """Test: Por defecto se genera la traza completa de siempre"""
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        calc = CalculadoraPrograma()
+        referencia = CalculadoraDescendente()
+        calc.analizar("(2 + 3) * 4 ** 2 - 1")
+        referencia.analizar("(2 + 3) * 4 ** 2 - 1")
+        self.assertEqual(calc.traza_derivacion, referencia.traza_derivacion)
+    
+    def test_desactivada(self):
+        """Test: Sin traza no se registra ningún paso"""
+        calc = self.crear('desactivada')
+        resultado, errores = calc.analizar("(2 + 3) * 4")
+        self.assertEqual(resultado, 20.0)
+        self.assertEqual(calc.traza_derivacion, [])
+    
+    def test_resumen(self):
+        """Test: El resumen solo tiene inicio, resumen y fin"""
+        calc = self.crear('resumen')
+        calc.analizar("(2 + 3) * 4")
+        self.assertEqual(len(calc.traza_derivacion), 3)
+        self.assertIn("7 tokens", calc.traza_derivacion[1])
+    
+    def test_mismos_resultados(self):
+        """Test: El nivel de traza no cambia resultados ni errores"""
+        completa = self.crear('completa')
+        desactivada = self.crear('desactivada')
+        for expresion in EXPRESIONES_EQUIVALENCIA:
+            self.assertEqual(desactivada.analizar(expresion), completa.analizar(expresion), expresion)
+    
+    def test_nivel_invalido(self):
+        """Test: Un nivel desconocido se rechaza"""
+        with self.assertRaises(ValueError):
+            self.crear('detallada')
+
+
+class TestMotorIterativo(unittest.TestCase):
+    """Pruebas del motor iterativo (pila explícita) de CalculadoraDescendente"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.iterativo = CalculadoraPrograma(motor='iterativo')
+        self.recursivo = CalculadoraPrograma(motor='recursivo')
+    
+    def test_mismos_resultados(self):
+        """Test: Mismos resultados y errores que el motor recursivo"""
+        for expresion in EXPRESIONES_EQUIVALENCIA:
+            self.assertEqual(self.iterativo.analizar(expresion), self.recursivo.analizar(expresion), expresion)
+    
+    def test_mismos_resultados_aleatorios(self):
+        """Test: Coincide con el motor recursivo en secuencias aleatorias de tokens"""
+        import random
+        generador = random.Random(42)
+        piezas = ["1", "2", "0", "3.5", "+", "-", "*", "/", "%", "**", "^", "(", ")"]
+        for _ in range(2000):
+            expresion = ' '.join(generador.choice(piezas) for _ in range(generador.randint(1, 12)))
+            self.assertEqual(self.iterativo.analizar(expresion), self.recursivo.analizar(expresion), expresion)
+    
+    def test_cadena_larga_de_sumas(self):
+        """Test: Miles de sumas no alcanzan el límite de recursión"""
+        resultado, errores = self.iterativo.analizar(" + ".join(["1"] * 50000))
+        self.assertEqual(errores, [])
+        self.assertEqual(resultado, 50000.0)
+    
+    def test_parentesis_profundos(self):
+        """Test: Anidamiento profundo de paréntesis"""
+        profundidad = 20000
+        resultado, errores = self.iterativo.analizar("-(" * profundidad + "2" + ")" * profundidad)
+        self.assertEqual(errores, [])
+        self.assertEqual(resultado, 2.0)
+        _, errores = self.iterativo.analizar("(" * profundidad + "2" + ")" * (profundidad - 1))
+        self.assertIn("Se esperaba 'PAREN_DER'", errores[0])
+    
+    def test_compilar_expresiones_profundas(self):
+        """Test: compilar() admite expresiones largas y profundas"""
+        compilada, errores = self.iterativo.compilar(" - ".join(["1"] * 20000))
+        self.assertEqual(errores, [])
+        self.assertEqual(compilada(), (-19998.0, []))
+        compilada, _ = self.iterativo.compilar("(" * 5000 + "2 / 0" + ")" * 5000)
+        self.assertEqual(compilada(), (None, ["Error de sintaxis: División por cero detectada"]))
+    
+    def test_traza_resumen(self):
+        """Test: El motor iterativo deja solo la traza resumida"""
+        self.iterativo.analizar("2 + 3")
+        self.assertEqual(len(self.iterativo.traza_derivacion), 3)
+    
+    def test_motor_invalido(self):
+        """Test: Un motor desconocido se rechaza"""
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        with self.assertRaises(ValueError):
+            CalculadoraPrograma(motor='lalr')
+
+
+class TestModoLineaComandos(unittest.TestCase):
+    """Pruebas del modo línea de comandos (sin interfaz gráfica)"""
+    
+    def test_no_importa_tkinter(self):
+        """Test: Importar programa.py no carga tkinter"""
+        import subprocess
+        codigo = "import sys, programa; sys.exit('tkinter' in sys.modules)"
+        proceso = subprocess.run([sys.executable, '-c', codigo], cwd=self._directorio())
+        self.assertEqual(proceso.returncode, 0)
+    
+    def test_flujo_csv(self):
+        """Test: Salida CSV con una fila por expresión"""
+        import csv
+        import io
+        from programa import evaluar_flujo
+        salida = io.StringIO()
+        errores = evaluar_flujo([(1, "2 + 3"), (2, ""), (3, "10 / 0")], salida, 'csv')
+        filas = list(csv.reader(io.StringIO(salida.getvalue())))
+        self.assertEqual(errores, 1)
+        self.assertEqual(filas[0], ['linea', 'expresion', 'resultado', 'error'])
+        self.assertEqual(filas[1], ['1', '2 + 3', '5.0', ''])
+        self.assertEqual(filas[2][0], '3')
+        self.assertIn("División por cero", filas[2][3])
+    
+    def test_flujo_jsonl(self):
+        """Test: Salida JSONL con valores serializables"""
+        import io
+        import json
+        from programa import evaluar_flujo
+        salida = io.StringIO()
+        evaluar_flujo([(1, "2 ** 3"), (2, "(-8) ** (1 / 3)"), (3, "2 +")], salida, 'jsonl')
+        filas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+        self.assertEqual(filas[0], {'linea': 1, 'expresion': "2 ** 3", 'resultado': 8.0, 'error': None})
+        self.assertIsInstance(filas[1]['resultado'], str)
+        self.assertIsNone(filas[2]['resultado'])
+        self.assertIn("incompleta", filas[2]['error'])
+    
+    def test_archivo_desde_linea_comandos(self):
+        """Test: Lee un archivo y escribe en la salida estándar"""
+        import os
+        import subprocess
+        import tempfile
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, 'expresiones.txt')
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                archivo.write("1 + 1\r\n(2 + 3) * 4\n")
+            proceso = subprocess.run([sys.executable, 'programa.py', '--cli', ruta, '--formato', 'jsonl'],
+                                     cwd=self._directorio(), capture_output=True, text=True)
+        self.assertEqual(proceso.returncode, 0)
+        self.assertEqual(len(proceso.stdout.splitlines()), 2)
+        self.assertIn('"resultado": 20.0', proceso.stdout)
+    
+    def test_seleccion_de_modo(self):
+        """Test: Sin --cli, archivos ni --formato se abre la interfaz gráfica"""
+        from unittest import mock
+        import programa
+        casos = [([], 'interfaz'), (['-psn_0_12345'], 'interfaz'), (['--motor', 'recursivo'], 'interfaz'),
+                 (['--cli'], 'cli'), (['expresiones.txt'], 'cli'), (['--formato', 'jsonl'], 'cli'),
+                 (['--formato=csv'], 'cli')]
+        for argumentos, modo in casos:
+            with mock.patch.object(programa, 'ejecutar_interfaz', return_value='interfaz'), \
+                 mock.patch.object(programa, 'ejecutar_cli', return_value='cli'):
+                self.assertEqual(programa.main(argumentos), modo, argumentos)
+    
+    def _directorio(self):
+        import os
+        return os.path.dirname(os.path.abspath(__file__))
+
+
+class TestAnalisisPorLotes(unittest.TestCase):
+    """Pruebas de analizar_lote() con varios procesos"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma(motor='iterativo')
+        self.expresiones = [f"{i} * 2 + 1" for i in range(200)] + EXPRESIONES_EQUIVALENCIA
+        self.esperados = [self.calc.analizar(expresion) for expresion in self.expresiones]
+    
+    def test_ordenado(self):
+        """Test: Resultados en el orden de entrada"""
+        resultados = list(self.calc.analizar_lote(iter(self.expresiones), workers=2, chunk_size=16))
+        self.assertEqual([indice for indice, _, _ in resultados], list(range(len(self.expresiones))))
+        self.assertEqual([(r, e) for _, r, e in resultados], self.esperados)
+    
+    def test_no_ordenado(self):
+        """Test: Sin orden se obtienen los mismos resultados con su índice"""
+        resultados = sorted(self.calc.analizar_lote(self.expresiones, workers=2, chunk_size=7, ordenado=False),
+                            key=lambda fila: fila[0])
+        self.assertEqual([(r, e) for _, r, e in resultados], self.esperados)
+    
+    def test_un_proceso(self):
+        """Test: Con un solo proceso se analiza en el proceso actual"""
+        resultados = list(self.calc.analizar_lote(self.expresiones, workers=1))
+        self.assertEqual([(r, e) for _, r, e in resultados], self.esperados)
+    
+    def test_bloque_invalido(self):
+        """Test: El tamaño de bloque debe ser positivo"""
+        with self.assertRaises(ValueError):
+            list(self.calc.analizar_lote(self.expresiones, chunk_size=0))
+
+
+class TestEvaluacionReentrante(unittest.TestCase):
+    """Pruebas de evaluar(): API sin estado compartida entre hilos"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma()
+        self.referencia = CalculadoraPrograma()
+    
+    def test_mismos_resultados(self):
+        """Test: Mismo valor y errores que analizar()"""
+        for expresion in EXPRESIONES_EQUIVALENCIA:
+            resultado = self.calc.evaluar(expresion)
+            esperado, errores = self.referencia.analizar(expresion)
+            self.assertEqual((resultado.valor, list(resultado.errores)), (esperado, errores), expresion)
+    
+    def test_resultado_inmutable(self):
+        """Test: El resultado es inmutable y no modifica la calculadora"""
+        resultado = self.calc.evaluar("2 + 3")
+        self.assertEqual(resultado.valor, 5.0)
+        self.assertEqual(resultado.tokens, (('NUMERO', '2'), ('SUMA', '+'), ('NUMERO', '3')))
+        self.assertIsNone(resultado.traza)
+        with self.assertRaises(AttributeError):
+            resultado.valor = 0
+        self.assertEqual(self.calc.tokens, [])
+        self.assertEqual(self.calc.traza_derivacion, [])
+    
+    def test_traza_opcional(self):
+        """Test: Con traza=True se incluye la derivación completa"""
+        resultado = self.calc.evaluar("(2 + 3) * 4", traza=True)
+        self.referencia.analizar("(2 + 3) * 4")
+        self.assertEqual(resultado.valor, 20.0)
+        self.assertEqual(list(resultado.traza), self.referencia.traza_derivacion)
+    
+    def test_traza_sin_otra_calculadora(self):
+        """Test: La traza se registra en un estado local, sin crear otra calculadora"""
+        from unittest import mock
+        import programa
+        with mock.patch.object(programa.CalculadoraDescendente, '__init__',
+                               side_effect=AssertionError("se creó otra calculadora")):
+            resultado = self.calc.evaluar("2 ^ x + 1", traza=True, variables={'x': 3})
+            errores = self.calc.evaluar("2 +", traza=True).errores
+        self.assertEqual(resultado.valor, 9.0)
+        self.referencia.analizar("2 ^ x + 1", {'x': 3})
+        self.assertEqual(list(resultado.traza), self.referencia.traza_derivacion)
+        self.assertEqual(self.calc.traza_derivacion, [])
+        self.assertEqual(list(errores), self.referencia.analizar("2 +")[1])
+    
+    def test_hilos_concurrentes(self):
+        """Test: Una sola calculadora atiende un pool de hilos"""
+        from concurrent.futures import ThreadPoolExecutor
+        expresiones = [f"({i} + 1) * 2 - {i} % 7" for i in range(2000)] + EXPRESIONES_EQUIVALENCIA * 20
+        esperados = [self.referencia.analizar(expresion)[0] for expresion in expresiones]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            valores = [r.valor for r in pool.map(self.calc.evaluar, expresiones)]
+        self.assertEqual(valores, esperados)
+
+class TestOptimizador(unittest.TestCase):
+    """Pruebas de optimizar_arbol(): plegado de constantes y simplificaciones"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma()
+        self.referencia = CalculadoraPrograma()
+    
+    def arbol(self, expresion):
+        compilada, errores = self.calc.compilar(expresion, optimizar=True)
+        self.assertEqual(errores, [], expresion)
+        return compilada.arbol
+    
+    def test_mismos_resultados(self):
+        """Test: El árbol optimizado da el mismo valor y errores que analizar()"""
+        for expresion in EXPRESIONES_EQUIVALENCIA:
+            esperado = self.referencia.analizar(expresion)
+            compilada, errores = self.calc.compilar(expresion, optimizar=True)
+            if compilada is None:
+                self.assertIsNone(esperado[0], expresion)
+                self.assertGreater(len(errores), 0)
+            else:
+                self.assertEqual(compilada(), esperado, expresion)
+    
+    def test_plegado_constantes(self):
+        """Test: Los subárboles constantes se calculan de antemano"""
+        self.assertEqual(self.arbol("(2 + 3) * 4 - 2 ** 3"), ('NUMERO', 12.0))
+        self.assertEqual(self.arbol("-(-(2))"), ('NUMERO', 2.0))
+    
+    def test_aplanado_nario(self):
+        """Test: Las cadenas de + y * se aplanan en nodos n-arios"""
+        self.assertEqual(self.arbol("1 / 0 + 2 * 3 + 4"),
+                         ('SUMA', ('DIV', ('NUMERO', 1.0), ('NUMERO', 0.0)), ('NUMERO', 6.0), ('NUMERO', 4.0)))
+        compilada, _ = self.calc.compilar(" + ".join(["(1 % 0)"] * 5), optimizar=True)
+        self.assertEqual(len(compilada.arbol), 6)
+    
+    def test_identidades(self):
+        """Test: x * 1, x + 0, x - 0 y x ** 1 se reducen a x"""
+        division = ('DIV', ('NUMERO', 1.0), ('NUMERO', 0.0))
+        for expresion in ("(1 / 0) * 1", "1 * (1 / 0)", "(1 / 0) + 0", "0 + (1 / 0)",
+                          "(1 / 0) - 0", "(1 / 0) ** 1", "-(-(1 / 0))"):
+            self.assertEqual(self.arbol(expresion), division, expresion)
+    
+    def test_errores_conservados(self):
+        """Test: La división y el módulo por cero siguen fallando al evaluar"""
+        for expresion, mensaje in (("(1 / 0) * 1", "División por cero detectada"),
+                                   ("2 + 10 % (3 - 3)", "Módulo por cero no está definido")):
+            compilada, errores = self.calc.compilar(expresion, optimizar=True)
+            self.assertEqual(errores, [])
+            self.assertEqual(compilada(), (None, [f"Error de sintaxis: {mensaje}"]))
+    
+    def test_cadena_profunda(self):
+        """Test: Una cadena muy larga queda como un árbol poco profundo"""
+        expresion = " + ".join(["(1 / 0)"] * 5000)
+        compilada, errores = self.calc.compilar(expresion, optimizar=True)
+        self.assertEqual(errores, [])
+        self.assertEqual(len(compilada.arbol), 5001)
+        self.assertEqual(compilada(), (None, ["Error de sintaxis: División por cero detectada"]))
+        compilada, _ = self.calc.compilar(" * ".join(["2"] * 50), optimizar=True)
+        self.assertEqual(compilada(), (2.0 ** 50, []))
+
+    def test_potencias_costosas_sin_plegar(self):
+        """Test: Las potencias de resultado enorme no se calculan al optimizar"""
+        from programa import CalculadoraDescendente as CalculadoraPrograma, PresupuestoEvaluacion
+        for modo in ('entero', 'fraccion'):
+            calc = CalculadoraPrograma(modo_numerico=modo, presupuesto=PresupuestoEvaluacion(magnitud_maxima=1e12))
+            for expresion in ("9 ** 387420489", "2 ** -387420489"):
+                compilada, errores = calc.compilar(expresion, optimizar=True)
+                self.assertEqual(compilada.arbol[0], 'POT', (modo, expresion))
+            self.assertEqual(calc.compilar("9 ** 387420489", optimizar=True)[0]()[1],
+                             ["Error de presupuesto: La potencia supera la magnitud máxima permitida (1e+12)"])
+            self.assertEqual(calc.compilar("2 ** 10", optimizar=True)[0].arbol[1], 1024)
+    
+    def test_modos_numericos(self):
+        """Test: En cada modo el árbol optimizado da el mismo tipo y valor que analizar()"""
+        from fractions import Fraction
+        from decimal import Decimal
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        expresiones = ["(1)**3.5*y", "(1)**3.5*y**y%-2/x+y%y%-2", "x - 0/0.5", "x + 0 * 2.5", "x * 1",
+                       "1 * x + 0", "x ** 1 - 0", "x ** (2 - 1.0)", "(2 - 1.0) * x", "x - (0.5 - 0.5)",
+                       "0 + x + 1 - 1", "-(-x) * (4 / 4)", "y * (3 % 2) + (2 ** 0.5 - 2 ** 0.5)"]
+        entornos = {'flotante': {'x': 3.0, 'y': 0.5}, 'entero': {'x': 3, 'y': 2},
+                    'fraccion': {'x': Fraction(3), 'y': Fraction(1, 3)},
+                    'decimal': {'x': Decimal(3), 'y': Decimal('0.5')}}
+        for modo, entorno in entornos.items():
+            calc = CalculadoraPrograma(modo_numerico=modo)
+            for expresion in expresiones:
+                esperado, errores = calc.analizar(expresion, entorno)
+                for backend in ('clausuras', 'codigo'):
+                    compilada, _ = calc.compilar(expresion, optimizar=True, backend=backend)
+                    resultado, errores_compilada = compilada(entorno)
+                    self.assertEqual(errores_compilada, errores, (modo, expresion))
+                    self.assertIs(type(resultado), type(esperado), (modo, expresion))
+                    self.assertEqual(resultado, esperado, (modo, expresion))
+
+
+class TestGeneracionCodigo(unittest.TestCase):
+    """Pruebas del backend de generación de código (compilar con backend='codigo')"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma()
+    
+    def test_mismo_resultado_que_analizar(self):
+        """Test: El código generado produce lo mismo que analizar(), con y sin optimizar"""
+        for optimizar in (False, True):
+            for expresion in EXPRESIONES_EQUIVALENCIA:
+                esperado = self.calc.analizar(expresion)
+                compilada, errores = self.calc.compilar(expresion, optimizar, backend='codigo')
+                if compilada is None:
+                    self.assertIsNone(esperado[0], expresion)
+                    self.assertGreater(len(errores), 0)
+                else:
+                    self.assertEqual(compilada.backend, 'codigo', expresion)
+                    self.assertEqual(compilada(), esperado, expresion)
+    
+    def test_codigo_generado(self):
+        """Test: La fuente generada respeta precedencia, asociatividad y verificaciones"""
+        from programa import generar_codigo
+        compilada, _ = self.calc.compilar("-2 ** 2 + 10 % (3 - 3) / 4")
+        fuente, constantes = generar_codigo(compilada.arbol)
+        self.assertEqual(fuente, "(((-2.0) ** (2.0)) + _dividir(_modulo((10.0), ((3.0) - (3.0))), (4.0)))")
+        self.assertEqual(constantes, {})
+    
+    def test_constantes_no_literales(self):
+        """Test: Los complejos plegados se pasan como constantes"""
+        compilada, _ = self.calc.compilar("(-8) ** (1 / 3) * 2", optimizar=True, backend='codigo')
+        self.assertEqual(compilada(), self.calc.analizar("(-8) ** (1 / 3) * 2"))
+    
+    def test_anidamiento_profundo(self):
+        """Test: Las expresiones demasiado anidadas usan el backend de clausuras"""
+        expresion = "-(" * 500 + "1" + ")" * 500
+        compilada, errores = self.calc.compilar(expresion, backend='codigo')
+        self.assertEqual(errores, [])
+        self.assertEqual(compilada.backend, 'clausuras')
+        self.assertEqual(compilada(), (1.0, []))
+    
+    def test_backend_invalido(self):
+        """Test: Un backend desconocido es rechazado"""
+        with self.assertRaises(ValueError):
+            self.calc.compilar("1 + 1", backend='llvm')
+
+class TestVariables(unittest.TestCase):
+    """Pruebas de las variables en la gramática (F → variable | -variable)"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.clase = CalculadoraPrograma
+        self.variables = {'x': 3.0, 'tasa_1': 0.5}
+    
+    def test_tokens_variable(self):
+        """Test: Los identificadores se reconocen como VARIABLE"""
+        calc = self.clase()
+        self.assertEqual(calc.tokenizar("tasa_1*x"),
+                         [('VARIABLE', 'tasa_1'), ('MULT', '*'), ('VARIABLE', 'x')])
+    
+    def test_ambos_motores(self):
+        """Test: Los dos motores y evaluar() dan el mismo valor"""
+        for motor in ('recursivo', 'iterativo'):
+            calc = self.clase(motor=motor)
+            self.assertEqual(calc.analizar("-x ** 2 + x / tasa_1", self.variables), (15.0, []))
+        self.assertEqual(calc.evaluar("-x ** 2 + x / tasa_1", variables=self.variables).valor, 15.0)
+    
+    def test_variable_no_definida(self):
+        """Test: Usar una variable sin valor es un error"""
+        for motor in ('recursivo', 'iterativo'):
+            resultado, errores = self.clase(motor=motor).analizar("x + y", {'x': 1.0})
+            self.assertIsNone(resultado)
+            self.assertEqual(errores, ["Error de sintaxis: Variable no definida: 'y'"])
+    
+    def test_traza_variable(self):
+        """Test: La traza muestra el valor de la variable"""
+        calc = self.clase()
+        calc.analizar("x + 1", self.variables)
+        self.assertIn("        F → x (variable = 3.0)", calc.traza_derivacion)
+    
+    def test_cache_con_variables(self):
+        """Test: Los resultados con variables no se guardan en la caché"""
+        calc = self.clase(tamano_cache=8)
+        self.assertEqual(calc.analizar("x * 2", {'x': 1.0}), (2.0, []))
+        self.assertEqual(calc.analizar("x * 2", {'x': 5.0}), (10.0, []))
+        self.assertEqual(calc.cache.estadisticas()['tamano'], 0)
+    
+    def test_compilada_con_variables(self):
+        """Test: Una expresión compilada se evalúa con distintos valores"""
+        calc = self.clase()
+        for backend in ('clausuras', 'codigo'):
+            for optimizar in (False, True):
+                compilada, errores = calc.compilar("(x * 1 + 0) / (y - 2) + -x", optimizar, backend)
+                self.assertEqual(errores, [])
+                self.assertEqual(compilada.variables, ('x', 'y'))
+                self.assertEqual(compilada({'x': 3.0, 'y': 4.0}), (-1.5, []))
+                self.assertEqual(compilada({'x': 3.0, 'y': 2.0}),
+                                 (None, ["Error de sintaxis: División por cero detectada"]))
+                self.assertEqual(compilada({'x': 3.0}),
+                                 (None, ["Error de sintaxis: Variable no definida: 'y'"]))
+    
+    def test_orden_de_los_errores_compilada(self):
+        """Test: La expresión compilada reporta el primer error en el mismo orden que analizar()"""
+        from programa import PresupuestoEvaluacion
+        expresiones = ["1%0*x0", "x0*(1%0)", "1/0 + y", "y + 1/0", "x / (y - y) % z", "z ** 2 / (x - 3)",
+                       "-(y % 0) * x", "2 ** x / 0 + y"]
+        for modo in ('flotante', 'entero', 'fraccion'):
+            for presupuesto in (None, PresupuestoEvaluacion(magnitud_maxima=1e12)):
+                calc = self.clase(modo_numerico=modo, presupuesto=presupuesto)
+                for expresion in expresiones:
+                    esperado = calc.analizar(expresion, {'x': 3})
+                    for backend in ('clausuras', 'codigo'):
+                        for optimizar in (False, True):
+                            compilada, _ = calc.compilar(expresion, optimizar, backend)
+                            self.assertEqual(compilada({'x': 3}), esperado,
+                                             (modo, presupuesto, expresion, backend, optimizar))
+
+
+@unittest.skipUnless(numpy is not None, "NumPy no está instalado")
+class TestEvaluacionVectorizada(unittest.TestCase):
+    """Pruebas de ExpresionCompilada.evaluar_vectorizado() con arreglos de NumPy"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma()
+    
+    def test_mismo_resultado_por_fila(self):
+        """Test: Coincide con evaluar fila por fila"""
+        x = numpy.linspace(-5, 5, 101)
+        y = numpy.arange(101) % 7 + 1
+        for backend in ('clausuras', 'codigo'):
+            compilada, _ = self.calc.compilar("(x + 1) * 2 ** 2 - x % y / -y", True, backend)
+            resultado, errores = compilada.evaluar_vectorizado({'x': x, 'y': y})
+            self.assertEqual(errores, [])
+            esperado = [compilada({'x': float(a), 'y': float(b)})[0] for a, b in zip(x, y)]
+            numpy.testing.assert_allclose(resultado, esperado)
+    
+    def test_broadcasting(self):
+        """Test: Los escalares se combinan con los arreglos"""
+        compilada, _ = self.calc.compilar("x * escala + 1")
+        resultado, _ = compilada.evaluar_vectorizado({'x': [1, 2, 3], 'escala': 10})
+        numpy.testing.assert_array_equal(resultado, [11.0, 21.0, 31.0])
+    
+    def test_divisor_cero(self):
+        """Test: Un solo divisor cero produce el error de T'"""
+        compilada, _ = self.calc.compilar("1 / x + 1 % x")
+        self.assertEqual(compilada.evaluar_vectorizado({'x': numpy.array([1.0, 0.0])}),
+                         (None, ["Error de sintaxis: División por cero detectada"]))
+
+    def test_modos_numericos(self):
+        """Test: En todos los modos el cálculo vectorizado es en coma flotante"""
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        from decimal import Decimal
+        from fractions import Fraction
+        x = numpy.array([1.0, 2.5, -4.0])
+        y = numpy.array([3, 4, 5])
+        esperado = x * 2 + 1 / 3 - y % 2
+        for modo in ('entero', 'fraccion', 'decimal'):
+            calc = CalculadoraPrograma(modo_numerico=modo)
+            for optimizar in (False, True):
+                compilada, _ = calc.compilar("x * 2 + 1/3 - y % 2", optimizar)
+                resultado, errores = compilada.evaluar_vectorizado({'x': x, 'y': y})
+                self.assertEqual(errores, [], modo)
+                self.assertEqual(resultado.dtype, numpy.float64, modo)
+                numpy.testing.assert_allclose(resultado, esperado)
+        # Escalares exactos como variables
+        compilada, _ = CalculadoraPrograma(modo_numerico='fraccion').compilar("x + y")
+        resultado, _ = compilada.evaluar_vectorizado({'x': Fraction(1, 2), 'y': Decimal('0.25')})
+        self.assertEqual((float(resultado), resultado.dtype), (0.75, numpy.float64))
+
+class TestFlujoTokens(unittest.TestCase):
+    """Pruebas de FlujoTokens: tokens en arreglos paralelos con valores perezosos"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.clase = CalculadoraPrograma
+        self.calc = CalculadoraPrograma()
+    
+    def test_misma_secuencia_que_lista(self):
+        """Test: Equivale a la lista de tuplas de tokenizar()"""
+        for expresion in EXPRESIONES_EQUIVALENCIA + ["  tasa * (x1 - 2.5) ^ 2  "]:
+            lista = self.clase().tokenizar(expresion)
+            flujo = self.calc.tokenizar_flujo(expresion)
+            self.assertEqual(len(flujo), len(lista))
+            self.assertEqual(list(flujo), lista)
+            self.assertEqual(flujo[1:3], lista[1:3])
+    
+    def test_arreglos_compactos(self):
+        """Test: Guarda códigos y posiciones, no subcadenas"""
+        flujo = self.calc.tokenizar_flujo("12.5 + x")
+        self.assertEqual(flujo.codigos.typecode, 'B')
+        self.assertEqual(list(flujo.inicios), [0, 5, 7])
+        self.assertEqual(list(flujo.finales), [4, 6, 8])
+        self.assertEqual((flujo.tipo(2), flujo.valor(0)), ('VARIABLE', '12.5'))
+        self.assertEqual(flujo.tamano_bytes(), 3 * (1 + 2 * flujo.inicios.itemsize))
+    
+    def test_error_lexico(self):
+        """Test: Mismo error léxico que tokenizar()"""
+        flujo = self.calc.tokenizar_flujo("2 + @ 3")
+        referencia = self.clase()
+        referencia.tokenizar("2 + @ 3")
+        self.assertEqual(len(flujo), 0)
+        self.assertEqual(self.calc.errores, referencia.errores)
+    
+    def test_analisis_compacto(self):
+        """Test: Ambos motores y compilar() dan los mismos resultados con tokens compactos"""
+        for motor in ('recursivo', 'iterativo'):
+            referencia = self.clase(motor=motor)
+            compacta = self.clase(motor=motor, tokens_compactos=True)
+            for expresion in EXPRESIONES_EQUIVALENCIA:
+                self.assertEqual(compacta.analizar(expresion), referencia.analizar(expresion), expresion)
+                self.assertEqual(compacta.traza_derivacion, referencia.traza_derivacion, expresion)
+                self.assertEqual(compacta.evaluar(expresion).valor, referencia.evaluar(expresion).valor)
+        compilada, _ = compacta.compilar("x * 2 + 1")
+        self.assertEqual(compilada({'x': 4.0}), (9.0, []))
+    
+    def test_expresion_grande(self):
+        """Test: El motor iterativo recorre el flujo sin materializar tuplas"""
+        calc = self.clase(nivel_traza='desactivada', motor='iterativo', tokens_compactos=True)
+        resultado, errores = calc.analizar(" + ".join(["(3 * 2)"] * 50000))
+        self.assertEqual((resultado, errores), (300000.0, []))
+        self.assertEqual(type(calc.tokens).__name__, 'FlujoTokens')
+
+class TestEntradaMapeada(unittest.TestCase):
+    """Pruebas de la lectura con mmap (ArchivoMapeado y analizar_archivo())"""
+    
+    CONTENIDO = ("1 + 1\r\n\n   \n(2 + 3) * 4\n2 + @\n\u00a0\n3 \u00a0+ 1\nx + 1\n"
+                 "10 / 0\n\u2003 5\n" + "\n".join(EXPRESIONES_EQUIVALENCIA) + "\n7 ** 2")
+    
+    def setUp(self):
+        import os
+        import tempfile
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.calc = CalculadoraPrograma(nivel_traza='desactivada', motor='iterativo')
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, 'expresiones.txt')
+        with open(self.ruta, 'w', encoding='utf-8', newline='') as archivo:
+            archivo.write(self.CONTENIDO)
+    
+    def tearDown(self):
+        self.directorio.cleanup()
+    
+    def salida_texto(self, **opciones):
+        import io
+        from programa import evaluar_flujo, _leer_lineas
+        salida = io.StringIO()
+        evaluar_flujo(_leer_lineas([self.ruta]), salida, 'jsonl', self.calc, **opciones)
+        return salida.getvalue()
+    
+    def salida_mapeada(self, **opciones):
+        import io
+        from programa import evaluar_archivos_mapeados
+        salida = io.StringIO()
+        evaluar_archivos_mapeados([self.ruta], salida, 'jsonl', self.calc, **opciones)
+        return salida.getvalue()
+    
+    def test_misma_salida(self):
+        """Test: La lectura con mmap produce la misma salida que la lectura por líneas"""
+        esperado = self.salida_texto()
+        self.assertEqual(self.salida_mapeada(), esperado)
+        self.assertEqual(self.salida_mapeada(tamano_bloque_bytes=1), esperado)
+    
+    def test_varios_procesos(self):
+        """Test: Los procesos reciben rangos de bytes y el orden se conserva"""
+        self.assertEqual(self.salida_mapeada(procesos=2, tamano_bloque_bytes=16), self.salida_texto())
+    
+    def test_indice_de_bloques(self):
+        """Test: Los bloques cubren el archivo y empiezan al inicio de una línea"""
+        from programa import ArchivoMapeado
+        with ArchivoMapeado(self.ruta, tamano_bloque=32) as archivo:
+            bloques = list(archivo.bloques())
+            datos = bytes(archivo.buffer)
+        self.assertGreater(len(bloques), 1)
+        self.assertEqual(bloques[0][:2], (1, 0))
+        self.assertEqual(sum(longitud for _, _, longitud in bloques), len(datos))
+        for linea, desplazamiento, _ in bloques:
+            self.assertEqual(datos[:desplazamiento].count(b"\n") + 1, linea)
+    
+    def test_archivo_vacio(self):
+        """Test: Un archivo vacío no tiene bloques"""
+        from programa import ArchivoMapeado
+        open(self.ruta, 'w').close()
+        with ArchivoMapeado(self.ruta) as archivo:
+            self.assertEqual(len(archivo), 0)
+        self.assertEqual(self.salida_mapeada(), "")
+
+class TestPresupuestoEvaluacion(unittest.TestCase):
+    """Pruebas de los límites de magnitud, exponente y tiempo"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma, PresupuestoEvaluacion
+        self.clase = CalculadoraPrograma
+        self.presupuesto = PresupuestoEvaluacion(magnitud_maxima=1e12, exponente_maximo=100)
+    
+    def calculadoras(self, presupuesto):
+        return [self.clase(motor=motor, presupuesto=presupuesto) for motor in ('recursivo', 'iterativo')]
+    
+    def test_dentro_del_presupuesto(self):
+        """Test: Sin superar los límites el resultado no cambia"""
+        referencia = self.clase()
+        for calc in self.calculadoras(self.presupuesto):
+            for expresion in ["2 ^ 30", "(-8) ** (1 / 3)", "999999 * 999999", "10 / 0", "2 +"]:
+                self.assertEqual(calc.analizar(expresion), referencia.analizar(expresion), expresion)
+    
+    def test_potencia_rechazada_antes_de_calcular(self):
+        """Test: Las potencias demasiado grandes se rechazan sin calcularlas"""
+        for calc in self.calculadoras(self.presupuesto):
+            resultado, errores = calc.analizar("9 ** 9 ** 9")
+            self.assertIsNone(resultado)
+            self.assertEqual(errores, ["Error de presupuesto: La potencia supera la magnitud máxima permitida (1e+12)"])
+            self.assertEqual(calc.evaluar("2 ** 101").errores,
+                             ("Error de presupuesto: El exponente supera el máximo permitido (100)",))
+    
+    def test_magnitud(self):
+        """Test: Los números y resultados parciales respetan la magnitud máxima"""
+        for calc in self.calculadoras(self.presupuesto):
+            for expresion in ["10000000000000", "-10000000000000", "1000000 * 1000000 * 10", "x + 1"]:
+                resultado, errores = calc.analizar(expresion, {'x': 1e13})
+                self.assertIsNone(resultado, expresion)
+                self.assertIn("magnitud máxima", errores[0])
+    
+    def test_tiempo_maximo(self):
+        """Test: Una expresión que supera el tiempo se aborta"""
+        from programa import PresupuestoEvaluacion
+        expresion = " + ".join(["2 ** 2"] * 300)
+        for calc in self.calculadoras(PresupuestoEvaluacion(tiempo_maximo=1e-9)):
+            _, errores = calc.analizar(expresion)
+            self.assertEqual(errores, ["Error de presupuesto: Se superó el tiempo máximo de evaluación (1e-09 s)"])
+    
+    def test_modos_numericos(self):
+        """Test: Las potencias se verifican también con int, Fraction y Decimal"""
+        from fractions import Fraction
+        from decimal import Decimal
+        for modo, esperado in [('entero', 8), ('fraccion', Fraction(8)), ('decimal', Decimal(8))]:
+            for motor in ('recursivo', 'iterativo'):
+                calc = self.clase(motor=motor, presupuesto=self.presupuesto, modo_numerico=modo)
+                self.assertEqual(calc.analizar("2 ** 3"), (esperado, []), modo)
+                self.assertEqual(calc.analizar("10 ** 13")[1],
+                                 ["Error de presupuesto: La potencia supera la magnitud máxima permitida (1e+12)"])
+    
+    def test_exponente_negativo(self):
+        """Test: Una base menor que 1 con exponente negativo se rechaza antes de calcularla"""
+        import time
+        from programa import PresupuestoEvaluacion
+        presupuesto = PresupuestoEvaluacion(magnitud_maxima=1e300, tiempo_maximo=1)
+        for modo in ('fraccion', 'entero'):
+            for motor in ('recursivo', 'iterativo'):
+                calc = self.clase(motor=motor, presupuesto=presupuesto, modo_numerico=modo)
+                inicio = time.perf_counter()
+                for expresion in ["0.3 ^ -20000000", "0.3 ^ 20000000", "3 ^ -20000000"]:
+                    self.assertEqual(calc.analizar(expresion)[1],
+                                     ["Error de presupuesto: La potencia supera la magnitud máxima permitida (1e+300)"],
+                                     (modo, expresion))
+                self.assertLess(time.perf_counter() - inicio, 1)
+                self.assertEqual(calc.analizar("0 ^ 20000000")[0], 0)
+                self.assertNotIn("presupuesto", calc.analizar("0 ^ -1")[1][0])
+                self.assertEqual(calc.analizar("0.5 ^ -2")[0], 4)
+
+    def test_expresion_compilada(self):
+        """Test: Las expresiones compiladas aplican el presupuesto de la calculadora"""
+        calc = self.clase(tamano_cache=8, modo_numerico='entero', presupuesto=self.presupuesto)
+        for backend in ('clausuras', 'codigo'):
+            compilada, _ = calc.compilar("9 ** 387420489", backend=backend)
+            self.assertEqual(compilada(), (None, ["Error de presupuesto: El exponente supera el máximo "
+                                                  "permitido (100)"]))
+            compilada, _ = calc.compilar("x * 2 + 3", backend=backend)
+            self.assertEqual(compilada({'x': 4}), (11, []))
+            self.assertIn("magnitud máxima", compilada({'x': 10 ** 13})[1][0])
+        # La caché distingue el presupuesto
+        sin_limite = self.clase(tamano_cache=8, modo_numerico='entero')
+        self.assertEqual(sin_limite.compilar("10 ** 13")[0](), (10 ** 13, []))
+        sin_limite.presupuesto = self.presupuesto
+        self.assertTrue(sin_limite.compilar("10 ** 13")[0]()[1][0].startswith("Error de presupuesto"))
+
+    def test_presupuesto_invalido(self):
+        """Test: Los límites deben ser positivos"""
+        from programa import PresupuestoEvaluacion
+        with self.assertRaises(ValueError):
+            self.clase(presupuesto=PresupuestoEvaluacion(exponente_maximo=0))
+    
+    def test_lote_con_presupuesto(self):
+        """Test: Los procesos de trabajo aplican el mismo presupuesto"""
+        calc = self.clase(motor='iterativo', presupuesto=self.presupuesto)
+        resultados = list(calc.analizar_lote(["2 ** 3", "9 ** 9 ** 9"], workers=2, chunk_size=1))
+        self.assertEqual(resultados[0], (0, 8.0, []))
+        self.assertTrue(resultados[1][2][0].startswith("Error de presupuesto"))
+
+
+class TestModoNumerico(unittest.TestCase):
+    """Pruebas de los modos numéricos (flotante, entero, fracción y decimal)"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.clase = CalculadoraPrograma
+    
+    def calculadoras(self, modo):
+        return [self.clase(motor=motor, modo_numerico=modo) for motor in ('recursivo', 'iterativo')]
+    
+    def test_modo_entero_conserva_enteros(self):
+        """Test: En modo entero solo la división / produce un float"""
+        for calc in self.calculadoras('entero'):
+            casos = [("2 ** 10", 1024, int), ("7 % 3 * -2", -2, int), ("6 / 3", 2.0, float),
+                     ("2.5 * 2", 5.0, float), ("2 ** -1", 0.5, float)]
+            for expresion, esperado, tipo in casos:
+                resultado, errores = calc.analizar(expresion)
+                self.assertEqual(errores, [], expresion)
+                self.assertEqual(resultado, esperado, expresion)
+                self.assertIs(type(resultado), tipo, expresion)
+            # Sin redondeo de float en enteros grandes
+            self.assertEqual(calc.analizar("2 ** 64 + 1")[0], 2 ** 64 + 1)
+    
+    def test_modos_exactos(self):
+        """Test: Fraction y Decimal evitan los errores de redondeo de float"""
+        from fractions import Fraction
+        from decimal import Decimal
+        for calc in self.calculadoras('fraccion'):
+            self.assertEqual(calc.analizar("0.1 + 0.2")[0], Fraction(3, 10))
+            self.assertEqual(calc.analizar("1 / 3 + 1 / 6")[0], Fraction(1, 2))
+        for calc in self.calculadoras('decimal'):
+            self.assertEqual(calc.analizar("0.1 + 0.2")[0], Decimal('0.3'))
+            self.assertEqual(calc.evaluar("-7.5 * x", variables={'x': Decimal(2)}).valor, Decimal('-15.0'))
+    
+    def test_mismos_errores(self):
+        """Test: Los errores no dependen del modo numérico"""
+        referencia = self.clase()
+        for modo in ('entero', 'fraccion', 'decimal'):
+            for calc in self.calculadoras(modo):
+                for expresion in ["10 / 0", "5 % (2 - 2)", "2 +", "3 $ 4", ""]:
+                    self.assertEqual(calc.analizar(expresion)[1], referencia.analizar(expresion)[1],
+                                     (modo, expresion))
+    
+    def test_compilacion_y_cache(self):
+        """Test: compilar() usa el modo y la caché distingue los modos"""
+        for modo, esperado in [('flotante', 0.5), ('fraccion', 0.5), ('entero', 8)]:
+            calc = self.clase(tamano_cache=8, modo_numerico=modo)
+            expresion = "2 ** 3" if modo == 'entero' else "1 / 4 + 1 / 4"
+            for backend in ('clausuras', 'codigo'):
+                compilada, errores = calc.compilar(expresion, optimizar=True, backend=backend)
+                self.assertEqual(compilada(), (esperado, []))
+            self.assertEqual(calc.analizar(expresion)[0], esperado)
+        self.assertIs(type(self.clase(modo_numerico='entero').compilar("2 ** 3")[0]()[0]), int)
+        self.assertEqual(self.clase(modo_numerico='decimal').configuracion()['modo_numerico'], 'decimal')
+    
+    def test_modo_invalido(self):
+        """Test: Un modo desconocido se rechaza"""
+        with self.assertRaises(ValueError):
+            self.clase(modo_numerico='complejo')
+
+
+class TestMetricas(unittest.TestCase):
+    """Pruebas de las métricas por fase y del agregador"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.clase = CalculadoraPrograma
+    
+    def test_metricas_no_cambian_el_resultado(self):
+        """Test: Con métricas el resultado y los errores son los mismos"""
+        for motor in ('recursivo', 'iterativo'):
+            calc = self.clase(motor=motor, tamano_cache=4)
+            for expresion in EXPRESIONES_EQUIVALENCIA:
+                resultado, errores, metricas = calc.analizar(expresion, metricas=True)
+                self.assertEqual((resultado, errores), self.clase(motor=motor).analizar(expresion), expresion)
+                self.assertEqual(metricas.longitud_traza, len(calc.traza_derivacion))
+    
+    def test_contadores(self):
+        """Test: Cantidad de tokens y profundidad alcanzada por el motor"""
+        calc = self.clase(nivel_traza='desactivada')
+        _, _, metricas = calc.analizar("((1 + 2) * 3) ** -(x)", {'x': 1}, metricas=True)
+        self.assertEqual(metricas.tokens, 14)
+        # E → T → P → F → ( E ) ... hasta el 2: trece producciones en curso
+        self.assertEqual(metricas.profundidad_maxima, 13)
+        self.assertEqual(metricas.longitud_traza, 0)
+        # La evaluación ocurre durante el análisis: no es una fase aparte
+        self.assertIsNone(metricas.tiempo_evaluacion)
+        self.assertAlmostEqual(metricas.tiempo_total, metricas.tiempo_lexico + metricas.tiempo_sintactico)
+        iterativa = self.clase(motor='iterativo', tokens_compactos=True)
+        self.assertEqual(iterativa.analizar("(1 + (2)) * 3", metricas=True)[2].profundidad_maxima, 3)
+        self.assertEqual(calc.analizar("", metricas=True)[2].profundidad_maxima, 0)
+    
+    def test_profundidad_con_errores(self):
+        """Test: La profundidad alcanzada se informa también si el análisis falla"""
+        import sys
+        cadena = " + ".join(["1"] * 5000)
+        _, errores, metricas = self.clase(nivel_traza='desactivada').analizar(cadena, metricas=True)
+        self.assertIn("recursion", errores[0])
+        self.assertGreater(metricas.profundidad_maxima, sys.getrecursionlimit() // 2)
+        for motor, esperado in (('recursivo', 5), ('iterativo', 1)):
+            calc = self.clase(motor=motor, nivel_traza='desactivada')
+            self.assertEqual(calc.analizar("1 / 0", metricas=True)[2].profundidad_maxima, esperado)
+        _, errores, metricas = self.clase(motor='iterativo').analizar("((((1", metricas=True)
+        self.assertEqual((len(errores), metricas.profundidad_maxima), (1, 5))
+
+    def test_un_solo_recorrido(self):
+        """Test: Con métricas el motor recorre los tokens una sola vez"""
+        import programa
+        llamadas = []
+        motor = programa._ejecutar_motor_iterativo
+        def contar(*argumentos):
+            llamadas.append(1)
+            return motor(*argumentos)
+        programa._ejecutar_motor_iterativo = contar
+        try:
+            self.clase(motor='iterativo').analizar("2 * (3 + 4)", metricas=True)
+        finally:
+            programa._ejecutar_motor_iterativo = motor
+        self.assertEqual(len(llamadas), 1)
+    
+    def test_agregador(self):
+        """Test: El agregador acumula histogramas por origen"""
+        import io
+        from metricas import AgregadorMetricas, MetricasAnalisis
+        agregador = AgregadorMetricas()
+        agregador.registrar('prueba', MetricasAnalisis(1e-6, 3e-6, 0.0, 5, 2, 0))
+        agregador.registrar('prueba', MetricasAnalisis(1e-5, 2e-5, 1e-5, 9, 3, 7))
+        histogramas = agregador.histogramas()['prueba']
+        self.assertEqual(histogramas['tiempo_lexico']['cantidad'], 2)
+        self.assertEqual(histogramas['tiempo_sintactico']['cubetas'], {4: 1, 32: 1})
+        self.assertEqual(histogramas['tokens']['maximo'], 9)
+        salida = io.StringIO()
+        agregador.volcar(salida)
+        self.assertIn("MÉTRICAS: prueba (2 análisis)", salida.getvalue())
+        agregador.reiniciar()
+        self.assertEqual(agregador.histogramas(), {})
+
+    def test_sin_fase_de_evaluacion(self):
+        """Test: Un tiempo de evaluación None no se registra ni se muestra"""
+        import io
+        from metricas import AgregadorMetricas, MetricasAnalisis
+        agregador = AgregadorMetricas()
+        agregador.registrar('prueba', MetricasAnalisis(1e-6, 3e-6, None, 5, 2, 0))
+        histogramas = agregador.histogramas()['prueba']
+        self.assertEqual(histogramas['tiempo_evaluacion']['cantidad'], 0)
+        self.assertAlmostEqual(histogramas['tiempo_total']['media'], 4.0)
+        salida = io.StringIO()
+        agregador.volcar(salida)
+        self.assertNotIn("evaluación", salida.getvalue())
+        self.assertIn("sintáctico", salida.getvalue())
+    
+    def test_agregador_global(self):
+        """Test: analizar(metricas=True) registra en el agregador del proceso"""
+        from metricas import AGREGADOR
+        antes = AGREGADOR.histogramas().get('descendente', {}).get('tokens', {}).get('cantidad', 0)
+        self.clase().analizar("1 + 1", metricas=True)
+        self.assertEqual(AGREGADOR.histogramas()['descendente']['tokens']['cantidad'], antes + 1)
+
+
+class _RaizFalsa:
+    """Sustituto de tk.Tk: after() guarda las funciones y procesar() las ejecuta"""
+    
+    def __init__(self):
+        self.pendientes = []
+    
+    def after(self, milisegundos, funcion):
+        self.pendientes.append(funcion)
+    
+    def procesar(self):
+        import time
+        while self.pendientes:
+            time.sleep(0.005)
+            self.pendientes.pop(0)()
+
+
+class TestTareaSegundoPlano(unittest.TestCase):
+    """Pruebas del análisis en un hilo de trabajo con cancelación"""
+    
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.clase = CalculadoraPrograma
+        self.raiz = _RaizFalsa()
+        self.terminadas = []
+        self.fallidas = []
+    
+    def tarea(self, funcion):
+        from tareas import TareaSegundoPlano
+        return TareaSegundoPlano(self.raiz, funcion, self.terminadas.append, self.fallidas.append).iniciar()
+    
+    def test_resultado_en_el_hilo_principal(self):
+        """Test: El resultado llega por after() con el mismo valor que analizar()"""
+        self.tarea(lambda cancelacion: self.clase().analizar("2 + 3 * 4"))
+        self.raiz.procesar()
+        self.assertEqual(self.terminadas, [(14.0, [])])
+        self.tarea(lambda cancelacion: 1 / 0)
+        self.raiz.procesar()
+        self.assertIsInstance(self.fallidas[0], ZeroDivisionError)
+    
+    def test_cancelacion_detiene_el_calculo(self):
+        """Test: Cancelar detiene el análisis y descarta su resultado"""
+        import threading
+        from tareas import TareaCancelada
+        expresion = " + ".join(["(3 * 2)"] * 200000)
+        for motor in ('recursivo', 'iterativo'):
+            calc = self.clase(motor=motor, nivel_traza='desactivada')
+            calc.cancelacion = threading.Event()
+            calc.cancelacion.set()
+            with self.assertRaises(TareaCancelada):
+                calc.analizar("1 + 2")
+            with self.assertRaises(TareaCancelada):
+                calc.evaluar("1 + 2")
+        
+        iniciada = threading.Event()
+        
+        def analizar(cancelacion):
+            calc = self.clase(motor='iterativo', nivel_traza='desactivada')
+            calc.cancelacion = cancelacion
+            iniciada.set()
+            return calc.analizar(expresion)
+        
+        tarea = self.tarea(analizar)
+        iniciada.wait()
+        tarea.cancelar()
+        self.raiz.procesar()
+        self.assertEqual((self.terminadas, self.fallidas), ([], []))
+        self.assertIsInstance(tarea._excepcion, TareaCancelada)
+
+
+class _TextoFalso:
+    """Sustituto de un widget Text que registra cada llamada a insert()"""
+    
+    def __init__(self):
+        self.llamadas = []
+    
+    def insert(self, indice, *argumentos):
+        self.llamadas.append((indice,) + argumentos)
+
+
+class TestInsertarTexto(unittest.TestCase):
+    """Pruebas de la inserción de texto en una sola llamada"""
+    
+    def setUp(self):
+        import programa
+        try:
+            programa._importar_tkinter()
+        except ImportError:
+            self.skipTest("tkinter no está disponible")
+        self.insertar_texto = programa.insertar_texto
+    
+    def test_una_sola_llamada(self):
+        """Test: Muchas líneas se insertan con una sola llamada"""
+        texto = _TextoFalso()
+        self.insertar_texto(texto, [f"{i}\n" for i in range(50000)])
+        self.assertEqual(len(texto.llamadas), 1)
+        self.assertEqual(texto.llamadas[0][1], "".join(f"{i}\n" for i in range(50000)))
+    
+    def test_etiquetas_por_rango(self):
+        """Test: Las partes con la misma etiqueta se unen en un solo rango"""
+        texto = _TextoFalso()
+        self.insertar_texto(texto, [("A", "titulo"), ("B", "titulo"), "c", "d", ("E", "error")])
+        self.assertEqual(texto.llamadas, [('end', "AB", "titulo", "cd", (), "E", "error")])
+        self.insertar_texto(texto, [])
+        self.assertEqual(len(texto.llamadas), 1)
+
+
+class TestArbolDerivacion(unittest.TestCase):
+    """Pruebas del árbol de derivación estructurado (TRAZA_ARBOL)"""
+
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        self.arbol = CalculadoraPrograma(nivel_traza='arbol')
+        self.completa = CalculadoraPrograma(nivel_traza='completa')
+
+    def test_misma_traza_que_completa(self):
+        """Test: El texto generado desde el árbol es la traza completa, también con errores"""
+        variables = {'x': 2.0, 'y': -3.0}
+        for expresion in EXPRESIONES_EQUIVALENCIA + ["x * -y ** 2", "-(x + 1) ^ 2 % y", "(x +"]:
+            self.assertEqual(self.arbol.analizar(expresion, variables),
+                             self.completa.analizar(expresion, variables), expresion)
+            self.assertEqual(list(self.arbol.lineas_traza()), self.completa.traza_derivacion, expresion)
+
+    def test_sin_texto_durante_el_analisis(self):
+        """Test: Durante el análisis solo se guardan producciones, no líneas de texto"""
+        self.arbol.analizar("(2 + 3) * 4")
+        self.assertEqual(self.arbol.traza_derivacion,
+                         ["Inicio del análisis sintáctico", "✓ Análisis sintáctico completado exitosamente"])
+        self.assertEqual(len(self.arbol.arbol_derivacion), 24)
+        self.assertIsNone(self.completa.arbol_derivacion)
+
+    def test_estructura(self):
+        """Test: Los nodos siguen la gramática y -( E ) tiene su F como hijo"""
+        self.arbol.analizar("-(2) * x", {'x': 5})
+        raiz = self.arbol.arbol_derivacion.raiz()
+        self.assertEqual((raiz.simbolo, raiz.cuerpo), ('E', "T E'"))
+        self.assertEqual([hijo.simbolo for hijo in raiz.hijos], ['T', "E'"])
+        negativo = raiz.hijos[0].hijos[0].hijos[0]
+        self.assertEqual(negativo.etiqueta(), "F → -número")
+        self.assertEqual(negativo.hijos[0].etiqueta(), "F → ( E )")
+        self.assertFalse(hasattr(negativo, '__dict__'))
+        dibujo = list(self.arbol.arbol_derivacion.dibujar())
+        self.assertEqual(dibujo[0], "E → T E'")
+        self.assertIn("│       │   ├── F → x (= 5)", dibujo)
+        self.assertEqual(dibujo[-1], "└── E' → ε")
+
+    def test_arbol_parcial_con_error(self):
+        """Test: Tras un error el árbol tiene las producciones aplicadas hasta el error"""
+        resultado, errores = self.arbol.analizar("(2 +")
+        self.assertIsNone(resultado)
+        raiz = self.arbol.arbol_derivacion.raiz()
+        self.assertEqual(raiz.hijos[0].hijos[0].hijos[0].etiqueta(), "F → ( E )")
+
+    def test_profundidad_sin_recursion(self):
+        """Test: Construir y dibujar un árbol muy profundo no usa la pila de Python"""
+        self.assertEqual(self.arbol.analizar("(" * 200 + "1" + ")" * 200), (1.0, []))
+        self.assertGreater(len(list(self.arbol.arbol_derivacion.dibujar())), 200 * 4)
+
+    def test_cache_comparte_arbol(self):
+        """Test: Un acierto de la caché recupera también el árbol"""
+        from programa import CalculadoraDescendente as CalculadoraPrograma
+        calc = CalculadoraPrograma(tamano_cache=8, nivel_traza='arbol')
+        calc.analizar("2 * (3 + 4)")
+        lineas = list(calc.lineas_traza())
+        calc.analizar("2 + 0")
+        calc.analizar("2  *  (3 + 4)")
+        self.assertEqual(list(calc.lineas_traza()), lineas)
+
+
+class TestEvaluacionIncremental(unittest.TestCase):
+    """Pruebas de la evaluación incremental de la vista previa"""
+
+    def setUp(self):
+        from programa import CalculadoraDescendente as CalculadoraPrograma, EvaluadorIncremental
+        self.calc = CalculadoraPrograma(nivel_traza='desactivada')
+        self.evaluador = EvaluadorIncremental(self.calc)
+
+    def comparar(self, expresion, variables=None):
+        from programa import _tokenizar
+        esperado = self.calc.evaluar(expresion, variables=variables)
+        self.assertEqual(self.evaluador.evaluar(expresion, variables), (esperado.valor, list(esperado.errores)),
+                         expresion)
+        tokens, errores = _tokenizar(expresion)
+        if not errores:
+            self.assertEqual(self.evaluador.tokens, tokens, expresion)
+
+    def test_escritura_caracter_a_caracter(self):
+        """Test: Cada prefijo de la expresión da lo mismo que la evaluación completa"""
+        for expresion in EXPRESIONES_EQUIVALENCIA + ["x * 2 + y - -(x + 1) ^ 2", "12.5 ** 2 - 1 2 + 3"]:
+            for fin in range(len(expresion) + 1):
+                self.comparar(expresion[:fin], {'x': 3.0, 'y': 0.5})
+
+    def test_ediciones_aleatorias(self):
+        """Test: Inserciones y borrados en cualquier posición"""
+        import random
+        aleatorio = random.Random(7)
+        texto = "1 + 2"
+        for _ in range(3000):
+            posicion = aleatorio.randint(0, len(texto))
+            if aleatorio.random() < 0.6 or not texto:
+                texto = texto[:posicion] + aleatorio.choice("0123456789.+-*/%^() x") + texto[posicion:]
+            else:
+                texto = texto[:posicion] + texto[posicion + aleatorio.randint(1, 3):]
+            texto = texto[:40]
+            self.comparar(texto, {'x': 2})
+
+    def test_reutiliza_prefijo(self):
+        """Test: Escribir al final de una expresión larga no la vuelve a analizar"""
+        expresion = " + ".join(f"{i} * 3" for i in range(2000))
+        self.comparar(expresion)
+        self.comparar(expresion + " - 7")
+        self.assertEqual(self.evaluador.tokens_relexeados, 3)
+        self.assertEqual(self.evaluador.terminos_reutilizados, 1999)
+
+    def test_edicion_al_medio(self):
+        """Test: Una edición al medio solo vuelve a tokenizar la región editada"""
+        expresion = " + ".join(f"{i} * 3" for i in range(2000))
+        self.comparar(expresion)
+        medio = expresion.index("1000 * 3")
+        self.comparar(expresion[:medio] + "(1 + " + expresion[medio:medio + 4] + ")" + expresion[medio + 4:])
+        self.assertLessEqual(self.evaluador.tokens_relexeados, 6)
+        self.assertEqual(self.evaluador.terminos_reutilizados, 999)
+
+    def test_cambio_de_variables(self):
+        """Test: Con otros valores de las variables no se reutilizan los acumulados"""
+        self.comparar("x * 2 + 1", {'x': 1.0})
+        self.comparar("x * 2 + 1", {'x': 5.0})
+        self.assertEqual(self.evaluador.terminos_reutilizados, 0)
+
+    
+    def test_vista_previa_en_segundo_plano(self):
+        """Test: La vista previa se evalúa fuera del hilo de Tk y descarta los resultados viejos"""
+        import threading
+        from types import SimpleNamespace
+        from programa import InterfazCalculadora
+        hilos = []
+        liberar = threading.Event()
+        evaluador = self.evaluador
+        
+        class EvaluadorLento:
+            calculadora = self.calc
+            
+            def evaluar(self, expresion):
+                hilos.append(threading.current_thread())
+                if expresion == "2 ** 3":
+                    liberar.wait()
+                return evaluador.evaluar(expresion)
+        
+        interfaz = InterfazCalculadora.__new__(InterfazCalculadora)
+        interfaz.root = _RaizFalsa()
+        interfaz.tarea_vista_previa = None
+        interfaz.evaluador_vivo = EvaluadorLento()
+        interfaz.vista_previa_activa = SimpleNamespace(get=lambda: True)
+        texto = ["2 ** 3"]
+        interfaz.entrada_expresion = SimpleNamespace(get=lambda: texto[0])
+        etiquetas = []
+        interfaz.etiqueta_vista_previa = SimpleNamespace(config=lambda **opciones: etiquetas.append(opciones['text']))
+        
+        interfaz.actualizar_vista_previa()
+        texto[0] = "1 + 2"
+        interfaz.actualizar_vista_previa()  # La anterior sigue en curso: se reintenta
+        self.assertEqual(etiquetas, [])
+        liberar.set()
+        interfaz.root.procesar()
+        self.assertEqual(etiquetas, ["= 3.0"])
+        self.assertNotIn(threading.current_thread(), hilos)
+        self.assertIsNone(interfaz.tarea_vista_previa)
+
+
 def run_tests():
     """Ejecuta todas las pruebas y genera un reporte"""
     print("=" * 80)
@@ -526,6 +1849,27 @@ def run_tests():
     # Crear suite de pruebas
     loader = unittest.TestLoader()
     suite = loader.loadTestsFromTestCase(TestCalculadoraDescendente)
+    suite.addTests(loader.loadTestsFromTestCase(TestTokenizadorMaestro))
+    suite.addTests(loader.loadTestsFromTestCase(TestCompilacion))
+    suite.addTests(loader.loadTestsFromTestCase(TestCacheExpresiones))
+    suite.addTests(loader.loadTestsFromTestCase(TestNivelTraza))
+    suite.addTests(loader.loadTestsFromTestCase(TestMotorIterativo))
+    suite.addTests(loader.loadTestsFromTestCase(TestModoLineaComandos))
+    suite.addTests(loader.loadTestsFromTestCase(TestAnalisisPorLotes))
+    suite.addTests(loader.loadTestsFromTestCase(TestEvaluacionReentrante))
+    suite.addTests(loader.loadTestsFromTestCase(TestOptimizador))
+    suite.addTests(loader.loadTestsFromTestCase(TestGeneracionCodigo))
+    suite.addTests(loader.loadTestsFromTestCase(TestVariables))
+    suite.addTests(loader.loadTestsFromTestCase(TestEvaluacionVectorizada))
+    suite.addTests(loader.loadTestsFromTestCase(TestFlujoTokens))
+    suite.addTests(loader.loadTestsFromTestCase(TestEntradaMapeada))
+    suite.addTests(loader.loadTestsFromTestCase(TestPresupuestoEvaluacion))
+    suite.addTests(loader.loadTestsFromTestCase(TestModoNumerico))
+    suite.addTests(loader.loadTestsFromTestCase(TestMetricas))
+    suite.addTests(loader.loadTestsFromTestCase(TestTareaSegundoPlano))
+    suite.addTests(loader.loadTestsFromTestCase(TestInsertarTexto))
+    suite.addTests(loader.loadTestsFromTestCase(TestArbolDerivacion))
+    suite.addTests(loader.loadTestsFromTestCase(TestEvaluacionIncremental))
     
     # Ejecutar pruebas con reporte detallado
     runner = unittest.TextTestRunner(verbosity=2)